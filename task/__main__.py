@@ -1,5 +1,7 @@
 import logging
+import sys
 from logging.config import dictConfig
+from typing import Optional
 
 from task import config
 from task.setup_loger import setup_loger
@@ -13,21 +15,73 @@ streamHandler = logging.StreamHandler()
 logger.addHandler(streamHandler)
 
 
+def get_fetch_date(args) -> Optional[str]:
+    """Returns date of --date argument in %Y-%m-%d format, None stands for today"""
+    return args.date.isoformat() if args.date else None
+
+
+def convert_file(args) -> int:
+    """Converts prices from input file (or stdin) and writes results to output file (or stdout)"""
+    from task.batch import InputFormat, convert_rows, open_text_file, read_rows
+
+    logger.info(f"STARTING CONVERTING FILE: "
+                f"input: {args.input},"
+                f"output: {args.output},"
+                f"source: {config.RUN_CONFIG['SOURCE']},"
+                f"mode: {config.RUN_CONFIG['MODE']}")
+
+    input_format = args.format or InputFormat.from_path(args.input)
+    try:
+        with open_text_file(args.input, 'r') as input_file, open_text_file(args.output, 'w') as output_file:
+            converted, failed = convert_rows(
+                read_rows(input_file, input_format), output_file, args.chunk_size, get_fetch_date(args)
+            )
+    except Exception as e:
+        logger.error(f'{"File conversion failed due to:".upper()} {e}\n')
+        logger.info(f"Exit with code 1")
+        return 1
+
+    logger.info(f"JOB DONE! {converted} rows converted, {failed} rows failed\n")
+    exit_code = 1 if failed else 0
+    logger.info(f"Exit with code {exit_code}")
+    return exit_code
+
+
 def main():
+    if sys.argv[1:2] == ['backfill']:
+        from task.backfill import backfill_main  # imports requests, so it is imported only for this command
+        return backfill_main(sys.argv[2:])
+
+    if sys.argv[1:2] == ['serve']:
+        from task.server import serve_main
+        return serve_main(sys.argv[2:])
+
+    if sys.argv[1:2] == ['worker']:
+        from task.worker import worker_main
+        return worker_main(sys.argv[2:])
+
     parser = get_parser()
     args = parser.parse_args()
 
+    if args.input is None and (args.currency is None or args.price is None):
+        parser.error('currency and price are required, unless --input is used')
+
     set_run_config(args)
 
+    if args.input is not None:
+        return convert_file(args)
+
     logger.info(f"STARTING EXECUTING SCRIPT WITH ARGUMENTS: "
                 f"currency: {args.currency},"
                 f"price: {args.price},"
+                f"date: {get_fetch_date(args) or 'today'},"
                 f"source: {config.RUN_CONFIG['SOURCE']},"
                 f"mode: {config.RUN_CONFIG['MODE']}")
     try:
         res = PriceCurrencyConverterToPLN().convert_to_pln(
             currency=args.currency,
-            price=args.price
+            price=args.price,
+            fetch_date=get_fetch_date(args)
         )
         logger.info(f"JOB DONE! The result is {str(res)}\n")
         logger.info(f"Exit with code 0")
@@ -39,4 +93,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import datetime
+from typing import Iterable, Iterator, Optional
+
+from requests import Response
+
+from task import config
+from task.connectors.api.http_client import HttpClient, HttpClientError, get_http_client
+from task.connectors.api.rate_limiter import TokenBucket
+from task.connectors.local.rate_store import LocalRateStore
+from task.iso_codes import validate_nbp_currency
+from task.setup_loger import setup_loger
+from task.utils import get_backfill_parser
+
+logger = setup_loger(__name__)
+
+
+def get_date_chunks(start: datetime.date, end: datetime.date, max_days: int) -> Iterator[tuple]:
+    """
+    Splits date range into consecutive ranges not longer than max_days (both ends included).
+
+    :param start: first day of range
+    :param end: last day of range
+    :param max_days: max number of days in one chunk
+    :return: iterator of (chunk_start, chunk_end) tuples
+    """
+    if start > end:
+        raise ValueError(f'Start date {start} is after end date {end}.')
+
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + datetime.timedelta(days=max_days - 1), end)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + datetime.timedelta(days=1)
+
+
+def _handle_range_response(response: Response) -> dict:
+    """
+    Checks if response of date range endpoint is proper and returns rates from it. NBP responds with 404
+    if no table was published in the whole range (e.g. during holidays), such range has no rates.
+
+    :param response:
+    :return: dict where keys are dates in %Y-%m-%d format and values are rates converted to float
+    """
+    if response.status_code == 404:
+        return {}
+
+    HttpClient.raise_for_status(response)
+
+    if 'application/json' not in response.headers.get('content-type', ''):
+        logger.error("Unexpected response content type: %s", response.headers.get('content-type', ''))
+        raise TypeError("Error: Unexpected response content type")
+
+    data = response.json()
+    rates_data = data.get('rates') if isinstance(data, dict) else None
+
+    if not isinstance(rates_data, list) or not all(
+            isinstance(d.get('effectiveDate'), str) and isinstance(d.get('mid'), (int, float)) for d in rates_data
+    ):
+        logger.error("Unexpected JSON format: %s", data)
+        raise TypeError("Error: Invalid or missing rates in the JSON response")
+
+    return {d['effectiveDate']: float(d['mid']) for d in rates_data}
+
+
+def fetch_rates_range(
+        currency: str,
+        start: datetime.date,
+        end: datetime.date,
+        token_bucket: TokenBucket
+) -> dict:
+    """
+    Fetches rates of currency published between start and end dates. Range is split into chunks accepted
+    by NBP API and every request waits for token from token_bucket.
+
+    :param currency: string ISO currency code
+    :param start: first day of range
+    :param end: last day of range
+    :param token_bucket: limiter of requests rate
+    :return: dict where keys are dates in %Y-%m-%d format and values are rates
+    """
+    rates = {}
+
+    for chunk_start, chunk_end in get_date_chunks(start, end, config.NBP_API_MAX_RANGE_DAYS):
+        token_bucket.acquire()
+
+        url = f'{config.NBP_API_URL}/exchangerates/rates/a/{currency.lower()}/' \
+              f'{chunk_start.isoformat()}/{chunk_end.isoformat()}/?format=json'
+        try:
+            rates.update(_handle_range_response(get_http_client().get(url)))
+        except HttpClientError:
+            logger.exception(f"Request error occurred:")
+            raise
+
+        logger.info('Fetched %s rates from %s to %s', currency.upper(), chunk_start, chunk_end)
+
+    return rates
+
+
+def backfill_rates(
+        currencies: Iterable[str],
+        start: datetime.date,
+        end: datetime.date,
+        store_path: Optional[str] = None,
+        requests_per_second: Optional[float] = None
+) -> int:
+    """
+    Fetches historical rates of currencies and stores them in local rate store, which can be used as
+    LOCAL source file (--local-file option).
+
+    :param currencies: string ISO currency codes
+    :param start: first day of range
+    :param end: last day of range
+    :param store_path: path of local rate store, config.BACKFILL_RATES_PATH by default
+    :param requests_per_second: limit of requests rate, config.BACKFILL_REQUESTS_PER_SECOND by default
+    :return: number of stored rates
+    """
+    currencies = list(currencies)
+    for currency in currencies:
+        validate_nbp_currency(currency)
+
+    token_bucket = TokenBucket(requests_per_second or config.BACKFILL_REQUESTS_PER_SECOND, config.BACKFILL_BURST)
+
+    rates = {currency.upper(): fetch_rates_range(currency, start, end, token_bucket) for currency in currencies}
+
+    return LocalRateStore(store_path or config.BACKFILL_RATES_PATH).merge(rates)
+
+
+def backfill_main(argv: Optional[list] = None) -> int:
+    """Runs backfill command with CLI arguments"""
+    args = get_backfill_parser().parse_args(argv)
+
+    logger.info(f"STARTING BACKFILL: "
+                f"currencies: {args.currencies},"
+                f"start: {args.start},"
+                f"end: {args.end}")
+    try:
+        stored = backfill_rates(
+            args.currencies,
+            args.start,
+            args.end,
+            store_path=args.output,
+            requests_per_second=args.requests_per_second
+        )
+        logger.info(f"JOB DONE! {stored} rates stored\n")
+        return 0
+    except Exception as e:
+        logger.error(f'{"Backfill failed due to:".upper()} {e}\n')
+        return 1
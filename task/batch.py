@@ -0,0 +1,179 @@
+import contextlib
+import csv
+import datetime
+import itertools
+import json
+import os
+import sys
+from typing import IO, Iterable, Iterator, Optional
+
+from task import config
+from task.currency_converter import ConvertedPricePLN, PriceCurrencyConverterToPLN
+from task.setup_loger import setup_loger
+from task.iso_codes import get_iso_code_registry
+from task.utils import truncate_float
+
+logger = setup_loger(__name__)
+
+
+class InputFormat:
+    CSV = 'csv'
+    JSONL = 'jsonl'
+
+    @classmethod
+    def get_value_list(cls) -> list:
+        return [cls.CSV, cls.JSONL]
+
+    @classmethod
+    def from_path(cls, path: str) -> str:
+        """Guesses format from file extension, JSONL is used for stdin and unknown extensions"""
+        return cls.CSV if os.path.splitext(path)[1].lower() == '.csv' else cls.JSONL
+
+
+def open_text_file(path: str, mode: str) -> IO:
+    """Opens file in text mode, "-" stands for stdin or stdout, which is not closed afterwards"""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    return open(path, mode, newline='' if 'r' in mode else None)
+
+
+def _iter_csv_rows(file: IO) -> Iterator[tuple]:
+    """Yields (currency, price[, date]) from CSV rows, header row with 'currency' column is skipped"""
+    for line_number, row in enumerate(csv.reader(file), start=1):
+        if not row or (line_number == 1 and row[0].strip().lower() == 'currency'):
+            continue
+        yield line_number, row
+
+
+def _iter_jsonl_rows(file: IO) -> Iterator[tuple]:
+    """Yields (currency, price, date) from JSON lines of objects with currency, price and optional date keys"""
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            yield line_number, [data['currency'], data['price'], data.get('date')]
+        except (ValueError, KeyError, TypeError):
+            yield line_number, line
+
+
+def parse_item(currency, price, fetch_date=None) -> tuple:
+    """
+    Validates conversion item, the same way CLI arguments are validated.
+
+    :param currency: ISO currency code, case insensitive
+    :param price: price as number or string
+    :param fetch_date: date of rate in YYYY-MM-DD format, empty for default date
+    :return: (currency, price, fetch_date) tuple with upper currency code, price truncated to 4 decimal places
+        and date in %Y-%m-%d format or None
+    """
+    parsed_currency = str(currency).strip().upper()
+    if parsed_currency not in get_iso_code_registry():
+        raise ValueError(f'Invalid currency: {currency}')
+
+    parsed_date = None
+    if fetch_date is not None and str(fetch_date).strip():
+        try:
+            parsed_date = datetime.date.fromisoformat(str(fetch_date).strip()).isoformat()
+        except ValueError:
+            raise ValueError(f'Invalid date: {fetch_date}, use YYYY-MM-DD format.')
+
+    return parsed_currency, truncate_float(price), parsed_date
+
+
+def parse_item_object(item) -> tuple:
+    """
+    Validates conversion item given as JSON object ({"currency": ..., "price": ..., "date": ...}, date is optional),
+    see parse_item
+    """
+    if not isinstance(item, dict) or 'currency' not in item or 'price' not in item:
+        raise ValueError(f'Invalid item, currency and price are required: {item}')
+    return parse_item(item['currency'], item['price'], item.get('date'))
+
+
+def read_rows(file: IO, input_format: str) -> Iterator[tuple]:
+    """
+    Lazily parses and validates input rows.
+
+    :param file: input file opened in text mode
+    :param input_format: one of InputFormat values
+    :return: iterator of (line_number, (currency, price, fetch_date)) tuples, the second item is an Exception
+        for invalid rows
+    """
+    rows = _iter_csv_rows(file) if input_format == InputFormat.CSV else _iter_jsonl_rows(file)
+
+    for line_number, row in rows:
+        try:
+            if not isinstance(row, list) or len(row) not in (2, 3):
+                raise ValueError(f'Invalid row format: {str(row).strip()}')
+
+            yield line_number, parse_item(*row)
+        except Exception as e:
+            yield line_number, e
+
+
+def get_error_message(error: Exception) -> str:
+    return str(error.args[0]) if error.args else repr(error)
+
+
+def format_result(result) -> dict:
+    """Maps ConvertedPricePLN instance (or exception of failed conversion) into JSON serializable dict"""
+    if isinstance(result, ConvertedPricePLN):
+        return {
+            'currency': result.currency,
+            'price': result.price_in_source_currency,
+            'rate': result.currency_rate,
+            'date': result.currency_rate_fetch_date,
+            'price_in_pln': result.price_in_pln
+        }
+    return {'error': get_error_message(result)}
+
+
+def _format_result(line_number: int, result) -> dict:
+    return {'line': line_number, **format_result(result)}
+
+
+def convert_rows(
+        rows: Iterable[tuple],
+        output: IO,
+        chunk_size: Optional[int] = None,
+        fetch_date: Optional[str] = None
+) -> tuple:
+    """
+    Converts rows chunk by chunk and writes one JSON line per row to output. Every chunk is saved to database
+    with single write, so memory use depends on chunk size, not on input size. Failed rows are reported
+    in output and do not stop conversion of other rows.
+
+    :param rows: iterator of (line_number, (currency, price, fetch_date)) tuples, see read_rows
+    :param output: output file opened in text mode
+    :param chunk_size: number of rows converted and saved at once, config.BATCH_CHUNK_SIZE by default
+    :param fetch_date: date of rate of rows without date in %Y-%m-%d format, today by default
+    :return: (converted, failed) rows numbers
+    """
+    converter = PriceCurrencyConverterToPLN()
+    converted = failed = 0
+    rows = iter(rows)
+
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size or config.BATCH_CHUNK_SIZE))
+        if not chunk:
+            break
+
+        valid_rows = [(line_number, item) for line_number, item in chunk if not isinstance(item, Exception)]
+        results = dict(zip(
+            (line_number for line_number, _ in valid_rows),
+            converter.convert_many((item for _, item in valid_rows), fail_fast=False, fetch_date=fetch_date)
+        ))
+
+        for line_number, item in chunk:
+            result = results.get(line_number, item)
+            if isinstance(result, Exception):
+                failed += 1
+            else:
+                converted += 1
+            output.write(json.dumps(_format_result(line_number, result)) + '\n')
+
+        output.flush()
+        logger.info(f'Chunk of {len(chunk)} rows processed, {converted} converted and {failed} failed so far')
+
+    return converted, failed
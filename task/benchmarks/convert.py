@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of task.utils.convert against its previous implementation, run it with:
+
+    python -m task.benchmarks.convert
+"""
+import argparse
+import timeit
+from decimal import Decimal, ROUND_CEILING
+
+from task.utils import convert
+
+
+def legacy_convert(*, price: float, rate: float, operator: str) -> float:
+    """Previous implementation of convert (without logging), reference for the benchmark"""
+    rate_decimal = Decimal(str(rate))
+    price_decimal = Decimal(str(price))
+
+    if operator == '*':
+        result_decimal = price_decimal * rate_decimal
+    elif operator == '/':
+        result_decimal = price_decimal / rate_decimal
+    else:
+        raise ValueError("Invalid operators. Use '*' or '/'.")
+
+    return float(result_decimal.quantize(Decimal('.0001'), rounding=ROUND_CEILING))
+
+
+CASES = [
+    ('multiply, float rate', legacy_convert, {'price': 105.05, 'rate': 4.3692, 'operator': '*'}),
+    ('multiply, float rate', convert, {'price': 105.05, 'rate': 4.3692, 'operator': '*'}),
+    ('multiply, Decimal rate', convert, {'price': 105.05, 'rate': Decimal('4.3692'), 'operator': '*'}),
+    ('divide, float rate', legacy_convert, {'price': 459.0, 'rate': 4.3692, 'operator': '/'}),
+    ('divide, float rate', convert, {'price': 459.0, 'rate': 4.3692, 'operator': '/'}),
+    ('divide, Decimal rate', convert, {'price': 459.0, 'rate': Decimal('4.3692'), 'operator': '/'}),
+]
+
+
+def measure(cases: list, number: int, repeat: int) -> list:
+    """
+    Returns the best time of single call of every case in nanoseconds. Cases are measured in turns,
+    so drift of machine load affects all of them alike.
+    """
+    timers = [timeit.Timer(lambda func=func, kwargs=kwargs: func(**kwargs)) for _, func, kwargs in cases]
+    best = [float('inf')] * len(cases)
+    for _ in range(repeat):
+        for index, timer in enumerate(timers):
+            best[index] = min(best[index], timer.timeit(number))
+    return [seconds / number * 1e9 for seconds in best]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Micro-benchmark of convert')
+    parser.add_argument('-n', '--number', type=int, default=20_000, help='calls in one measurement')
+    parser.add_argument('-r', '--repeat', type=int, default=10, help='measurements, the best one is reported')
+    args = parser.parse_args(argv)
+
+    for _, func, kwargs in CASES:
+        assert func(**kwargs) == legacy_convert(**{**kwargs, 'rate': float(kwargs['rate'])})
+
+    for (name, func, _), ns_per_op in zip(CASES, measure(CASES, args.number, args.repeat)):
+        print(f'{func.__name__:<16}{name:<24}{ns_per_op:>10.1f} ns/op')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
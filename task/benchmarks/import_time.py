@@ -0,0 +1,96 @@
+"""
+Import-time regression benchmark of the CLI entry point, based on `python -X importtime`, run it with:
+
+    python -m task.benchmarks.import_time
+
+It exits with code 1 if import takes longer than the budget or if it loads dependencies, which are needed
+only by some modes and sources (they have to be imported lazily, by code which uses them).
+"""
+import argparse
+import re
+import subprocess
+import sys
+from typing import Iterable
+
+MODULE = 'task.__main__'
+BUDGET_MS = 150  # cumulative import time of MODULE, measured about 60 ms
+LAZY_DEPENDENCIES = ('sqlalchemy', 'requests', 'numpy')  # loaded only by PROD mode, API source and big batches
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(output: str) -> list:
+    """
+    Parses stderr of `python -X importtime`.
+
+    :param output: stderr of the interpreter
+    :return: list of (module, self_us, cumulative_us, depth) tuples in output order
+    """
+    entries = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def measure_import(module: str = MODULE) -> list:
+    """Imports module in a fresh interpreter and returns its parsed import times, see parse_importtime"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return parse_importtime(completed.stderr)
+
+
+def get_total_ms(entries: list, module: str = MODULE) -> float:
+    """Returns cumulative import time of module in milliseconds"""
+    return next(cumulative for name, _, cumulative, _ in entries if name == module) / 1000
+
+
+def get_module_imports(entries: list, module: str = MODULE) -> list:
+    """Returns entries of module and modules imported by it, interpreter startup imports are skipped"""
+    end = next(index for index, (name, *_) in enumerate(entries) if name == module)
+    start = max((index + 1 for index, entry in enumerate(entries[:end]) if entry[3] == 0), default=0)
+    return entries[start:end + 1]
+
+
+def get_loaded_dependencies(entries: list, dependencies: Iterable[str] = LAZY_DEPENDENCIES) -> list:
+    """Returns dependencies (top-level packages), which were imported by MODULE"""
+    loaded = {name.split('.')[0] for name, *_ in get_module_imports(entries)}
+    return [dependency for dependency in dependencies if dependency in loaded]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Import-time regression benchmark of python -m task')
+    parser.add_argument('-b', '--budget', type=float, default=BUDGET_MS, help='max import time in ms')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='measurements, the best one is reported')
+    parser.add_argument('-t', '--top', type=int, default=10, help='number of the slowest modules reported')
+    args = parser.parse_args(argv)
+
+    runs = [measure_import() for _ in range(args.repeat)]
+    best = min(runs, key=get_total_ms)
+    total_ms = get_total_ms(best)
+
+    print(f'{MODULE} imported in {total_ms:.1f} ms (budget {args.budget:.1f} ms), the slowest direct imports:')
+    direct_imports = [entry for entry in get_module_imports(best) if entry[3] == 1]
+    for name, _, cumulative_us, _ in sorted(direct_imports, key=lambda entry: -entry[2])[:args.top]:
+        print(f'{name:<48}{cumulative_us / 1000:>10.1f} ms')
+
+    exit_code = 0
+    loaded = get_loaded_dependencies(best)
+    if loaded:
+        print(f'FAILED: {", ".join(loaded)} imported eagerly, they have to be imported where they are used')
+        exit_code = 1
+    if total_ms > args.budget:
+        print(f'FAILED: import time over budget by {total_ms - args.budget:.1f} ms')
+        exit_code = 1
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,192 @@
+"""
+Throughput and latency benchmark of python -m task serve against local stand-in of NBP API, run it with:
+
+    python -m task.benchmarks.server
+
+Server runs in development mode with API source, database, rate cache and ISO codes snapshot are stored
+in temporary directory.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlsplit
+
+from task import config
+from task.connectors.api.http_client import reset_http_client
+from task.connectors.database.utils import keep_db_connector
+from task.server import ConversionServer
+from task.setup_loger import disable_file_logging
+from task.utils import Mode, Source
+
+NBP_TABLE = [{
+    'table': 'A',
+    'rates': [
+        {'currency': 'euro', 'code': 'EUR', 'mid': 4.3692},
+        {'currency': 'dolar amerykański', 'code': 'USD', 'mid': 3.9966},
+        {'currency': 'korona czeska', 'code': 'CZK', 'mid': 0.1787},
+    ]
+}]
+NBP_RATES = {rate['code']: rate['mid'] for rate in NBP_TABLE[0]['rates']}
+
+
+class NbpStandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves NBP_TABLE rates like NBP API, as published on effective date of the server, after its delay,
+    and counts requests by path
+    """
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        self.server.requests[path] += 1
+        time.sleep(self.server.delay)
+
+        effective_date = self.server.effective_date or datetime.date.today().isoformat()
+        parts = path.strip('/').split('/')  # api/exchangerates/rates/a/{code}/{date} or api/exchangerates/tables/a/...
+        dates = parts[4:] if parts[2] == 'tables' else parts[5:]  # today, last/1, {date} or {start}/{end}
+        if len(dates[-1]) == len('YYYY-MM-DD'):
+            effective_date = dates[-1]  # the same rates are served as published on every requested date
+
+        if dates[0] == 'today' and effective_date != datetime.date.today().isoformat():
+            self._respond(404, {'error': 'Not Found'})  # rates for today are not published yet
+        elif parts[2] == 'tables':
+            self._respond(200, [{**NBP_TABLE[0], 'effectiveDate': effective_date}])
+        elif parts[4].upper() in NBP_RATES:
+            self._respond(200, {
+                'code': parts[4].upper(),
+                'rates': [{'effectiveDate': effective_date, 'mid': NBP_RATES[parts[4].upper()]}]
+            })
+        else:
+            self._respond(404, {'error': 'Not Found'})
+
+    def _respond(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class NbpStandIn(ThreadingHTTPServer):
+    """Local stand-in of NBP API served in background thread, config.NBP_API_URL has to point to url"""
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0, effective_date: Optional[str] = None) -> None:
+        super().__init__(('127.0.0.1', 0), NbpStandInHandler)
+        self.delay = delay  # seconds every response waits, like round trip to real API
+        self.effective_date = effective_date  # date rates were published on, today by default
+        self.requests = Counter()  # path: number of requests
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/api'
+
+    def __enter__(self) -> 'NbpStandIn':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, target: str,
+                  payload=None) -> tuple:
+    """Sends request over keep-alive connection and returns (status, JSON body) of response"""
+    body = b'' if payload is None else json.dumps(payload).encode()
+    head = f'{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n'
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode().partition(':')
+        headers[name.lower()] = value.strip()
+
+    return status, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+
+async def run_clients(port: int, connections: int, requests_per_connection: int, currencies: list) -> list:
+    """
+    Sends convert requests from many keep-alive connections concurrently.
+
+    :return: list of (status, JSON body, latency in seconds) tuples
+    """
+    async def client(number: int) -> list:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = []
+        try:
+            for i in range(requests_per_connection):
+                currency = currencies[(number + i) % len(currencies)]
+                start = time.perf_counter()
+                status, body = await request(reader, writer, 'POST', '/convert', {'currency': currency, 'price': 100})
+                responses.append((status, body, time.perf_counter() - start))
+        finally:
+            writer.close()
+        return responses
+
+    results = await asyncio.gather(*(client(number) for number in range(connections)))
+    return [response for responses in results for response in responses]
+
+
+async def _measure(connections: int, requests_per_connection: int) -> tuple:
+    server = ConversionServer(port=0)
+    await server.start()
+    try:
+        start = time.perf_counter()
+        responses = await run_clients(server.port, connections, requests_per_connection, ['eur', 'usd', 'czk'])
+        return time.perf_counter() - start, responses
+    finally:
+        await server.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Throughput and latency benchmark of conversion server')
+    parser.add_argument('-c', '--connections', type=int, default=10, help='concurrent keep-alive connections')
+    parser.add_argument('-n', '--requests', type=int, default=100, help='requests sent by every connection')
+    parser.add_argument('-d', '--delay', type=float, default=0.05, help='seconds of NBP API stand-in response')
+    args = parser.parse_args(argv)
+
+    disable_file_logging()
+    with tempfile.TemporaryDirectory() as directory, NbpStandIn(args.delay) as nbp:
+        config.JSON_DATABASE_NAME = os.path.join(directory, 'database.json')
+        config.RATE_CACHE_PATH = os.path.join(directory, 'rate_cache.sqlite3')
+        config.ISO_CODE_SNAPSHOT = os.path.join(directory, 'currency_iso_codes.marshal')
+        config.NBP_API_URL = nbp.url
+        config.RUN_CONFIG.update({'MODE': Mode.DEV.value, 'SOURCE': Source.API.value, 'EFFECTIVE_RATE': False})
+        with open(config.JSON_DATABASE_NAME, 'w') as file:
+            file.write('{}')
+
+        reset_http_client()
+        with keep_db_connector():
+            elapsed, responses = asyncio.run(_measure(args.connections, args.requests))
+        reset_http_client()
+
+    latencies = [latency for _, _, latency in responses]
+    quantiles = statistics.quantiles(latencies, n=100)
+    failed = sum(status != 200 for status, _, _ in responses)
+
+    print(f'{len(responses)} requests ({failed} failed) in {elapsed:.2f} s: {len(responses) / elapsed:.0f} requests/s')
+    print(f'latency p50 {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, '
+          f'p99 {quantiles[98] * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms')
+    print(f'NBP API stand-in requests: {sum(nbp.requests.values())}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
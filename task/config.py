@@ -3,10 +3,63 @@ import os
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOCAL_DATA_SOURCES = os.path.join(ROOT_DIR, 'example_currency_rates.json')
+BACKFILL_RATES_PATH = os.path.join(ROOT_DIR, 'backfilled_currency_rates.json')  # default output of backfill command
 JSON_DATABASE_NAME = os.path.join(ROOT_DIR, 'database.json')
+JSON_JOURNAL_NAME = os.path.join(ROOT_DIR, 'database.jsonl')
 ISO_CODE_BASE = os.path.join(ROOT_DIR, 'currency_iso_codes.json')
+ISO_CODE_SNAPSHOT = os.path.join(ROOT_DIR, 'currency_iso_codes.marshal')  # regenerated when ISO_CODE_BASE changes
+
+LOCAL_DATA_SOURCES_STREAMING_THRESHOLD = 32 * 1024 * 1024  # bytes, bigger files are read currency by currency
+LOCAL_DATA_SOURCES_CACHED_CURRENCIES = 8  # parsed currencies kept in memory in streaming mode
+
+JSON_DATABASE_FORMAT = 'JSON'  # 'JOURNAL' appends new records to JSON_JOURNAL_NAME instead of rewriting database
+JSON_JOURNAL_COMPACTION_THRESHOLD = 10_000  # records in journal, which trigger merging it into database file
+
+SQL_ECHO = False  # if True, SQLAlchemy logs every SQL statement
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers do not block writer
+    'synchronous': 'NORMAL',  # safe with WAL, fsync only on checkpoints
+    'mmap_size': 256 * 1024 * 1024,
+}
+SQLITE_BUSY_TIMEOUT = 30  # seconds connection waits for lock held by another process
+SQLITE_LOCKED_RETRIES = 3  # retries of write failed with "database is locked" after busy timeout
+SQLITE_LOCKED_RETRY_DELAY = 0.5  # seconds before first retry, doubled with every next one
+
+RATE_CACHE_PATH = os.path.join(ROOT_DIR, 'rate_cache.sqlite3')
+RATE_CACHE_TTL = 24 * 60 * 60  # seconds
+RATE_CACHE_MAX_ENTRIES = 10_000
+EFFECTIVE_DATE_CACHE_TTL = 10 * 60  # seconds, effective rate is used for today at most that long after NBP publishes
+
+NBP_API_URL = 'http://api.nbp.pl/api'
+NBP_API_MAX_RANGE_DAYS = 93  # max length of date range accepted by NBP API in one request
+
+HTTP_CONNECT_TIMEOUT = 3.05  # seconds
+HTTP_READ_TIMEOUT = 10  # seconds
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.3
+HTTP_BACKOFF_JITTER = 0.3
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 10
+
+ASYNC_FETCH_CONCURRENCY = HTTP_POOL_MAXSIZE  # concurrent requests should not exceed pooled connections
+
+EFFECTIVE_RATE_LOOKBACK_DAYS = 14  # NBP does not have longer breaks in publishing rates
+
+BACKFILL_REQUESTS_PER_SECOND = 2
+BACKFILL_BURST = 5
+
+BATCH_CHUNK_SIZE = 1000  # rows converted and saved at once in file conversion mode
+DB_ITER_BATCH_SIZE = 1000  # rows fetched from database at once by iter_all
+CONVERT_ARRAY_MIN_SIZE = 32  # prices of one currency converted with numpy (convert_array), if there are more
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8080
+SERVER_KEEP_ALIVE_TIMEOUT = 15  # seconds idle connection is kept open
+SERVER_MAX_BODY_SIZE = 8 * 1024 * 1024  # bytes
+SERVER_HISTORY_LIMIT = 100  # records returned by history endpoint, if limit is not given
 
 RUN_CONFIG = {
     'MODE': '',
-    'SOURCE': ''
+    'SOURCE': '',
+    'EFFECTIVE_RATE': False
 }
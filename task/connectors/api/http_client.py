@@ -0,0 +1,114 @@
+from typing import Optional
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from task import config
+from task.setup_loger import setup_loger
+
+logger = setup_loger(__name__)
+
+
+class HttpClientError(Exception):
+    """
+    Request failed with connection error, timeout or error status of response. HttpClient raises it instead
+    of requests exceptions, so modules importing requests lazily do not need it to handle errors.
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HttpClient:
+    """
+    Wrapper of requests.Session which keeps connections alive in a pool, sets connect/read timeouts
+    and retries requests with jittered exponential backoff on connection errors and 5xx responses.
+    """
+
+    retry_status_codes = (500, 502, 503, 504)
+
+    def __init__(
+            self,
+            *,
+            connect_timeout: float,
+            read_timeout: float,
+            max_retries: int,
+            backoff_factor: float,
+            backoff_jitter: float,
+            pool_connections: int,
+            pool_maxsize: int
+    ) -> None:
+        self._timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            status_forcelist=self.retry_status_codes,
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False  # last response is returned, so raise_for_status() reports the error
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @property
+    def timeout(self) -> tuple:
+        return self._timeout
+
+    def get(self, url: str, **kwargs) -> Response:
+        """
+        Makes GET request with pooled session, default timeout is used if it is not passed.
+        HttpClientError is raised if request fails, response with error status is returned.
+        """
+        kwargs.setdefault('timeout', self._timeout)
+        try:
+            return self._session.get(url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise HttpClientError(str(e)) from e
+
+    @staticmethod
+    def raise_for_status(response: Response) -> None:
+        """Raises HttpClientError if response has error status"""
+        try:
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise HttpClientError(str(e), response.status_code) from e
+
+    def close(self) -> None:
+        """Closes all pooled connections"""
+        self._session.close()
+
+
+_http_client: Optional[HttpClient] = None
+
+
+def get_http_client() -> HttpClient:
+    """Returns process-wide HttpClient instance configured with task.config HTTP_* values"""
+    global _http_client
+
+    if _http_client is None:
+        _http_client = HttpClient(
+            connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=config.HTTP_READ_TIMEOUT,
+            max_retries=config.HTTP_MAX_RETRIES,
+            backoff_factor=config.HTTP_BACKOFF_FACTOR,
+            backoff_jitter=config.HTTP_BACKOFF_JITTER,
+            pool_connections=config.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=config.HTTP_POOL_MAXSIZE
+        )
+    return _http_client
+
+
+def reset_http_client() -> None:
+    """Closes process-wide HttpClient, next get_http_client() call creates it again with current config"""
+    global _http_client
+
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
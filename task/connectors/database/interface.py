@@ -1,15 +1,28 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Type
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence, Type
 
 if TYPE_CHECKING:
     from task.currency_converter import ConvertedPricePLN
 
 
+@dataclass(frozen=True)
+class ConversionSummary:
+    """Aggregated conversions of one currency with rate of one date"""
+    currency: str
+    date: str
+    count: int
+    total_price_in_pln: float
+    average_rate: float
+
+
 class DBConnectorInterface(ABC):
     """Enables operations on DB"""
 
+    query_order_fields = ('id', 'currency', 'rate', 'price_in_pln', 'date')
+
     @abstractmethod
     def save(self, entity: ConvertedPricePLN) -> None:
         """
@@ -20,6 +33,15 @@ class DBConnectorInterface(ABC):
         """
         raise NotImplementedError()
 
+    def save_many(self, entities: Sequence[ConvertedPricePLN]) -> None:
+        """
+        Saves many entities with single write, so either all of them or none is saved.
+
+        :param entities: ConvertedPricePLN instances
+        :return: None if save is success, otherwise raise exception
+        """
+        raise NotImplementedError()
+
     def get_all(self, entity_cls: Type[ConvertedPricePLN]) -> list[ConvertedPricePLN]:
         """
         Get all data and converts it to dataclass ConvertedPriceToPLN instances.
@@ -29,6 +51,21 @@ class DBConnectorInterface(ABC):
         """
         raise NotImplementedError()
 
+    def iter_all(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            batch_size: Optional[int] = None
+    ) -> Iterator[ConvertedPricePLN]:
+        """
+        Get all data lazily, rows are read in batches and converted to dataclass ConvertedPriceToPLN
+        instances one by one, so memory use does not depend on number of rows.
+
+        :param entity_cls: ConvertedPricePLN class
+        :param batch_size: number of rows read at once, config.DB_ITER_BATCH_SIZE by default
+        :return: iterator of ConvertedPricePLN instances ordered by id
+        """
+        raise NotImplementedError()
+
     def get_by_id(self, entity_cls: Type[ConvertedPricePLN], id_: int) -> ConvertedPricePLN:
         """
         Get data with concrete id and converts it to dataclass ConvertedPriceToPLN instance.
@@ -38,3 +75,58 @@ class DBConnectorInterface(ABC):
         :return: ConvertedPricePLN instance
         """
         raise NotImplementedError()
+
+    def query(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            *,
+            currency: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None,
+            price_min: Optional[float] = None,
+            price_max: Optional[float] = None,
+            order_by: str = 'id',
+            descending: bool = False,
+            limit: Optional[int] = None,
+            offset: int = 0
+    ) -> list[ConvertedPricePLN]:
+        """
+        Get data matching all given filters and converts it to dataclass ConvertedPriceToPLN instances.
+
+        :param entity_cls: ConvertedPricePLN class
+        :param currency: string ISO currency code
+        :param date_from: first rate fetch date (%Y-%m-%d), included
+        :param date_to: last rate fetch date (%Y-%m-%d), included
+        :param price_min: min price in PLN, included
+        :param price_max: max price in PLN, included
+        :param order_by: one of query_order_fields
+        :param descending: if True, results are ordered descending
+        :param limit: max number of results
+        :param offset: number of skipped results
+        :return: list of ConvertedPricePLN instances
+        """
+        raise NotImplementedError()
+
+    def aggregate(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            *,
+            currency: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None
+    ) -> list[ConversionSummary]:
+        """
+        Groups data matching all given filters by currency and rate fetch date, without converting it
+        to dataclass ConvertedPriceToPLN instances.
+
+        :param entity_cls: ConvertedPricePLN class
+        :param currency: string ISO currency code
+        :param date_from: first rate fetch date (%Y-%m-%d), included
+        :param date_to: last rate fetch date (%Y-%m-%d), included
+        :return: list of ConversionSummary instances ordered by currency and date
+        """
+        raise NotImplementedError()
+
+    def _validate_order_by(self, order_by: str) -> None:
+        if order_by not in self.query_order_fields:
+            raise ValueError(f'Invalid order_by: {order_by}. Use one of {", ".join(self.query_order_fields)}.')
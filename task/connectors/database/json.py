@@ -1,55 +1,266 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence, Type
 
+import bisect
 import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, writes are not locked there
+    fcntl = None
 
 from task import config
-from task.connectors.database.interface import DBConnectorInterface
+from task.connectors.database.interface import ConversionSummary, DBConnectorInterface
+from task.connectors.database.migrations import upgrade_legacy_record
+from task.connectors.local.json_stream import iter_object_items
+from task.file_utils import atomic_write
+from task.utils import AMOUNT_SCALE, to_scaled_amount
 
 if TYPE_CHECKING:
     from task.currency_converter import ConvertedPricePLN
 
 
 class JsonFileDatabaseConnector(DBConnectorInterface):
-    """Enables to connect and do some operations ond JSON database"""
+    """
+    Enables to connect and do some operations ond JSON database. Writes are safe for many processes:
+    they hold advisory lock of database, read it again if it was changed by another process
+    and replace file atomically (write to temporary file and rename).
+    """
 
     def __init__(self) -> None:
-        self._data = self._read_data()
+        self._loaded_data = None
+        self._signature = None  # of database file read into self._loaded_data
+        self._next_id = None
+        self._currency_date_index = None
 
-    @staticmethod
-    def _read_data() -> dict:
+    @property
+    def _data(self) -> dict:
+        """Records keyed by int id, database is read on first use, so iter_all alone does not load it whole"""
+        if self._loaded_data is None:
+            self._loaded_data = self._read_data()
+        return self._loaded_data
+
+    def _read_data(self) -> dict:
+        """
+        Reads records, JSON object keys are always strings, so records are keyed by their int id.
+        Records stored by older versions are upgraded.
+        """
+        self._signature = self._get_signature(config.JSON_DATABASE_NAME)
         with open(config.JSON_DATABASE_NAME, "r") as file:
-            return json.load(file)
+            return {int(v['id']): upgrade_legacy_record(v) for v in json.load(file).values()}
+
+    @staticmethod
+    def _get_signature(path: str) -> Optional[tuple]:
+        """Returns (inode, mtime, size) of file, which changes when file is modified or replaced"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """Holds exclusive advisory lock of database, so processes write it one by one"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(f'{config.JSON_DATABASE_NAME}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """
+        Drops (json) dict, if database file was changed by another process since it was read. It is done
+        before every read too, so connector instance kept by long-running process does not return stale data.
+        """
+        if self._loaded_data is not None and self._get_signature(config.JSON_DATABASE_NAME) != self._signature:
+            self._loaded_data = None
+            self._next_id = None
+            self._currency_date_index = None
 
     def save(self, entity: ConvertedPricePLN) -> None:  # changed int to None, to keep consistency
-        generated_id = self._generate_id()
+        self.save_many([entity])
+
+    def save_many(self, entities: Sequence[ConvertedPricePLN]) -> None:
+        """Adds all entities to up-to-date (json) dict and writes file once, under lock of database"""
+        if not entities:
+            return
+
+        with self._lock():
+            self._refresh()
+            for entity in entities:
+                generated_id = self._generate_id()
 
-        data_item = {'id': generated_id}
-        data_item.update(entity.serialize())
+                data_item = {'id': generated_id}
+                data_item.update(entity.serialize())
 
-        self._data.update({generated_id: data_item})
-        self._write_data_to_db()
+                self._data.update({generated_id: data_item})
+            self._currency_date_index = None
+            self._write_data_to_db()
 
     def get_all(self, entity_cls: [ConvertedPricePLN]) -> list[ConvertedPricePLN]:
         """Gets necessary data from (json) dict and maps into list of ConvertedPricePLN instances"""
+        self._refresh()
         return [entity_cls.deserialize(v) for _, v in self._data.items()]
 
+    def iter_all(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            batch_size: Optional[int] = None
+    ) -> Iterator[ConvertedPricePLN]:
+        """
+        Streams records and maps them lazily into ConvertedPricePLN instances. File is read in chunks
+        of bytes, so batch_size is not used.
+        """
+        for v in self._iter_records():
+            yield entity_cls.deserialize(v)
+
+    def _iter_records(self) -> Iterator[dict]:
+        """Yields records from json file member by member, or from (json) dict if it is already read"""
+        self._refresh()
+        if self._loaded_data is not None:
+            yield from list(self._loaded_data.values())
+            return
+
+        with open(config.JSON_DATABASE_NAME, 'rb') as file:
+            for _, v in iter_object_items(file):
+                yield upgrade_legacy_record(v)
+
     def get_by_id(self, entity_cls: [ConvertedPricePLN], id_: int) -> ConvertedPricePLN:
         """Gets necessary data from (json) dict by input id and maps into ConvertedPricePLN instance"""
-        obj = [entity_cls.deserialize(v) for _, v in self._data.items() if v['id'] == id_]
-        if len(obj) == 0:
+        self._refresh()
+        data_item = self._data.get(id_)
+        if data_item is None:
             raise Exception(f'No object {entity_cls.__name__} with id={id_}.')
 
-        return obj[0]
+        return entity_cls.deserialize(data_item)
+
+    def _get_currency_date_index(self) -> dict:
+        """
+        Returns {currency: (dates, keys)} index, where dates are sorted and keys are self._data keys of records
+        with the date at the same position. It enables to find records of currency in date range with bisect.
+        """
+        if self._currency_date_index is None:
+            grouped = {}
+            for key, item in self._data.items():
+                grouped.setdefault(item['currency'].lower(), []).append((item['date'], item['id'], key))
+
+            self._currency_date_index = {}
+            for currency, entries in grouped.items():
+                entries.sort()
+                self._currency_date_index[currency] = (
+                    [date for date, _, _ in entries],
+                    [key for _, _, key in entries]
+                )
+
+        return self._currency_date_index
+
+    def query(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            *,
+            currency: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None,
+            price_min: Optional[float] = None,
+            price_max: Optional[float] = None,
+            order_by: str = 'id',
+            descending: bool = False,
+            limit: Optional[int] = None,
+            offset: int = 0
+    ) -> list[ConvertedPricePLN]:
+        """
+        Gets records matching filters, with (currency, date) in-memory index if currency is given,
+        and maps only the requested page into ConvertedPricePLN instances
+        """
+        self._validate_order_by(order_by)
+        self._refresh()
+
+        if currency is not None:
+            dates, keys = self._get_currency_date_index().get(currency.lower(), ([], []))
+            start = bisect.bisect_left(dates, date_from) if date_from is not None else 0
+            end = bisect.bisect_right(dates, date_to) if date_to is not None else len(dates)
+            records = [self._data[key] for key in keys[start:end]]
+        else:
+            records = [
+                v for v in self._data.values()
+                if (date_from is None or v['date'] >= date_from) and (date_to is None or v['date'] <= date_to)
+            ]
+
+        if price_min is not None or price_max is not None:
+            price_min = None if price_min is None else to_scaled_amount(price_min)
+            price_max = None if price_max is None else to_scaled_amount(price_max)
+            records = [
+                v for v in records
+                if (price_min is None or v['price_in_pln'] >= price_min)
+                and (price_max is None or v['price_in_pln'] <= price_max)
+            ]
+
+        records.sort(key=lambda v: (v[order_by], v['id']), reverse=descending)
+        records = records[offset:None if limit is None else offset + limit]
+
+        return [entity_cls.deserialize(v) for v in records]
+
+    def aggregate(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            *,
+            currency: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None
+    ) -> list[ConversionSummary]:
+        """
+        Groups records matching filters by currency and date in single pass over streamed records,
+        records are not mapped into ConvertedPricePLN instances
+        """
+        if currency is not None:
+            currency = currency.lower()
+
+        groups = {}  # (currency, date): [count, total price in PLN (scaled), sum of rates]
+        for v in self._iter_records():
+            if (
+                    (currency is not None and v['currency'].lower() != currency)
+                    or (date_from is not None and v['date'] < date_from)
+                    or (date_to is not None and v['date'] > date_to)
+            ):
+                continue
+
+            group = groups.get((v['currency'], v['date']))
+            if group is None:
+                group = groups[v['currency'], v['date']] = [0, 0, 0.0]
+            group[0] += 1
+            group[1] += v['price_in_pln']
+            group[2] += v['rate']
+
+        return [
+            ConversionSummary(currency_, date, count, total_price_in_pln / AMOUNT_SCALE, rates_sum / count)
+            for (currency_, date), (count, total_price_in_pln, rates_sum) in sorted(groups.items())
+        ]
 
     def _generate_id(self) -> int:
-        """Generates next id"""
-        if self._data.values():
-            return max((obj['id'] for obj in self._data.values())) + 1
-        return 1
+        """
+        Generates next id with counter seeded once, when database is read. There is no delete operation,
+        so the counter is always greater than every stored id.
+        """
+        if self._next_id is None:
+            self._next_id = max(self._data, default=0) + 1
+
+        generated_id = self._next_id
+        self._next_id += 1
+        return generated_id
 
     def _write_data_to_db(self) -> None:
-        """Writes self._data to json file"""
-        with open(config.JSON_DATABASE_NAME, 'w') as file:
+        """
+        Writes self._data to temporary file and replaces json file with it, so readers never see
+        partially written database and failed write leaves previous version intact
+        """
+        with atomic_write(config.JSON_DATABASE_NAME) as file:
             json.dump(self._data, file, indent=2)
+        self._signature = self._get_signature(config.JSON_DATABASE_NAME)
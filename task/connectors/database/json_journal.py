@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator, Sequence
+
+import io
+import json
+import os
+
+from task import config
+from task.connectors.database.json import JsonFileDatabaseConnector
+from task.connectors.database.migrations import upgrade_legacy_record
+from task.connectors.local.json_stream import iter_object_items
+from task.setup_loger import setup_loger
+
+if TYPE_CHECKING:
+    from task.currency_converter import ConvertedPricePLN
+
+logger = setup_loger(__name__)
+
+
+class JsonJournalDatabaseConnector(JsonFileDatabaseConnector):
+    """
+    JSON database, where new records are appended as single lines to JSONL journal instead of rewriting
+    the whole database file. State is rebuilt from database.json snapshot and records replayed from journal.
+    Compaction merges journal into snapshot and truncates journal, it is done on demand with compact()
+    or automatically when journal grows over config.JSON_JOURNAL_COMPACTION_THRESHOLD records.
+    Under lock of database, records appended by other processes are replayed before append. Connector, which
+    has not read database yet, appends without reading it: next id is taken from the last journal line
+    and the last snapshot id, which compaction stores in small sidecar file next to snapshot.
+    """
+
+    def __init__(self) -> None:
+        self._journal_records = 0
+        self._journal_offset = 0  # bytes of journal replayed into self._loaded_data
+        super().__init__()
+
+    def _read_data(self) -> dict:
+        """Reads snapshot and replays journal on top of it, records are keyed by id and upgraded if needed"""
+        self._signature = self._get_signature(config.JSON_DATABASE_NAME)
+        try:
+            with open(config.JSON_DATABASE_NAME, "r") as file:
+                data = {int(v['id']): upgrade_legacy_record(v) for v in json.load(file).values()}
+        except FileNotFoundError:
+            data = {}
+
+        self._journal_records = 0
+        self._journal_offset = 0
+        self._replay_journal(data)
+
+        return data
+
+    def _replay_journal(self, data: dict) -> None:
+        """
+        Applies complete journal lines written after self._journal_offset to data. Line without newline
+        at the end is not replayed yet, it might be appended by another process right now.
+        """
+        try:
+            with open(config.JSON_JOURNAL_NAME, "rb") as file:
+                file.seek(self._journal_offset)
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+
+                    offset = self._journal_offset
+                    self._journal_offset += len(line)
+                    if not line.strip():
+                        continue
+
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        # process was killed during append
+                        logger.warning(f'Invalid line at byte {offset} of journal {config.JSON_JOURNAL_NAME} skipped.')
+                        continue
+
+                    item_id = int(item['id'])
+                    data[item_id] = upgrade_legacy_record(item)
+                    self._journal_records += 1
+                    if self._next_id is not None:
+                        self._next_id = max(self._next_id, item_id + 1)
+        except FileNotFoundError:
+            pass
+
+    def _refresh(self) -> None:
+        """
+        Reads database again if snapshot was replaced by another process (compaction), otherwise replays
+        only journal lines appended since last read
+        """
+        if self._loaded_data is None:
+            return
+
+        if self._get_signature(config.JSON_DATABASE_NAME) != self._signature:
+            super()._refresh()
+            return
+
+        journal_records = self._journal_records
+        self._replay_journal(self._loaded_data)
+        if self._journal_records != journal_records:
+            self._currency_date_index = None
+
+    def _iter_records(self) -> Iterator[dict]:
+        """
+        Yields records from snapshot and then from journal line by line, without building (json) dict.
+        Journal records with id not greater than the last snapshot id are already in snapshot
+        (compaction interrupted before truncation), so they are skipped.
+        """
+        if self._loaded_data is not None:
+            yield from super()._iter_records()
+            return
+
+        last_id = 0
+        try:
+            with open(config.JSON_DATABASE_NAME, 'rb') as file:
+                for _, v in iter_object_items(file):
+                    last_id = max(last_id, int(v['id']))
+                    yield upgrade_legacy_record(v)
+        except FileNotFoundError:
+            pass
+
+        try:
+            with open(config.JSON_JOURNAL_NAME, 'r') as file:
+                for line in file:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    if int(item['id']) > last_id:
+                        yield upgrade_legacy_record(item)
+        except FileNotFoundError:
+            pass
+
+    def save(self, entity: ConvertedPricePLN) -> None:
+        self.save_many([entity])
+
+    def save_many(self, entities: Sequence[ConvertedPricePLN]) -> None:
+        """
+        Appends entities to journal with single write, under lock. If database was already read, entities are
+        added to up-to-date (json) dict too, otherwise it is not read at all (one-shot conversion of CLI).
+        """
+        if not entities:
+            return
+
+        with self._lock():
+            if self._loaded_data is None:
+                journal_records = self._append_without_reading(entities)
+            else:
+                journal_records = self._append_to_data(entities)
+
+            if journal_records >= config.JSON_JOURNAL_COMPACTION_THRESHOLD:
+                self._compact()
+
+    def _append_to_data(self, entities: Sequence[ConvertedPricePLN]) -> int:
+        """Adds entities to up-to-date (json) dict and appends them to journal, returns journal records number"""
+        self._refresh()
+
+        lines = []
+        for entity in entities:
+            generated_id = self._generate_id()
+
+            data_item = {'id': generated_id}
+            data_item.update(entity.serialize())
+
+            self._data[generated_id] = data_item
+            lines.append(json.dumps(data_item) + '\n')
+        self._currency_date_index = None
+
+        self._journal_offset = self._append_to_journal(lines)
+        self._journal_records += len(lines)
+        return self._journal_records
+
+    def _append_without_reading(self, entities: Sequence[ConvertedPricePLN]) -> int:
+        """
+        Appends entities to journal with ids following the last stored one, returns journal records number.
+        Ids are generated one by one under lock, so journal records follow the last snapshot id without gaps.
+        """
+        snapshot_last_id = self._get_snapshot_last_id()
+        last_id = max(snapshot_last_id, self._get_journal_last_id())
+
+        lines = []
+        for generated_id, entity in enumerate(entities, start=last_id + 1):
+            data_item = {'id': generated_id}
+            data_item.update(entity.serialize())
+            lines.append(json.dumps(data_item) + '\n')
+
+        self._append_to_journal(lines)
+        return last_id - snapshot_last_id + len(lines)
+
+    @staticmethod
+    def _get_last_id_path() -> str:
+        return f'{config.JSON_DATABASE_NAME}.last_id'
+
+    def _get_snapshot_last_id(self) -> int:
+        """
+        Returns the greatest id of snapshot. It is read from sidecar file, which is valid only for snapshot
+        of the same signature. Snapshot is read (streamed) only when it was written by something else than
+        compaction, e.g. JSON connector.
+        """
+        signature = self._get_signature(config.JSON_DATABASE_NAME)
+        try:
+            with open(self._get_last_id_path(), 'r') as file:
+                stored = json.load(file)
+            if tuple(stored['signature'] or ()) == (signature or ()):
+                return int(stored['last_id'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass
+
+        last_id = 0
+        try:
+            with open(config.JSON_DATABASE_NAME, 'rb') as file:
+                for _, v in iter_object_items(file):
+                    last_id = max(last_id, int(v['id']))
+        except FileNotFoundError:
+            pass
+
+        self._write_snapshot_last_id(signature, last_id)
+        return last_id
+
+    def _write_snapshot_last_id(self, signature: tuple, last_id: int) -> None:
+        with open(self._get_last_id_path(), 'w') as file:
+            json.dump({'signature': signature, 'last_id': last_id}, file)
+
+    @staticmethod
+    def _get_journal_last_id() -> int:
+        """
+        Returns id of the last complete record of journal, journal is read backwards from its end in chunks,
+        until a complete record is found
+        """
+        try:
+            with open(config.JSON_JOURNAL_NAME, 'rb') as file:
+                end = position = file.seek(0, os.SEEK_END)
+                while position > 0:
+                    position = max(0, position - io.DEFAULT_BUFFER_SIZE)
+                    file.seek(position)
+                    lines = file.read(end - position).split(b'\n')
+
+                    # the last line is incomplete or empty, the first one may start before the chunk
+                    for line in reversed(lines[1:-1] if position else lines[:-1]):
+                        try:
+                            return int(json.loads(line)['id'])
+                        except (ValueError, KeyError, TypeError):
+                            continue
+        except FileNotFoundError:
+            pass
+
+        return 0
+
+    @staticmethod
+    def _append_to_journal(lines: list) -> int:
+        """Appends lines to journal with single write and returns journal size"""
+        with open(config.JSON_JOURNAL_NAME, 'ab+') as file:
+            if file.seek(0, os.SEEK_END) > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    lines = ['\n'] + lines  # incomplete line of interrupted append is kept apart from new ones
+            file.write(''.join(lines).encode())
+            return file.tell()
+
+    def compact(self) -> None:
+        """Merges journal into snapshot, under lock of database"""
+        with self._lock():
+            self._refresh()
+            self._compact()
+
+    def _compact(self) -> None:
+        """Writes whole state to snapshot file (atomically, with temporary file) and truncates journal"""
+        super()._write_data_to_db()
+        self._write_snapshot_last_id(self._signature, max(self._data, default=0))
+
+        # replaying records already stored in snapshot is harmless, so crash before truncation loses nothing
+        with open(config.JSON_JOURNAL_NAME, 'w'):
+            pass
+
+        logger.info(f'Journal compacted, {self._journal_records} records merged into {config.JSON_DATABASE_NAME}.')
+        self._journal_records = 0
+        self._journal_offset = 0
+
+    def _write_data_to_db(self) -> None:
+        """Whole state is written only by compaction"""
+        self._compact()
@@ -0,0 +1,19 @@
+from task.utils import convert, to_scaled_amount
+
+
+def upgrade_legacy_record(data: dict) -> dict:
+    """
+    Maps record stored by older versions, with price in PLN as float and without source price,
+    into current structure with amounts as scaled integers. Source price is computed from price in PLN
+    and rate, the way it was computed on every read before. Current records are returned unchanged.
+
+    :param data: record dict with currency, rate, price_in_pln and date keys (and id, if stored with it)
+    :return: record dict with price and price_in_pln as scaled integers
+    """
+    if 'price' in data:
+        return data
+
+    upgraded = dict(data)
+    upgraded['price'] = to_scaled_amount(convert(price=data['price_in_pln'], rate=data['rate'], operator='/'))
+    upgraded['price_in_pln'] = to_scaled_amount(data['price_in_pln'])
+    return upgraded
@@ -1,24 +1,37 @@
 from __future__ import annotations
 
-import logging
+import functools
 import os
-from typing import TYPE_CHECKING, Type
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence, Type
 
 from sqlalchemy import (
     create_engine,
+    event,
+    func,
+    insert,
+    inspect,
+    select,
+    Engine,
     Column,
+    Index,
     Integer,
     String,
     Float
 )
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import (
     Session,
     declarative_base
 )
 
 from task import config
-from task.connectors.database.interface import DBConnectorInterface
+from task.connectors.database.interface import ConversionSummary, DBConnectorInterface
+from task.connectors.database.migrations import upgrade_legacy_record
 from task.setup_loger import setup_loger
+from task.utils import AMOUNT_SCALE, to_scaled_amount
 
 if TYPE_CHECKING:
     from task.currency_converter import ConvertedPricePLN
@@ -34,14 +47,122 @@ class ConvertedPriceToPLNModel(Base):
     JSON DB. It also enables to use basic DB query API.
     """
     __tablename__ = 'converted_prices' # noqa
+    __table_args__ = (
+        Index('ix_converted_prices_currency_date', 'currency', 'date'),
+    )
 
     id = Column(Integer, primary_key=True)
     currency = Column(String)
     rate = Column(Float)
-    price_in_pln = Column(Float)  # I think it should be decimal
+    price = Column(Integer)  # amounts are integers scaled by AMOUNT_SCALE
+    price_in_pln = Column(Integer)
     date = Column(String)
 
 
+_engines = {}  # process-wide, db_url: Engine
+_engines_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Applies config.SQLITE_PRAGMAS to every new pooled connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in config.SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+
+def _migrate_legacy_table(engine: Engine) -> None:
+    """
+    Rebuilds table created by older versions, which stored price in PLN as float and did not store source
+    price, into current schema with amounts as scaled integers. It is done in single transaction, rows are
+    copied in batches.
+    """
+    table = ConvertedPriceToPLNModel.__table__
+    legacy_name = f'{table.name}_legacy'
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if not inspector.has_table(table.name):
+            return
+        if 'price' in {column['name'] for column in inspector.get_columns(table.name)}:
+            return
+
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO {legacy_name}')
+        for index in table.indexes:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {index.name}')
+        table.create(bind=connection)
+
+        result = connection.exec_driver_sql(
+            f'SELECT id, currency, rate, price_in_pln, date FROM {legacy_name}'
+        ).mappings()
+        migrated = 0
+        while rows := result.fetchmany(config.DB_ITER_BATCH_SIZE):
+            connection.execute(insert(table), [upgrade_legacy_record(dict(row)) for row in rows])
+            migrated += len(rows)
+
+        connection.exec_driver_sql(f'DROP TABLE {legacy_name}')
+
+    logger.info(f'Table {table.name} migrated to scaled amounts, {migrated} rows copied.')
+
+
+def get_engine(db_url: str) -> Engine:
+    """
+    Returns process-wide engine (with its connection pool) for db_url. Engine is created and db schema
+    is created (if it does not exist) only once per process. Tables and indexes of db created by older
+    versions are migrated as well.
+    """
+    engine = _engines.get(db_url)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            engine = create_engine(
+                db_url,
+                echo=config.SQL_ECHO,
+                connect_args={'timeout': config.SQLITE_BUSY_TIMEOUT}
+            )
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
+
+            _migrate_legacy_table(engine)
+            Base.metadata.create_all(bind=engine, checkfirst=True)
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=engine, checkfirst=True)
+            _engines[db_url] = engine
+
+    return engine
+
+
+def dispose_engines() -> None:
+    """Closes pooled connections of all engines, next get_engine call creates engine again"""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def _retry_when_locked(func):
+    """
+    Retries write (with growing delay), which failed because another process held the database lock
+    longer than busy timeout. Failed transaction is rolled back, so it is safe to execute it again.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(config.SQLITE_LOCKED_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if 'database is locked' not in str(e.orig) or attempt == config.SQLITE_LOCKED_RETRIES:
+                    raise
+                delay = config.SQLITE_LOCKED_RETRY_DELAY * 2 ** attempt
+                logger.warning(f'Database is locked, retry {attempt + 1} of {func.__name__} in {delay}s.')
+                time.sleep(delay)
+
+    return wrapper
+
+
 class SqliteDatabaseConnector(DBConnectorInterface):
     """
     Enables connection and querying for ConvertedPriceToPLN instances (via proxy ConvertedPriceToPLNModel).
@@ -49,58 +170,165 @@ class SqliteDatabaseConnector(DBConnectorInterface):
     db_url = f'sqlite:///{config.ROOT_DIR}/sqlite3.db'
 
     def __init__(self):
-        self._engine = None
-        self._session = None
-
         db_directory = os.path.dirname(self.db_url.replace('sqlite:///', ''))
         os.makedirs(db_directory, exist_ok=True)
 
-    def _connect(self) -> None:
+    @contextmanager
+    def _session_scope(self) -> Iterator[Session]:
         """
-        Connects to DB if it exists, if not it creates db and then connects.
+        Provides session for single unit of work, with pooled connection of process-wide engine.
+        Session is committed if no exception occurred, rolled back otherwise, and always closed.
         """
-        self._engine = create_engine(self.db_url, echo=True)
-        Base.metadata.create_all(bind=self._engine, checkfirst=True)
-        self._session = Session(self._engine)
+        session = Session(get_engine(self.db_url))
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            logger.exception('Exception occurred:')
+            session.rollback()
+            raise
+        finally:
+            session.close()
 
+    @_retry_when_locked
     def save(self, entity: ConvertedPricePLN) -> None:
         """
         Saves object to Sqlite db.
         """
-        self._connect()
-        try:
-            self._session.add(
+        with self._session_scope() as session:
+            session.add(
                 entity.bind_db_model(
                     **entity.serialize()
                 )
             )
-            self._session.commit()
+
+    @_retry_when_locked
+    def save_many(self, entities: Sequence[ConvertedPricePLN]) -> None:
+        """
+        Saves objects to Sqlite db with single Core INSERT executed for all rows (executemany)
+        in single transaction, without creating ORM objects.
+        """
+        if not entities:
+            return
+
+        table = entities[0].bind_db_model.__table__
+        try:
+            with get_engine(self.db_url).begin() as connection:
+                connection.execute(insert(table), [entity.serialize() for entity in entities])
         except Exception:
-            logging.exception('Exception occurred:')
-            self._session.rollback()
+            logger.exception('Exception occurred:')
             raise
-        finally:
-            self._close_session()
 
     def get_all(self, entity_cls: Type[ConvertedPricePLN]) -> list[ConvertedPricePLN]:
         """
         Gets all objects for model and converts it to dataclass ConvertedPriceToPLN instances.
         """
-        self._connect()
-        model_qs = self._session.query(entity_cls.bind_db_model).all()
-        return [entity_cls.deserialize(obj) for obj in model_qs]
+        with self._session_scope() as session:
+            model_qs = session.query(entity_cls.bind_db_model).all()
+            return [entity_cls.deserialize(obj) for obj in model_qs]
+
+    def iter_all(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            batch_size: Optional[int] = None
+    ) -> Iterator[ConvertedPricePLN]:
+        """
+        Gets objects in batches (ORM yield_per, so only one batch of model objects is buffered)
+        and converts them to dataclass ConvertedPriceToPLN instances one by one.
+        """
+        model = entity_cls.bind_db_model
+        statement = select(model).order_by(model.id).execution_options(
+            yield_per=batch_size or config.DB_ITER_BATCH_SIZE
+        )
+
+        with self._session_scope() as session:
+            for obj in session.scalars(statement):
+                yield entity_cls.deserialize(obj)
 
     def get_by_id(self, entity_cls: Type[ConvertedPricePLN], id_: int) -> ConvertedPricePLN:
         """
         Get object with concrete id for model and converts it to dataclass ConvertedPriceToPLN instance.
         """
-        self._connect()
-        model_obj = self._session.query(entity_cls.bind_db_model).filter_by(id=id_).first()
-        if model_obj is None:
-            raise Exception(f'No object {entity_cls.__name__} with id={id_}.')
+        with self._session_scope() as session:
+            model_obj = session.query(entity_cls.bind_db_model).filter_by(id=id_).first()
+            if model_obj is None:
+                raise Exception(f'No object {entity_cls.__name__} with id={id_}.')
+
+            return entity_cls.deserialize(model_obj)
+
+    def query(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            *,
+            currency: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None,
+            price_min: Optional[float] = None,
+            price_max: Optional[float] = None,
+            order_by: str = 'id',
+            descending: bool = False,
+            limit: Optional[int] = None,
+            offset: int = 0
+    ) -> list[ConvertedPricePLN]:
+        """
+        Gets objects matching filters, filtering, ordering and pagination are done by Sqlite
+        (with (currency, date) index), and converts them to dataclass ConvertedPriceToPLN instances.
+        """
+        self._validate_order_by(order_by)
+        model = entity_cls.bind_db_model
+
+        statement = select(model)
+        if currency is not None:
+            statement = statement.where(model.currency == currency.lower())
+        if date_from is not None:
+            statement = statement.where(model.date >= date_from)
+        if date_to is not None:
+            statement = statement.where(model.date <= date_to)
+        if price_min is not None:
+            statement = statement.where(model.price_in_pln >= to_scaled_amount(price_min))
+        if price_max is not None:
+            statement = statement.where(model.price_in_pln <= to_scaled_amount(price_max))
+
+        order_column = getattr(model, order_by)
+        statement = statement.order_by(
+            *((order_column.desc(), model.id.desc()) if descending else (order_column, model.id))
+        )
+        statement = statement.limit(limit).offset(offset)
+
+        with self._session_scope() as session:
+            return [entity_cls.deserialize(obj) for obj in session.scalars(statement)]
+
+    def aggregate(
+            self,
+            entity_cls: Type[ConvertedPricePLN],
+            *,
+            currency: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None
+    ) -> list[ConversionSummary]:
+        """
+        Groups objects matching filters by currency and date, counting, sums and averages are computed
+        by Sqlite (GROUP BY uses (currency, date) index), only result rows are fetched.
+        """
+        model = entity_cls.bind_db_model
 
-        return entity_cls.deserialize(model_obj)
+        statement = select(
+            model.currency,
+            model.date,
+            func.count(model.id),
+            func.sum(model.price_in_pln),
+            func.avg(model.rate)
+        )
+        if currency is not None:
+            statement = statement.where(model.currency == currency.lower())
+        if date_from is not None:
+            statement = statement.where(model.date >= date_from)
+        if date_to is not None:
+            statement = statement.where(model.date <= date_to)
+        statement = statement.group_by(model.currency, model.date).order_by(model.currency, model.date)
 
-    def _close_session(self):
-        """Closes db session"""
-        self._session.close()
+        with get_engine(self.db_url).connect() as connection:
+            return [
+                ConversionSummary(currency_, date, count, total_price_in_pln / AMOUNT_SCALE, average_rate)
+                for currency_, date, count, total_price_in_pln, average_rate in connection.execute(statement)
+            ]
@@ -1,16 +1,60 @@
-from typing import Union, Type
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional, Union, Type
 
 from task import config
-from task.connectors.database.json import JsonFileDatabaseConnector
-from task.connectors.database.sqlite import SqliteDatabaseConnector
-from task.utils import Mode
+from task.utils import JsonDatabaseFormat, Mode
 from task.validators import validate_config_attr
 
+if TYPE_CHECKING:
+    from task.connectors.database.interface import DBConnectorInterface
+    from task.connectors.database.json import JsonFileDatabaseConnector
+    from task.connectors.database.sqlite import SqliteDatabaseConnector
+
+_kept_db_connectors: Optional[dict] = None  # connector class: instance, while keep_db_connector() is active
+
 
 @validate_config_attr(Mode)
 def get_db_connector_class() -> Union[Type[JsonFileDatabaseConnector], Type[SqliteDatabaseConnector]]:
-    """Returns DB connector class depending on run mode"""
+    """Returns DB connector class depending on run mode, connector module is imported only when it is needed"""
     if config.RUN_CONFIG['MODE'] == Mode.DEV.value:
+        if config.JSON_DATABASE_FORMAT == JsonDatabaseFormat.JOURNAL.value:
+            from task.connectors.database.json_journal import JsonJournalDatabaseConnector
+            return JsonJournalDatabaseConnector
+
+        from task.connectors.database.json import JsonFileDatabaseConnector
         return JsonFileDatabaseConnector
 
+    from task.connectors.database.sqlite import SqliteDatabaseConnector
     return SqliteDatabaseConnector
+
+
+def get_db_connector() -> DBConnectorInterface:
+    """
+    Returns DB connector instance depending on run mode. New instance is created for every call, unless
+    keep_db_connector() is active, then one instance of connector class is reused (with its data read
+    into memory) for the whole time.
+    """
+    connector_cls = get_db_connector_class()
+    if _kept_db_connectors is None:
+        return connector_cls()
+
+    if connector_cls not in _kept_db_connectors:
+        _kept_db_connectors[connector_cls] = connector_cls()
+    return _kept_db_connectors[connector_cls]
+
+
+@contextmanager
+def keep_db_connector() -> Iterator[None]:
+    """
+    Makes get_db_connector() reuse connector instances, it is meant for long-running processes (server, worker),
+    which use them from one thread at a time
+    """
+    global _kept_db_connectors
+
+    previous, _kept_db_connectors = _kept_db_connectors, {}
+    try:
+        yield
+    finally:
+        _kept_db_connectors = previous
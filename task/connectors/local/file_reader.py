@@ -1,11 +1,52 @@
+import bisect
 import json
+import os
+import threading
+from collections import OrderedDict
 
 from task import config
+from task.connectors.local.json_stream import iter_object_members, read_value
+from task.file_utils import atomic_write
+from task.setup_loger import setup_loger
+
+logger = setup_loger(__name__)
+
+
+class CurrencyRates(dict):
+    """{date: rate} dict of one currency, which keeps sorted dates for lookups of the most recent rate"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._sorted_dates = None
+
+    def get_effective(self, date: str) -> tuple:
+        """
+        Returns the most recent rate on or before date, with binary search in sorted dates.
+
+        :param date: date in %Y-%m-%d format
+        :return: (date, rate) tuple, (None, None) if there is no rate on or before date
+        """
+        if self._sorted_dates is None or len(self._sorted_dates) != len(self):
+            self._sorted_dates = sorted(self)
+
+        position = bisect.bisect_right(self._sorted_dates, date)
+        if position == 0:
+            return None, None
+
+        effective_date = self._sorted_dates[position - 1]
+        return effective_date, self[effective_date]
 
 
 class ExampleFileReader:
     """Converts json to python dict"""
 
+    _rates_indexes = {}  # process-wide, path: (mtime_ns, size, index)
+    _offsets_indexes = {}  # process-wide, path: (mtime_ns, size, {currency: (start, end)})
+    # process-wide LRU, (path, currency): (signature, {date: rate}), for streaming mode, bounded by
+    # config.LOCAL_DATA_SOURCES_CACHED_CURRENCIES, so long-running process does not keep the whole file in memory
+    _currency_rates = OrderedDict()
+    _lock = threading.Lock()
+
     def __init__(self) -> None:
         self._data = self._read_data()
 
@@ -17,3 +58,135 @@ class ExampleFileReader:
     @property
     def data(self) -> dict:
         return self._data
+
+    @staticmethod
+    def _get_signature(path: str) -> tuple:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _build_currency_rates(currency_data: list) -> CurrencyRates:
+        """
+        Maps list of dicts with keys: date, rate into {date: rate} dict. If date is repeated,
+        the first value is kept, as the file is ordered from newest to oldest.
+        """
+        rates_by_date = CurrencyRates()
+        for d in currency_data:
+            rates_by_date.setdefault(d['date'], d['rate'])
+        return rates_by_date
+
+    @classmethod
+    def _build_rates_index(cls, data: dict) -> dict:
+        """Maps file structure into {currency: {date: rate}} dict"""
+        return {currency.upper(): cls._build_currency_rates(currency_data) for currency, currency_data in data.items()}
+
+    @classmethod
+    def get_rates_index(cls) -> dict:
+        """
+        Returns {currency: {date: rate}} index of local rates file. Index is built once per process
+        and rebuilt only when file modification time or size changes.
+
+        :return: dict where keys are upper currency ISO codes and values are dicts {date: rate}
+        """
+        path = config.LOCAL_DATA_SOURCES
+        signature = cls._get_signature(path)
+
+        cached = cls._rates_indexes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with cls._lock:
+            cached = cls._rates_indexes.get(path)
+            if cached is None or cached[0] != signature:
+                cached = cls._rates_indexes[path] = (signature, cls._build_rates_index(cls._read_data()))
+
+        return cached[1]
+
+    @staticmethod
+    def _get_offsets_index_path(path: str) -> str:
+        return f'{path}.idx'
+
+    @classmethod
+    def _load_offsets_index(cls, path: str, signature: tuple):
+        """Returns offsets index from sidecar file or None if it is missing or outdated"""
+        try:
+            with open(cls._get_offsets_index_path(path), 'r') as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if tuple(stored.get('signature', ())) != signature:
+            return None
+        return {currency: tuple(offsets) for currency, offsets in stored['offsets'].items()}
+
+    @classmethod
+    def _save_offsets_index(cls, path: str, signature: tuple, offsets: dict) -> None:
+        """Saves offsets index to sidecar file, index is kept only in memory if it cannot be written"""
+        index_path = cls._get_offsets_index_path(path)
+        try:
+            with atomic_write(index_path) as file:
+                json.dump({'signature': signature, 'offsets': offsets}, file)
+        except OSError:
+            logger.exception('Offsets index of local rates file could not be saved:')
+
+    @classmethod
+    def _get_offsets_index(cls, path: str, signature: tuple) -> dict:
+        """
+        Returns {currency: (start, end)} byte offsets of currencies lists in local rates file. Index is read from
+        sidecar file or built with single streaming scan of the file if sidecar is missing or outdated.
+        """
+        cached = cls._offsets_indexes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        offsets = cls._load_offsets_index(path, signature)
+        if offsets is None:
+            with open(path, 'rb') as file:
+                offsets = {currency.upper(): (start, end) for currency, start, end in iter_object_members(file)}
+            cls._save_offsets_index(path, signature, offsets)
+            logger.info('Offsets index of %s built for %s currencies', path, len(offsets))
+
+        cls._offsets_indexes[path] = (signature, offsets)
+        return offsets
+
+    @classmethod
+    def _get_currency_rates_streaming(cls, path: str, signature: tuple, currency: str) -> CurrencyRates:
+        """
+        Parses only list of the currency, which is found with offsets index. Parsed lists of recently used
+        currencies are cached, the least recently used one is dropped when cache is full.
+        """
+        key = (path, currency)
+        cached = cls._currency_rates.get(key)
+        if cached is not None and cached[0] == signature:
+            cls._currency_rates.move_to_end(key)
+            return cached[1]
+
+        start, end = cls._get_offsets_index(path, signature)[currency]
+        with open(path, 'rb') as file:
+            rates_by_date = cls._build_currency_rates(read_value(file, start, end))
+
+        cls._currency_rates[key] = (signature, rates_by_date)
+        cls._currency_rates.move_to_end(key)
+        while len(cls._currency_rates) > config.LOCAL_DATA_SOURCES_CACHED_CURRENCIES:
+            cls._currency_rates.popitem(last=False)
+
+        return rates_by_date
+
+    @classmethod
+    def get_currency_rates(cls, currency: str) -> CurrencyRates:
+        """
+        Returns rates of currency from local rates file. Files bigger than
+        config.LOCAL_DATA_SOURCES_STREAMING_THRESHOLD are not loaded as a whole, only the currency list is parsed.
+
+        :param currency: string ISO currency code
+        :return: dict where keys are dates and values are rates, KeyError is raised if there is no currency in file
+        """
+        path = config.LOCAL_DATA_SOURCES
+        signature = cls._get_signature(path)
+        currency = currency.upper()
+
+        if signature[1] < config.LOCAL_DATA_SOURCES_STREAMING_THRESHOLD:
+            return cls.get_rates_index()[currency]
+
+        with cls._lock:
+            return cls._get_currency_rates_streaming(path, signature, currency)
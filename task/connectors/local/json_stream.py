@@ -0,0 +1,120 @@
+import codecs
+import json
+import re
+from typing import BinaryIO, Iterator
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DECODER = json.JSONDecoder()
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _byte_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def iter_object_members(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Reads top-level JSON object chunk by chunk and yields its members one by one, so memory use depends
+    on the size of the biggest member, not on file size. Value of a member can be parsed again later with
+    read_value(file, start, end).
+
+    :param file: file opened in binary mode, positioned at the beginning of JSON document
+    :param chunk_size: number of bytes read at once
+    :return: iterator of (key, start, end) tuples, where start and end are byte offsets of member value
+    """
+    for key, _, start, end in _iter_members(file, chunk_size):
+        yield key, start, end
+
+
+def iter_object_items(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Reads top-level JSON object chunk by chunk like iter_object_members, but yields parsed values.
+
+    :param file: file opened in binary mode, positioned at the beginning of JSON document
+    :param chunk_size: number of bytes read at once
+    :return: iterator of (key, value) tuples
+    """
+    for key, value, _, _ in _iter_members(file, chunk_size):
+        yield key, value
+
+
+def _iter_members(file: BinaryIO, chunk_size: int) -> Iterator[tuple]:
+    """Yields (key, value, start, end) tuples of top-level JSON object members"""
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    text = ''
+    pos = 0
+    eof = False
+    mark_pos, mark_offset = 0, file.tell()  # text[mark_pos] is at mark_offset byte of the file
+
+    def get_offset(text_pos: int) -> int:
+        nonlocal mark_pos, mark_offset
+        mark_offset += _byte_length(text[mark_pos:text_pos])
+        mark_pos = text_pos
+        return mark_offset
+
+    def read_more(size: int) -> None:
+        """Drops already consumed text and appends next part of the file"""
+        nonlocal text, pos, eof, mark_pos
+        get_offset(pos)
+        text, pos, mark_pos = text[pos:], 0, 0
+
+        data = file.read(size)
+        eof = not data
+        text += utf8_decoder.decode(data, final=eof)
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(text, pos).end()
+            if pos < len(text) or eof:
+                return
+            read_more(chunk_size)
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        skip_whitespace()
+        char = text[pos:pos + 1]
+        if not char or char not in chars:
+            raise ValueError(f'Expected one of {chars!r} at byte {get_offset(pos)} of JSON document.')
+        pos += 1
+        return char
+
+    def decode() -> tuple:
+        """Parses value at current position and returns it with its end, reads more of the file if it is incomplete"""
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(text, pos)
+                if end < len(text) or eof:  # number at the end of text might be continued in next chunk
+                    return value, end
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            read_more(max(chunk_size, len(text)))  # growing reads keep re-parsing of long values linear
+
+    expect('{')
+    skip_whitespace()
+    if text[pos:pos + 1] == '}':
+        return
+
+    while True:
+        skip_whitespace()
+        if text[pos:pos + 1] != '"':
+            raise ValueError(f'Expected object key at byte {get_offset(pos)} of JSON document.')
+        key, pos = decode()
+
+        expect(':')
+        skip_whitespace()
+        start = get_offset(pos)
+        value, pos = decode()
+
+        yield key, value, start, get_offset(pos)
+
+        if expect(',}') == '}':
+            return
+
+
+def read_value(file: BinaryIO, start: int, end: int):
+    """Parses JSON value stored between start and end byte offsets of file"""
+    file.seek(start)
+    return json.loads(file.read(end - start))
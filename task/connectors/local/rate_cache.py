@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from task import config
+from task.setup_loger import setup_loger
+
+logger = setup_loger(__name__)
+
+
+class RateCache:
+    """
+    Persistent cache of currency rates keyed by (source, currency, fetch_date). It is stored in sqlite file,
+    so it is shared between processes. Entries older than ttl are treated as missing, and the oldest entries
+    are evicted when cache grows over max_entries. It also stores effective dates of fetch dates without
+    published rates, so effective rate lookups do not ask source for missing rate again.
+    """
+
+    def __init__(self, path: str, ttl: int, max_entries: int) -> None:
+        self._path = path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._memory = {}  # in-process layer, saves sqlite round trip for repeated lookups
+        self._effective_dates = {}  # in-process layer of effective_dates table
+
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rates ('
+                'source TEXT NOT NULL, '
+                'currency TEXT NOT NULL, '
+                'fetch_date TEXT NOT NULL, '
+                'rate REAL NOT NULL, '
+                'stored_at REAL NOT NULL, '
+                'PRIMARY KEY (source, currency, fetch_date))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rates_stored_at ON rates (stored_at)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS effective_dates ('
+                'source TEXT NOT NULL, '
+                'fetch_date TEXT NOT NULL, '
+                'effective_date TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, '
+                'PRIMARY KEY (source, fetch_date))'
+            )
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Yields connection inside transaction and closes it afterwards"""
+        connection = sqlite3.connect(self._path, timeout=5)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _key(source: str, currency: str, fetch_date: str) -> tuple:
+        return source.upper(), currency.upper(), fetch_date
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return time.time() - stored_at < self._ttl
+
+    def get(self, source: str, currency: str, fetch_date: str) -> Optional[float]:
+        """
+        Returns cached rate or None if there is no fresh entry for the key.
+
+        :param source: rate source name, e.g. API
+        :param currency: string ISO currency code
+        :param fetch_date: date of the rate in %Y-%m-%d format
+        :return: rate or None
+        """
+        key = self._key(source, currency, fetch_date)
+
+        cached = self._memory.get(key)
+        if cached is not None and self._is_fresh(cached[1]):
+            return cached[0]
+
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    'SELECT rate, stored_at FROM rates WHERE source = ? AND currency = ? AND fetch_date = ?',
+                    key
+                ).fetchone()
+        except sqlite3.Error:
+            logger.exception('Rate cache read failed:')
+            return None
+
+        if row is None or not self._is_fresh(row[1]):
+            return None
+
+        self._memory[key] = row
+        return row[0]
+
+    def set(self, source: str, currency: str, fetch_date: str, rate: float) -> None:
+        """Stores rate for the key"""
+        self.set_many(source, fetch_date, {currency: rate})
+
+    def set_many(self, source: str, fetch_date: str, rates: dict) -> None:
+        """
+        Stores rates of many currencies for one source and date in a single transaction.
+
+        :param source: rate source name, e.g. API
+        :param fetch_date: date of the rates in %Y-%m-%d format
+        :param rates: dict where keys are currency ISO codes and values are rates
+        """
+        stored_at = time.time()
+        rows = [(*self._key(source, currency, fetch_date), rate, stored_at) for currency, rate in rates.items()]
+
+        try:
+            with self._connect() as connection:
+                connection.executemany('INSERT OR REPLACE INTO rates VALUES (?, ?, ?, ?, ?)', rows)
+                self._evict(connection)
+        except sqlite3.Error:
+            logger.exception('Rate cache write failed:')
+            return
+
+        for *key, rate, _ in rows:
+            self._memory[tuple(key)] = (rate, stored_at)
+
+        if len(self._memory) > self._max_entries:
+            self._memory.clear()
+
+    def get_effective_date(self, source: str, fetch_date: str) -> Optional[str]:
+        """
+        Returns date of the most recent rate published on or before fetch date, which has no rate published
+        for it, or None if it is not known.
+
+        :param source: rate source name, e.g. API
+        :param fetch_date: date without published rate in %Y-%m-%d format
+        :return: effective date in %Y-%m-%d format or None
+        """
+        key = (source.upper(), fetch_date)
+
+        cached = self._effective_dates.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    'SELECT effective_date, expires_at FROM effective_dates WHERE source = ? AND fetch_date = ?',
+                    key
+                ).fetchone()
+        except sqlite3.Error:
+            logger.exception('Rate cache read failed:')
+            return None
+
+        if row is None or row[1] <= time.time():
+            return None
+
+        self._effective_dates[key] = row
+        return row[0]
+
+    def set_effective_date(self, source: str, fetch_date: str, effective_date: str, ttl: float) -> None:
+        """
+        Stores effective date of fetch date without published rate. Source may publish rate for fetch date
+        later (e.g. for today), so entry expires after ttl.
+
+        :param source: rate source name, e.g. API
+        :param fetch_date: date without published rate in %Y-%m-%d format
+        :param effective_date: date of the most recent rate published before fetch date in %Y-%m-%d format
+        :param ttl: seconds entry is valid for
+        """
+        key = (source.upper(), fetch_date)
+        now = time.time()
+
+        try:
+            with self._connect() as connection:
+                connection.execute('DELETE FROM effective_dates WHERE expires_at <= ?', (now,))
+                connection.execute(
+                    'INSERT OR REPLACE INTO effective_dates VALUES (?, ?, ?, ?)', (*key, effective_date, now + ttl)
+                )
+        except sqlite3.Error:
+            logger.exception('Rate cache write failed:')
+            return
+
+        self._effective_dates[key] = (effective_date, now + ttl)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Removes expired entries and then the oldest ones over max_entries limit"""
+        connection.execute('DELETE FROM rates WHERE stored_at <= ?', (time.time() - self._ttl,))
+        connection.execute(
+            'DELETE FROM rates WHERE rowid IN ('
+            'SELECT rowid FROM rates ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+            (self._max_entries,)
+        )
+
+    def clear(self) -> None:
+        """Removes all entries"""
+        self._memory.clear()
+        self._effective_dates.clear()
+        with self._connect() as connection:
+            connection.execute('DELETE FROM rates')
+            connection.execute('DELETE FROM effective_dates')
+
+
+_rate_caches = {}
+
+
+def get_rate_cache() -> RateCache:
+    """Returns process-wide RateCache instance for currently configured cache file"""
+    path = config.RATE_CACHE_PATH
+    if path not in _rate_caches:
+        _rate_caches[path] = RateCache(path, config.RATE_CACHE_TTL, config.RATE_CACHE_MAX_ENTRIES)
+    return _rate_caches[path]
@@ -0,0 +1,50 @@
+import json
+
+from task.file_utils import atomic_write
+from task.setup_loger import setup_loger
+
+logger = setup_loger(__name__)
+
+
+class LocalRateStore:
+    """
+    Stores rates in local JSON file with structure of example_currency_rates.json, so stored rates can be
+    served with LocalSourceCurrencyRateFetcher. Keys are currency ISO codes and values are lists of dicts with
+    keys: date, rate, ordered from newest to oldest.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def _read_data(self) -> dict:
+        try:
+            with open(self._path, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _write_data(self, data: dict) -> None:
+        """Writes data to temporary file and then replaces store file with it, so store is never half-written"""
+        with atomic_write(self._path) as file:
+            json.dump(data, file, indent=4)
+
+    def merge(self, rates: dict) -> int:
+        """
+        Merges rates into the store, rates for already stored dates are overwritten.
+
+        :param rates: dict where keys are currency ISO codes and values are dicts {date: rate}
+        :return: number of merged rates
+        """
+        data = self._read_data()
+
+        for currency, rates_by_date in rates.items():
+            currency = currency.upper()
+            stored = {d['date']: d['rate'] for d in data.get(currency, [])}
+            stored.update(rates_by_date)
+            data[currency] = [{'date': date, 'rate': stored[date]} for date in sorted(stored, reverse=True)]
+
+        self._write_data(data)
+
+        merged = sum(len(rates_by_date) for rates_by_date in rates.values())
+        logger.info('Merged %s rates into %s', merged, self._path)
+        return merged
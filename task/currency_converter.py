@@ -1,15 +1,33 @@
+import importlib
 from dataclasses import dataclass
-from typing import ClassVar
+from typing import Iterable, Iterator, Optional, Sequence
 
-from task.connectors.database.sqlite import ConvertedPriceToPLNModel, Base
-from task.connectors.database.utils import get_db_connector_class
-from task.exchange_rate import get_rate_data
+from task.connectors.database.utils import get_db_connector
+from task.exchange_rate import get_rate_data, get_rates_data, AbstractCurrencyRateFetcher
 from task.setup_loger import setup_loger
-from task.utils import convert
+from task import config
+from task.utils import AMOUNT_SCALE, convert, convert_array, to_scaled_amount
 
 logger = setup_loger(__name__)
 
 
+class LazyDbModel:
+    """
+    Class attribute descriptor, which returns SQLAlchemy model and imports sqlite module (with SQLAlchemy)
+    only on first access, so it is not loaded by runs which use JSON database
+    """
+
+    def __init__(self, module: str, name: str) -> None:
+        self._module = module
+        self._name = name
+        self._model = None
+
+    def __get__(self, instance, owner):
+        if self._model is None:
+            self._model = getattr(importlib.import_module(self._module), self._name)
+        return self._model
+
+
 @dataclass(frozen=True)
 class ConvertedPricePLN:
     """Represents currency conversion operation"""
@@ -19,32 +37,64 @@ class ConvertedPricePLN:
     currency_rate_fetch_date: str
     price_in_pln: float  # might be stored as Decimal field to avoid floating error points during some calculations.
 
-    bind_db_model: ClassVar[Base] = ConvertedPriceToPLNModel
+    # not annotated, otherwise dataclass would read its value (and import SQLAlchemy) while creating class
+    bind_db_model = LazyDbModel('task.connectors.database.sqlite', 'ConvertedPriceToPLNModel')
 
     def __str__(self):
         return f'{self.price_in_source_currency} {self.currency.upper()} --> {self.price_in_pln} PLN'
 
     def save(self):
         """Abstraction layer which enables to save cls object independently of run mode"""
-        get_db_connector_class()().save(self)
+        get_db_connector().save(self)
         logger.info(f'Obj {type(self).__name__} ({str(self)}) successfully saved.')
 
+    @classmethod
+    def save_many(cls, entities: Sequence['ConvertedPricePLN']) -> None:
+        """Abstraction layer which enables to save many cls objects with single write independently of run mode"""
+        get_db_connector().save_many(entities)
+        logger.info(f'{len(entities)} objs {cls.__name__} successfully saved.')
+
     @classmethod
     def get_all(cls):
         """Abstraction layer which enables to get all cls objects independently of run mode"""
-        return get_db_connector_class()().get_all(cls)
+        return get_db_connector().get_all(cls)
+
+    @classmethod
+    def iter_all(cls, batch_size: Optional[int] = None) -> Iterator['ConvertedPricePLN']:
+        """
+        Abstraction layer which enables to iterate lazily over all cls objects independently of run mode,
+        memory use does not depend on number of objects
+        """
+        return get_db_connector().iter_all(cls, batch_size)
 
     @classmethod
     def get_by_id(cls, id_):
         """Abstraction layer which enables to get cls object, with concrete id, independently of run mode"""
-        return get_db_connector_class()().get_by_id(cls, id_)
+        return get_db_connector().get_by_id(cls, id_)
+
+    @classmethod
+    def query(cls, **filters):
+        """
+        Abstraction layer which enables to query cls objects independently of run mode,
+        see DBConnectorInterface.query for available filters
+        """
+        return get_db_connector().query(cls, **filters)
+
+    @classmethod
+    def aggregate(cls, **filters):
+        """
+        Abstraction layer which enables to get ConversionSummary of cls objects grouped by currency and date
+        independently of run mode, see DBConnectorInterface.aggregate for available filters
+        """
+        return get_db_connector().aggregate(cls, **filters)
 
     def serialize(self):
-        """Returns dict in "structure" of databases"""
+        """Returns dict in "structure" of databases, amounts are stored as integers scaled by AMOUNT_SCALE"""
         return {
             'currency': self.currency,
             'rate': self.currency_rate,
-            'price_in_pln': self.price_in_pln,
+            'price': to_scaled_amount(self.price_in_source_currency),
+            'price_in_pln': to_scaled_amount(self.price_in_pln),
             'date': self.currency_rate_fetch_date
         }
 
@@ -54,25 +104,26 @@ class ConvertedPricePLN:
         if not isinstance(data, dict):
             data = data.__dict__
 
-        price_in_source_currency = convert(
-            price=data['price_in_pln'],
-            rate=data['rate'],
-            operator='/'
-        )
-
         return ConvertedPricePLN(
-            price_in_source_currency=price_in_source_currency,
+            price_in_source_currency=data['price'] / AMOUNT_SCALE,
             currency=data['currency'],
             currency_rate=data['rate'],
             currency_rate_fetch_date=data['date'],
-            price_in_pln=data['price_in_pln']
+            price_in_pln=data['price_in_pln'] / AMOUNT_SCALE
         )
 
 
 class PriceCurrencyConverterToPLN:
     """Converts wanted price in concrete currency to PLN and saves results in database"""
 
-    def convert_to_pln(self, *, currency: str, price: float) -> ConvertedPricePLN:
+    def convert_to_pln(
+            self,
+            *,
+            currency: str,
+            price: float,
+            fetch_date: Optional[str] = None,
+            rate_data: Optional[AbstractCurrencyRateFetcher] = None
+    ) -> ConvertedPricePLN:
         """
         Converts input price in input currency to ConvertedPricePLN instance which represents
         price in pln with some metadata. Conversion is done by multiplying original price by rate
@@ -81,10 +132,112 @@ class PriceCurrencyConverterToPLN:
 
         :param currency: string ISO currency code
         :param price: price wanted to convert to polish zloty
+        :param fetch_date: date of rate in %Y-%m-%d format, today by default
+        :param rate_data: fetcher of currency with rate already fetched (e.g. by get_rates), fetched if not given
         :return: ConvertedPricePLN instance
         """
-        rate_data = get_rate_data(currency)
+        if rate_data is None:
+            rate_data = get_rate_data(currency, fetch_date=fetch_date)
+
+        converted_price_pln = self._convert(currency=currency, price=price, rate_data=rate_data)
+        converted_price_pln.save()
+
+        return converted_price_pln
 
+    def convert_many(
+            self,
+            items: Iterable[tuple],
+            fail_fast: bool = True,
+            fetch_date: Optional[str] = None,
+            rates_data: Optional[dict] = None
+    ) -> list:
+        """
+        Converts many prices to PLN. Items are grouped by currency and date, so rate of every currency is fetched
+        only once per date (with API source, whole NBP table of date is fetched with single request), and prices
+        of currency are converted at once with convert_array. All results are saved to database with single write.
+
+        :param items: (currency, price) or (currency, price, fetch_date) tuples, where currency is string ISO
+            currency code and fetch_date is date of rate in %Y-%m-%d format or None
+        :param fail_fast: if False, exception is put in place of item which failed and other items are converted
+        :param fetch_date: date of rate of items without date, today by default
+        :param rates_data: dict where keys are (lower currency code, fetch date) tuples and values are fetchers with
+            rates already fetched (e.g. by get_rates), other rates are fetched
+        :return: list of ConvertedPricePLN instances (or exceptions) in input order
+        """
+        items = list(items)
+        keys = [(item[0].lower(), item[2] if len(item) > 2 and item[2] else fetch_date) for item in items]
+
+        rates_data = dict(rates_data or {})
+        missing_keys = [key for key in dict.fromkeys(keys) if key not in rates_data]
+        for date in dict.fromkeys(date for _, date in missing_keys):
+            fetchers = get_rates_data([currency for currency, key_date in missing_keys if key_date == date], date)
+            rates_data.update(((currency, date), fetcher) for currency, fetcher in fetchers.items())
+
+        for key, rate_data in rates_data.items():
+            try:
+                rate_data.rate # noqa
+            except Exception as e:
+                if fail_fast:
+                    raise
+                rates_data[key] = e
+
+        positions = {}
+        for position, key in enumerate(keys):
+            positions.setdefault(key, []).append(position)
+
+        converted_prices = [None] * len(items)
+        for (currency, date), currency_positions in positions.items():
+            rate_data = rates_data[currency, date]
+            if isinstance(rate_data, Exception):
+                for position in currency_positions:
+                    converted_prices[position] = rate_data
+                continue
+
+            prices = [items[position][1] for position in currency_positions]
+            for position, price, price_in_pln in zip(
+                    currency_positions, prices, self._convert_prices(prices, rate_data.rate)
+            ):
+                if isinstance(price_in_pln, Exception):
+                    if fail_fast:
+                        raise price_in_pln
+                    converted_prices[position] = price_in_pln
+                    continue
+
+                converted_prices[position] = ConvertedPricePLN(
+                    price_in_source_currency=price,
+                    currency=currency,
+                    currency_rate=rate_data.rate,
+                    currency_rate_fetch_date=rate_data.effective_date,
+                    price_in_pln=price_in_pln
+                )
+
+        ConvertedPricePLN.save_many([obj for obj in converted_prices if isinstance(obj, ConvertedPricePLN)])
+
+        return converted_prices
+
+    @staticmethod
+    def _convert_prices(prices: list, rate: float) -> list:
+        """
+        Converts prices with the same rate, many prices at once with convert_array. List of results
+        (in PLN) is returned, exception is put in place of price which failed.
+        """
+        if len(prices) >= config.CONVERT_ARRAY_MIN_SIZE:
+            try:
+                return convert_array(prices, rate, '*').tolist()
+            except Exception:
+                logger.warning('Converting prices at once failed, they are converted one by one.')
+
+        prices_in_pln = []
+        for price in prices:
+            try:
+                prices_in_pln.append(convert(price=price, rate=rate, operator='*'))
+            except Exception as e:
+                prices_in_pln.append(e)
+        return prices_in_pln
+
+    @staticmethod
+    def _convert(*, currency: str, price: float, rate_data: AbstractCurrencyRateFetcher) -> ConvertedPricePLN:
+        """Maps price and fetched rate into ConvertedPricePLN instance"""
         # Used it to avoid floating point error, I think object should 'store' rates and prices as Decimal objs.
         price_in_pln = convert(
             price=price,
@@ -92,13 +245,10 @@ class PriceCurrencyConverterToPLN:
             operator='*'
         )
 
-        converted_price_pln = ConvertedPricePLN(
+        return ConvertedPricePLN(
             price_in_source_currency=price,
             currency=currency.lower(),
             currency_rate=rate_data.rate,
-            currency_rate_fetch_date=rate_data.fetch_date,
+            currency_rate_fetch_date=rate_data.effective_date,
             price_in_pln=price_in_pln
         )
-        converted_price_pln.save()
-
-        return converted_price_pln
@@ -1,27 +1,39 @@
+from __future__ import annotations
+
+import asyncio
 import datetime
 from abc import ABC, abstractmethod
-from typing import Union, Type
-
-import requests
-from requests import Response
+from typing import TYPE_CHECKING, Iterable, Optional, Union, Type
 
 from task import config
-from task.connectors.local.file_reader import ExampleFileReader
+from task.connectors.local.file_reader import CurrencyRates, ExampleFileReader
+from task.connectors.local.rate_cache import get_rate_cache
+from task.iso_codes import validate_nbp_currency
 from task.setup_loger import setup_loger
 from task.utils import Source
 from task.validators import validate_config_attr
 
+if TYPE_CHECKING:
+    from requests import Response
+
 logger = setup_loger(__name__)
 
 
 class AbstractCurrencyRateFetcher(ABC):
     """Helper class which helps to get rate and then store it with fetching metadata"""
 
-    def __init__(self, currency: str):
+    source: str
+    use_rate_cache: bool = False  # if True, rate is read from persistent RateCache before reaching source
+
+    def __init__(self, currency: str, fetch_date: Optional[str] = None, effective: Optional[bool] = None):
         self._currency = currency
-        self._fetch_date = None
+        self._fetch_date = fetch_date  # rate for today is fetched if date is not given
+        self._effective_date = None  # date the rate was published on, earlier than fetch date for effective rate
         self._rate = None
 
+        # if True, the most recent rate published on or before fetch date is used when there is none for it
+        self._effective = config.RUN_CONFIG.get('EFFECTIVE_RATE', False) if effective is None else effective
+
     @property
     def currency(self) -> str:
         return self._currency
@@ -32,6 +44,17 @@ class AbstractCurrencyRateFetcher(ABC):
             self._set_date()
         return self._fetch_date
 
+    @property
+    def effective(self) -> bool:
+        return self._effective
+
+    @property
+    def effective_date(self) -> str:
+        """Date the rate was published on, it is fetch date unless effective rate of earlier date is used"""
+        if self._rate is None:
+            self._set_rate()
+        return self._effective_date
+
     @property
     def rate(self) -> float:
         if self._rate is None:
@@ -42,49 +65,76 @@ class AbstractCurrencyRateFetcher(ABC):
         self._fetch_date = datetime.date.today().strftime("%Y-%m-%d")
 
     def _set_rate(self) -> None:
-        self._rate = self._retrieve_rate_from_source()
+        if not self.use_rate_cache:
+            self._effective_date, self._rate = self._retrieve_rate_from_source()
+            return
+
+        rate_cache = get_rate_cache()
+        effective_date = self.fetch_date
+        rate = rate_cache.get(self.source, self.currency, effective_date)
+
+        if rate is None and self.effective:
+            # fetch date without published rate is mapped to effective date for a while, so source is not asked
+            # for missing rate again by every conversion
+            effective_date = rate_cache.get_effective_date(self.source, self.fetch_date)
+            rate = None if effective_date is None else rate_cache.get(self.source, self.currency, effective_date)
+
+        if rate is None:
+            effective_date, rate = self._retrieve_rate_from_source()
+            # rate is cached under date it was published on only, so effective rate of earlier date does not
+            # shadow rate published later for fetch date
+            rate_cache.set(self.source, self.currency, effective_date, rate)
+            if effective_date != self.fetch_date:
+                rate_cache.set_effective_date(self.source, self.fetch_date, effective_date,
+                                              self._get_effective_date_ttl())
+        else:
+            logger.info("Currency rate read from cache: %s", rate)
+
+        self._effective_date, self._rate = effective_date, rate
+
+    def _get_effective_date_ttl(self) -> float:
+        """Rate may still be published for today (or later date), rates of past dates do not change"""
+        if self.fetch_date < datetime.date.today().strftime("%Y-%m-%d"):
+            return config.RATE_CACHE_TTL
+        return config.EFFECTIVE_DATE_CACHE_TTL
 
     @abstractmethod
-    def _retrieve_rate_from_source(self) -> float:
-        """Retrieve currency exchange rate from outer source."""
+    def _retrieve_rate_from_source(self) -> tuple:
+        """Retrieve currency exchange rate from outer source, returns (effective date, rate) tuple."""
         raise NotImplementedError()
 
 
 class LocalSourceCurrencyRateFetcher(AbstractCurrencyRateFetcher):
-    """Fetcher to get rate for today from example_currency_rates.json file"""
+    """Fetcher to get rate for today (or given date) from example_currency_rates.json file"""
+
+    source = Source.LOCAL.value
 
-    def _get_exchange_rate_data_for_currency(self, source_data: dict) -> list:
+    def _get_exchange_rate_data_for_currency(self) -> CurrencyRates:
         """
-        Due to json file structure it tries to get value for currency ISO code.
+        Gets rates of currency ISO code from local rates file.
 
-        :param source_data: dictionary where keys are currency ISO codes and values are
-        list of dicts with keys: date, rate and values for these keys
-        :return: list of dicts with keys: date, rate and values for these keys
+        :return: dict where keys are dates and values are rates
         """
         try:
-            return source_data[self.currency.upper()]
+            return ExampleFileReader.get_currency_rates(self.currency)
         except KeyError as e:
             logger.exception('Key error occurred:')
             raise Exception('There is no exchange rate for the specified currency in example file') from e
 
-    def _get_rate(self, currency_data: list) -> float:
+    def _get_rate(self, currency_data: CurrencyRates) -> tuple:
         """
-        Due to json file structure value for currency code key is a list with dicts,
-        which stores data about rate and date for it. Note that in json example file values
-        are order from newest to oldest, this is the reason why generator is used here.
-        We want to get first matching value for date.
+        Gets rate for fetch date from currency rates indexed by date. In effective mode, the most recent
+        rate on or before fetch date is used if there is no rate for it.
 
-        :param currency_data: list of dicts with keys: date, rate and values for these keys
-        :return: rate converted to float format
+        :param currency_data: dict where keys are dates and values are rates
+        :return: (effective date, rate converted to float format) tuple
         """
+        effective_date, rate = self.fetch_date, currency_data.get(self.fetch_date)
 
-        rate_by_date_gen = ((d['date'], d['rate']) for d in currency_data)  # so generator might be better in this case
-
-        rate = None
-        for tup_date, tup_rate in rate_by_date_gen:
-            if tup_date == self.fetch_date:
-                rate = tup_rate
-                break
+        if rate is None and self.effective:
+            effective_date, rate = currency_data.get_effective(self.fetch_date)
+            if rate is not None:
+                logger.info("No rate for %s, rate from %s is used", self.fetch_date, effective_date)
 
         if rate is None:
             msg = 'There is no exchange rate for the specified currency for today in example file'
@@ -92,36 +142,38 @@ class LocalSourceCurrencyRateFetcher(AbstractCurrencyRateFetcher):
             raise KeyError(msg)
 
         try:
-            return float(rate)
+            return effective_date, float(rate)
         except ValueError:
             logger.exception('ValueError occurred:')
             raise
 
-    def _retrieve_rate_from_source(self) -> float:
-        source_data = ExampleFileReader().data
-
-        currency_data = self._get_exchange_rate_data_for_currency(source_data)
+    def _retrieve_rate_from_source(self) -> tuple:
+        currency_data = self._get_exchange_rate_data_for_currency()
         return self._get_rate(currency_data)
 
 
 class ApiSourceCurrencyRateFetcher(AbstractCurrencyRateFetcher):
-    """Fetcher to get rate for today with NBP API"""
+    """Fetcher to get rate for today (or given date) with NBP API"""
+
+    source = Source.API.value
+    use_rate_cache = True
 
     @staticmethod
-    def _handle_response_200(response: Response) -> float:
+    def _handle_response_200(response: Response) -> tuple:
         """
-        Checks if response format is proper and returns wanted rate value
+        Checks if response format is proper and returns wanted rate value with its effective date
 
         :param response:
-        :return: rate converted to float
+        :return: (effective date, rate converted to float) tuple
         """
         if 'application/json' in response.headers.get('content-type', ''):
             data = response.json()
-            rate = data.get('rates', [{}])[0].get('mid')
+            rate_data = data.get('rates', [{}])[-1]  # the last one is the newest in date range response
+            rate, effective_date = rate_data.get('mid'), rate_data.get('effectiveDate')
 
-            if rate is not None and isinstance(rate, (int, float)):
-                logger.info("Currency rate fetched: %s", rate)
-                return float(rate)
+            if isinstance(rate, (int, float)) and isinstance(effective_date, str):
+                logger.info("Currency rate fetched: %s (%s)", rate, effective_date)
+                return effective_date, float(rate)
             else:
                 logger.error("Unexpected JSON format: %s", data)
                 raise TypeError("Error: Invalid or missing rate in the JSON response")
@@ -129,51 +181,221 @@ class ApiSourceCurrencyRateFetcher(AbstractCurrencyRateFetcher):
             logger.error("Unexpected response content type: %s", response.headers.get('content-type', ''))
             raise TypeError("Error: Unexpected response content type")
 
-    def _handle_response(self, response: Response) -> float:
+    def _handle_response(self, response: Response) -> tuple:
         """
-        Checks if response is proper, if it is, it returns rate
+        Checks if response is proper, if it is, it returns rate with its effective date
 
-        :param response:
-        :return: rate converted to float
+        :param response: response with success status
+        :return: (effective date, rate converted to float) tuple
         """
-
         try:
-            response.raise_for_status()
             return self._handle_response_200(response)
-
-        except requests.exceptions.HTTPError:
-            logger.exception(f"HTTP error occurred:")
-            raise
-
-        except requests.exceptions.RequestException:
-            logger.exception(f"Request error occurred:")
-            raise
-
         except Exception:
             logger.exception(f"An unexpected error occurred:")
             raise
 
+    def _get_url_date(self) -> str:
+        """Returns date part of API url, 'today' keeps being used for current date"""
+        if self.fetch_date == datetime.date.today().strftime("%Y-%m-%d"):
+            return 'today'
+        return self.fetch_date
+
     def _get_url(self) -> str:
-        return f'http://api.nbp.pl/api/exchangerates/rates/a/{self.currency.lower()}/today/?format = json'
+        return f'{config.NBP_API_URL}/exchangerates/rates/a/{self.currency.lower()}/{self._get_url_date()}/' \
+               f'?format=json'
+
+    def _get_effective_url(self) -> str:
+        """Returns url of the most recent rate published on or before fetch date"""
+        if self._get_url_date() == 'today':
+            return f'{config.NBP_API_URL}/exchangerates/rates/a/{self.currency.lower()}/last/1/?format=json'
+
+        return f'{config.NBP_API_URL}/exchangerates/rates/a/{self.currency.lower()}/' \
+               f'{self._get_lookback_start_date()}/{self.fetch_date}/?format=json'
+
+    def _get_lookback_start_date(self) -> str:
+        fetch_date = datetime.date.fromisoformat(self.fetch_date)
+        return (fetch_date - datetime.timedelta(days=config.EFFECTIVE_RATE_LOOKBACK_DAYS)).isoformat()
+
+    def _fetch_rate_with_api(self) -> tuple:
+        """
+        Makes request to API url with shared, pooled HTTP client. In effective mode, if NBP has not published
+        rate for fetch date (404 on weekends and holidays), the most recent published rate is requested.
+        Currency not published by NBP is rejected before any request.
+        """
+        # requests is imported only with API source, it is not needed for LOCAL source
+        from task.connectors.api.http_client import HttpClientError, get_http_client
+
+        validate_nbp_currency(self.currency)
+        http_client = get_http_client()
+
+        try:
+            response = http_client.get(self._get_url())
+
+            if self.effective and response.status_code == 404:
+                logger.info("No rate published for %s, the most recent published rate is requested", self.fetch_date)
+                response = http_client.get(self._get_effective_url())
+
+            http_client.raise_for_status(response)
+        except HttpClientError:
+            logger.exception(f"HTTP error occurred:")
+            raise
 
-    def _fetch_rate_with_api(self) -> float:
-        """Makes request to API url"""
-        response = requests.get(self._get_url())
         return self._handle_response(response)
 
-    def _retrieve_rate_from_source(self) -> float:
+    def _retrieve_rate_from_source(self) -> tuple:
         return self._fetch_rate_with_api()
 
 
+class ApiTableSourceCurrencyRateFetcher(ApiSourceCurrencyRateFetcher):
+    """
+    Fetcher to get rate for today with NBP API, which gets whole table A in one request and stores
+    rates of all currencies from it in rate cache. Fetchers of other currencies are then served from cache.
+    Effective rate of earlier date is cached only under its own date, so fetchers sharing `tables` reuse
+    the table fetched for fetch date by one of them.
+    """
+
+    def __init__(self, currency: str, fetch_date: Optional[str] = None, effective: Optional[bool] = None,
+                 tables: Optional[dict] = None):
+        super().__init__(currency, fetch_date, effective)
+        self._tables = {} if tables is None else tables  # fetch date: (effective date, rates) of fetched table
+
+    @staticmethod
+    def _handle_response_200(response: Response) -> tuple:
+        """
+        Checks if table response format is proper and returns rates of all currencies in it with its effective date
+
+        :param response:
+        :return: (effective date, dict where keys are upper currency ISO codes and values are rates converted
+            to float) tuple
+        """
+        if 'application/json' in response.headers.get('content-type', ''):
+            data = response.json()
+            table = data[-1] if isinstance(data, list) and data else {}  # the last one is the newest
+            rates_data, effective_date = table.get('rates'), table.get('effectiveDate')
+
+            if isinstance(effective_date, str) and isinstance(rates_data, list) and all(
+                    isinstance(d.get('code'), str) and isinstance(d.get('mid'), (int, float)) for d in rates_data
+            ):
+                logger.info("Currency rates table fetched: %s currencies (%s)", len(rates_data), effective_date)
+                return effective_date, {d['code'].upper(): float(d['mid']) for d in rates_data}
+            else:
+                logger.error("Unexpected JSON format: %s", data)
+                raise TypeError("Error: Invalid or missing rates table in the JSON response")
+        else:
+            logger.error("Unexpected response content type: %s", response.headers.get('content-type', ''))
+            raise TypeError("Error: Unexpected response content type")
+
+    def _get_url(self) -> str:
+        return f'{config.NBP_API_URL}/exchangerates/tables/a/{self._get_url_date()}/?format=json'
+
+    def _get_effective_url(self) -> str:
+        if self._get_url_date() == 'today':
+            return f'{config.NBP_API_URL}/exchangerates/tables/a/last/1/?format=json'
+
+        return f'{config.NBP_API_URL}/exchangerates/tables/a/' \
+               f'{self._get_lookback_start_date()}/{self.fetch_date}/?format=json'
+
+    def _retrieve_rate_from_source(self) -> tuple:
+        if self.fetch_date not in self._tables:
+            self._tables[self.fetch_date] = self._fetch_rate_with_api()
+            get_rate_cache().set_many(self.source, *self._tables[self.fetch_date])
+        effective_date, rates = self._tables[self.fetch_date]
+
+        try:
+            return effective_date, rates[self.currency.upper()]
+        except KeyError as e:
+            logger.exception('Key error occurred:')
+            raise Exception('There is no exchange rate for the specified currency in NBP table') from e
+
+
+class AsyncApiSourceCurrencyRateFetcher(ApiSourceCurrencyRateFetcher):
+    """
+    Async counterpart of ApiSourceCurrencyRateFetcher. Blocking request made with shared, pooled HTTP client
+    is run in worker thread, so rates of many currencies can be fetched concurrently.
+    """
+
+    async def fetch_rate(self) -> float:
+        """Sets rate (with rate cache and response validation of sync fetcher) without blocking event loop"""
+        if self._rate is None:
+            await asyncio.to_thread(self._set_rate)
+        return self._rate
+
+
 @validate_config_attr(Source)
-def _get_rate_fetcher_class() -> Type[Union[LocalSourceCurrencyRateFetcher, ApiSourceCurrencyRateFetcher]]:
+def _get_rate_fetcher_class(bulk: bool = False) -> Type[Union[LocalSourceCurrencyRateFetcher,
+                                                              ApiSourceCurrencyRateFetcher]]:
     """Returns Fetcher class depending on run source"""
     if config.RUN_CONFIG['SOURCE'] == Source.LOCAL.value:
         return LocalSourceCurrencyRateFetcher
 
+    if bulk:
+        return ApiTableSourceCurrencyRateFetcher
+
     return ApiSourceCurrencyRateFetcher
 
 
-def get_rate_data(currency: str) -> Union[LocalSourceCurrencyRateFetcher, ApiSourceCurrencyRateFetcher]:
-    """Initializes concrete fetcher class instance with currency code input value"""
-    return _get_rate_fetcher_class()(currency)
+def get_rate_data(
+        currency: str,
+        bulk: bool = False,
+        fetch_date: Optional[str] = None
+) -> Union[LocalSourceCurrencyRateFetcher, ApiSourceCurrencyRateFetcher]:
+    """
+    Initializes concrete fetcher class instance with currency code input value
+
+    :param currency: string ISO currency code
+    :param bulk: if True, API fetcher gets whole NBP table at once, so other currencies are served from cache
+    :param fetch_date: date of wanted rate in %Y-%m-%d format, today by default
+    :return: fetcher instance
+    """
+    return _get_rate_fetcher_class(bulk=bulk)(currency, fetch_date)
+
+
+def get_rates_data(currencies: Iterable[str], fetch_date: Optional[str] = None) -> dict:
+    """
+    Initializes fetchers for many currencies. With API source whole NBP table is fetched only once for all of them.
+
+    :param currencies: string ISO currency codes
+    :param fetch_date: date of wanted rates in %Y-%m-%d format, today by default
+    :return: dict where keys are currency codes and values are fetcher instances
+    """
+    fetcher_class = _get_rate_fetcher_class(bulk=True)
+    if fetcher_class is ApiTableSourceCurrencyRateFetcher:
+        tables = {}
+        return {
+            currency: ApiTableSourceCurrencyRateFetcher(currency, fetch_date, tables=tables) for currency in currencies
+        }
+
+    return {currency: fetcher_class(currency, fetch_date) for currency in currencies}
+
+
+async def get_rates(
+        currencies: Iterable[str],
+        concurrency: Optional[int] = None,
+        fetch_date: Optional[str] = None
+) -> dict:
+    """
+    Fetches rates of many currencies concurrently. With API source at most `concurrency` requests are in flight
+    at the same time, local source is read synchronously.
+
+    :param currencies: string ISO currency codes
+    :param concurrency: limit of concurrent requests, config.ASYNC_FETCH_CONCURRENCY by default
+    :param fetch_date: date of wanted rates in %Y-%m-%d format, today by default
+    :return: dict where keys are currency codes and values are fetcher instances with rate already set
+    """
+    currencies = list(dict.fromkeys(currencies))
+
+    if _get_rate_fetcher_class() is LocalSourceCurrencyRateFetcher:
+        fetchers = {currency: LocalSourceCurrencyRateFetcher(currency, fetch_date) for currency in currencies}
+        for fetcher in fetchers.values():
+            fetcher._set_rate()
+        return fetchers
+
+    semaphore = asyncio.Semaphore(concurrency or config.ASYNC_FETCH_CONCURRENCY)
+    fetchers = {currency: AsyncApiSourceCurrencyRateFetcher(currency, fetch_date) for currency in currencies}
+
+    async def fetch(fetcher: AsyncApiSourceCurrencyRateFetcher) -> None:
+        async with semaphore:
+            await fetcher.fetch_rate()
+
+    await asyncio.gather(*(fetch(fetcher) for fetcher in fetchers.values()))
+    return fetchers
@@ -0,0 +1,44 @@
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+_UMASK = os.umask(0)  # os.umask can only be read by setting it, so it is read once and restored
+os.umask(_UMASK)
+
+
+def _get_file_mode(path: str) -> int:
+    """Returns permissions of existing file or default permissions of a new one"""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w') -> Iterator[IO]:
+    """
+    Yields temporary file, which replaces file under path when block exits without error, so readers never see
+    partially written file and failed write leaves previous version intact. Data is synced to disk before
+    the replace, and the file keeps permissions of the replaced one.
+
+    :param path: path of written file
+    :param mode: mode temporary file is opened with, 'w' or 'wb'
+    :return: temporary file opened in the same directory as path
+    """
+    file = tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(os.path.abspath(path)), delete=False,
+                                       suffix='.tmp')
+    try:
+        with file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(file.name, _get_file_mode(path))
+        os.replace(file.name, path)
+    except BaseException:
+        try:
+            os.remove(file.name)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,101 @@
+import json
+import marshal
+import os
+from typing import Iterator, Optional
+
+from task import config
+from task.file_utils import atomic_write
+from task.setup_loger import setup_loger
+
+logger = setup_loger(__name__)
+
+# currencies with average rates published by NBP in table A, only these are available with API source
+NBP_TABLE_A_CODES = frozenset({
+    'AUD', 'BGN', 'BRL', 'CAD', 'CHF', 'CLP', 'CNY', 'CZK', 'DKK', 'EUR', 'GBP',
+    'HKD', 'HUF', 'IDR', 'ILS', 'INR', 'ISK', 'JPY', 'KRW', 'MXN', 'MYR', 'NOK',
+    'NZD', 'PHP', 'RON', 'SEK', 'SGD', 'THB', 'TRY', 'UAH', 'USD', 'XDR', 'ZAR',
+})
+
+
+class IsoCodeRegistry:
+    """
+    Currency ISO codes, membership is checked in frozenset, so it can be passed as argparse choices.
+    Codes are iterated in order of source file.
+    """
+
+    def __init__(self, codes: tuple) -> None:
+        self._ordered_codes = codes
+        self.codes = frozenset(codes)
+
+    def __contains__(self, code) -> bool:
+        return code in self.codes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ordered_codes)
+
+    def __len__(self) -> int:
+        return len(self._ordered_codes)
+
+
+def _get_signature(path: str) -> tuple:
+    """Changes when source file is modified, snapshot of other python version is treated as outdated as well"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, marshal.version
+
+
+def _read_snapshot(path: str, signature: tuple) -> Optional[tuple]:
+    """Returns codes stored in snapshot or None if it is missing, invalid or outdated"""
+    try:
+        with open(path, 'rb') as file:
+            stored_signature, codes = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return codes if stored_signature == signature else None
+
+
+def _write_snapshot(path: str, signature: tuple, codes: tuple) -> None:
+    """Writes snapshot atomically, registry works without it, so failure is only logged"""
+    try:
+        with atomic_write(path, 'wb') as file:
+            marshal.dump((signature, codes), file)
+    except OSError:
+        logger.warning(f'ISO codes snapshot {path} could not be written.')
+
+
+def _load_codes(base_path: str, snapshot_path: str) -> tuple:
+    """Reads codes from snapshot, source JSON is parsed and snapshot regenerated only if JSON changed"""
+    signature = _get_signature(base_path)
+    codes = _read_snapshot(snapshot_path, signature)
+    if codes is None:
+        with open(base_path, 'r') as file:
+            codes = tuple(d["Symbol waluty (kod ISO)"] for d in json.load(file))
+        _write_snapshot(snapshot_path, signature, codes)
+        logger.info(f'ISO codes snapshot {snapshot_path} regenerated.')
+    return codes
+
+
+_registries = {}
+
+
+def get_iso_code_registry() -> IsoCodeRegistry:
+    """Returns process-wide registry of currency ISO codes (source of iso codes: NBP), it is loaded once"""
+    key = (config.ISO_CODE_BASE, config.ISO_CODE_SNAPSHOT)
+    if key not in _registries:
+        try:
+            _registries[key] = IsoCodeRegistry(_load_codes(*key))
+        except Exception:
+            logger.exception('An unexpected error occurred:')
+            raise
+    return _registries[key]
+
+
+def is_published_by_nbp(currency: str) -> bool:
+    """Checks if NBP publishes rate of currency in table A, so it can be fetched from API"""
+    return currency.upper() in NBP_TABLE_A_CODES
+
+
+def validate_nbp_currency(currency: str) -> None:
+    """Raises exception for currency not published in NBP table A, before any request is made"""
+    if not is_published_by_nbp(currency):
+        logger.error(f'Currency {currency.upper()} is not published in NBP table A.')
+        raise Exception('There is no exchange rate for the specified currency in NBP table')
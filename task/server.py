@@ -0,0 +1,350 @@
+import asyncio
+import datetime
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from task import config
+from task.batch import format_result, get_error_message, parse_item_object
+from task.connectors.database.utils import keep_db_connector
+from task.currency_converter import ConvertedPricePLN, PriceCurrencyConverterToPLN
+from task.exchange_rate import AbstractCurrencyRateFetcher, get_rates
+from task.setup_loger import setup_loger
+from task.utils import Source, get_serve_parser, set_run_config
+
+logger = setup_loger(__name__)
+
+
+class HttpError(Exception):
+    """Error reported to client with status code and {"error": message} JSON body"""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_bool(value: str) -> bool:
+    if value.lower() not in ('true', 'false', '1', '0'):
+        raise ValueError(f'Invalid boolean: {value}')
+    return value.lower() in ('true', '1')
+
+
+def _parse_date(value: str) -> str:
+    return datetime.date.fromisoformat(value).isoformat()
+
+
+HISTORY_PARAMS = {
+    'currency': str,
+    'date_from': _parse_date,
+    'date_to': _parse_date,
+    'price_min': float,
+    'price_max': float,
+    'order_by': str,
+    'descending': _parse_bool,
+    'limit': int,
+    'offset': int
+}
+
+
+class ConversionServer:
+    """
+    HTTP/JSON server of conversions with endpoints:
+
+        POST /convert        {"currency": "eur", "price": 100} -> conversion result
+        POST /convert/batch  {"items": [{"currency": "eur", "price": 100}, ...]} -> results in items order
+        GET  /history        ?currency=eur&date_from=2023-11-01&limit=10 -> stored conversions, see query filters
+
+    Items may have "date" of rate (YYYY-MM-DD), rate for today is used by default.
+
+    Process is long-running, so rate cache, pooled HTTP client, DB engine and DB connector (kept with
+    keep_db_connector) stay warm between requests. Rates are fetched in worker threads concurrently,
+    concurrent requests for rate of the same currency share one fetch. Conversions and history queries
+    are run in single DB thread with fetched rates, so DB connector is used by one thread at a time
+    and DB thread never waits for NBP API.
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None) -> None:
+        self._host = host or config.SERVER_HOST
+        self._port = config.SERVER_PORT if port is None else port
+        self._converter = PriceCurrencyConverterToPLN()
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        self._rate_fetches = {}  # (currency, fetch date): task fetching rate, result is fetcher with rate set
+        self._rate_fetches_semaphore = asyncio.Semaphore(config.ASYNC_FETCH_CONCURRENCY)
+        self._server = None
+
+        self._routes = {
+            ('POST', '/convert'): self.convert,
+            ('POST', '/convert/batch'): self.convert_batch,
+            ('GET', '/history'): self.history,
+        }
+
+    @property
+    def port(self) -> int:
+        """Port server listens on, it is chosen by OS if server was created with port 0"""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self._host, self._port)
+        logger.info(f'Server listens on http://{self._host}:{self.port}')
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stops listening and waits for DB thread to finish its work"""
+        self._server.close()
+        await self._server.wait_closed()
+        self._db_executor.shutdown()
+
+    async def _run_in_db_thread(self, func: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db_executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def _fetch_rate(
+            self,
+            currency: str,
+            fetch_date: Optional[str] = None
+    ) -> Optional[AbstractCurrencyRateFetcher]:
+        """
+        Fetches rate from NBP API, so conversion in DB thread does not wait for it. Concurrent requests for
+        rate of the same currency and date wait for the same fetch, at most config.ASYNC_FETCH_CONCURRENCY
+        fetches are in flight at the same time. Local source is read in DB thread.
+
+        :return: fetcher with rate set or None for local source
+        """
+        if config.RUN_CONFIG['SOURCE'] != Source.API.value:
+            return None
+
+        key = (currency.lower(), fetch_date)
+        task = self._rate_fetches.get(key)
+        if task is None:
+            task = self._rate_fetches[key] = asyncio.ensure_future(self._fetch_rate_limited(*key))
+            task.add_done_callback(lambda _: self._rate_fetches.pop(key, None))
+
+        return await asyncio.shield(task)  # cancelled request does not cancel fetch awaited by other requests
+
+    async def _fetch_rate_limited(self, currency: str, fetch_date: Optional[str]) -> AbstractCurrencyRateFetcher:
+        async with self._rate_fetches_semaphore:
+            return (await get_rates([currency], fetch_date=fetch_date))[currency]
+
+    async def _fetch_rates(self, keys: list) -> dict:
+        """
+        Fetches rates of (lower currency code, fetch date) keys concurrently, see _fetch_rate.
+
+        :return: dict where keys are the same and values are fetchers with rates set or exceptions,
+            it is empty for local source
+        """
+        if config.RUN_CONFIG['SOURCE'] != Source.API.value:
+            return {}
+
+        results = await asyncio.gather(*(self._fetch_rate(*key) for key in keys), return_exceptions=True)
+        return dict(zip(keys, results))
+
+    async def convert(self, data) -> dict:
+        """Converts single price and saves the result"""
+        try:
+            currency, price, fetch_date = parse_item_object(data)
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, get_error_message(e))
+
+        try:
+            rate_data = await self._fetch_rate(currency, fetch_date)
+            result = await self._run_in_db_thread(
+                self._converter.convert_to_pln, currency=currency, price=price, fetch_date=fetch_date,
+                rate_data=rate_data
+            )
+        except Exception as e:
+            raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, get_error_message(e))
+
+        return format_result(result)
+
+    async def convert_batch(self, data) -> dict:
+        """
+        Converts many prices with PriceCurrencyConverterToPLN.convert_many and saves results with single write.
+        Failed items are reported in results and do not stop conversion of other items. Rates are fetched
+        before and passed to DB thread, and items of currencies without rate are not passed to it at all.
+        """
+        items = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'List of items is required')
+
+        parsed_items = []
+        for item in items:
+            try:
+                parsed_items.append(parse_item_object(item))
+            except ValueError as e:
+                parsed_items.append(e)
+
+        keys = [None if isinstance(item, Exception) else (item[0].lower(), item[2]) for item in parsed_items]
+        rates_data = await self._fetch_rates(list(dict.fromkeys(key for key in keys if key is not None)))
+        parsed_items = [
+            rates_data[key] if isinstance(rates_data.get(key), Exception) else item
+            for key, item in zip(keys, parsed_items)
+        ]
+
+        valid_items = [item for item in parsed_items if not isinstance(item, Exception)]
+        rates_data = {key: rate_data for key, rate_data in rates_data.items() if not isinstance(rate_data, Exception)}
+        converted = iter(
+            await self._run_in_db_thread(
+                self._converter.convert_many, valid_items, fail_fast=False, rates_data=rates_data
+            )
+            if valid_items else []
+        )
+
+        results = [format_result(item if isinstance(item, Exception) else next(converted)) for item in parsed_items]
+        failed = sum('error' in result for result in results)
+
+        return {'results': results, 'converted': len(results) - failed, 'failed': failed}
+
+    async def history(self, params: dict) -> dict:
+        """Returns stored conversions matching query string filters, see DBConnectorInterface.query"""
+        filters = {'limit': config.SERVER_HISTORY_LIMIT}
+        for name, value in params.items():
+            if name not in HISTORY_PARAMS:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f'Invalid parameter: {name}')
+            try:
+                filters[name] = HISTORY_PARAMS[name](value)
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f'Invalid value of {name}: {value}')
+
+        try:
+            results = await self._run_in_db_thread(ConvertedPricePLN.query, **filters)
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, get_error_message(e))
+
+        return {'results': [format_result(result) for result in results]}
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> dict:
+        url = urlsplit(target)
+
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self._routes):
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f'Method {method} is not allowed for {url.path}')
+            raise HttpError(HTTPStatus.NOT_FOUND, f'Not found: {url.path}')
+
+        if method == 'GET':
+            return await handler(dict(parse_qsl(url.query)))
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid JSON body')
+        return await handler(data)
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[tuple]:
+        """
+        Reads HTTP/1.x request.
+
+        :return: (method, target, body, keep_alive) tuple or None if client closed connection
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            content_length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length header')
+        if content_length > config.SERVER_MAX_BODY_SIZE:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body is too large')
+
+        body = await reader.readexactly(content_length) if content_length else b''
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        return method.upper(), target, body, keep_alive
+
+    @staticmethod
+    async def _write_response(
+            writer: asyncio.StreamWriter,
+            status: HTTPStatus,
+            payload: dict,
+            keep_alive: bool
+    ) -> None:
+        body = json.dumps(payload).encode()
+        head = f'HTTP/1.1 {status.value} {status.phrase}\r\n' \
+               f'Content-Type: application/json\r\n' \
+               f'Content-Length: {len(body)}\r\n' \
+               f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves requests of one connection one by one, until client closes it or it is idle for too long"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), config.SERVER_KEEP_ALIVE_TIMEOUT)
+                except HttpError as e:
+                    await self._write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    break  # idle or broken connection, ValueError is raised for too long line
+
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+
+                try:
+                    status, payload = HTTPStatus.OK, await self._dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception:
+                    logger.exception(f'Request {method} {target} failed:')
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': 'Internal server error'}
+
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(host: str, port: int) -> None:
+    server = ConversionServer(host, port)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def serve_main(argv: Optional[list] = None) -> int:
+    """Runs serve command with CLI arguments, until it is interrupted"""
+    args = get_serve_parser().parse_args(argv)
+    set_run_config(args)
+
+    logger.info(f"STARTING SERVER: "
+                f"host: {args.host},"
+                f"port: {args.port},"
+                f"source: {config.RUN_CONFIG['SOURCE']},"
+                f"mode: {config.RUN_CONFIG['MODE']}")
+    try:
+        with keep_db_connector():
+            asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info('Server stopped\n')
+    return 0
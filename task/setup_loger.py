@@ -1,6 +1,8 @@
 import logging
 import sys
 
+_file_logging = {'enabled': True}  # turned off by disable_file_logging, e.g. in benchmarks
+
 
 def setup_loger(name):
     """Helps which getting logger with necessary configuration"""
@@ -8,13 +10,30 @@ def setup_loger(name):
 
     running_tests = any("pytest" in arg for arg in sys.argv)
 
-    if not running_tests:
+    if not running_tests and _file_logging['enabled']:
         logger.setLevel(logging.INFO)
 
-        fileHandler = logging.FileHandler(f"logfile.log", mode='a')
+        fileHandler = logging.FileHandler(f"logfile.log", mode='a', delay=True)
         formatter = logging.Formatter('%(asctime)s [%(levelname)s] (%(name)s)  %(message)s')
 
         fileHandler.setFormatter(formatter)
         logger.addHandler(fileHandler)
 
     return logger
+
+
+def disable_file_logging() -> None:
+    """
+    Stops writing to logfile.log, used by tests and benchmarks, so they do not fill log of the working directory.
+    File handlers of already configured task loggers are replaced with NullHandler.
+    """
+    _file_logging['enabled'] = False
+
+    for name, logger in list(logging.Logger.manager.loggerDict.items()):
+        if not name.startswith('task') or not isinstance(logger, logging.Logger):
+            continue
+        for handler in [handler for handler in logger.handlers if isinstance(handler, logging.FileHandler)]:
+            logger.removeHandler(handler)
+            handler.close()
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
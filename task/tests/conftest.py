@@ -7,15 +7,40 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 from task import config
+from task.benchmarks.server import NbpStandIn
+from task.connectors.api.http_client import reset_http_client
+from task.setup_loger import disable_file_logging
 
-from task.tests.helpers import MockResponse
+from task.tests.helpers import MockResponse, NBP_TABLE_PAYLOAD
 from task.utils import Mode, Source
 
 
+@pytest.fixture(autouse=True, scope='session')
+def no_file_logging():
+    disable_file_logging()
+
+
+@pytest.fixture(autouse=True)
+def temporary_rate_cache(tmp_path):
+    original_path = config.RATE_CACHE_PATH
+    config.RATE_CACHE_PATH = str(tmp_path / 'rate_cache.sqlite3')
+    yield config.RATE_CACHE_PATH
+    config.RATE_CACHE_PATH = original_path
+
+
+@pytest.fixture(autouse=True)
+def temporary_iso_code_snapshot(tmp_path):
+    original_path = config.ISO_CODE_SNAPSHOT
+    config.ISO_CODE_SNAPSHOT = str(tmp_path / 'currency_iso_codes.marshal')
+    yield config.ISO_CODE_SNAPSHOT
+    config.ISO_CODE_SNAPSHOT = original_path
+
+
 @pytest.fixture
 def clean_config():
     config.RUN_CONFIG['MODE'] = ''
     config.RUN_CONFIG['SOURCE'] = ''
+    config.RUN_CONFIG['EFFECTIVE_RATE'] = False
     yield
 
 
@@ -48,6 +73,20 @@ def local_source(set_basic_config):
     yield
 
 
+@pytest.fixture
+def effective_rate(set_basic_config):
+    config.RUN_CONFIG['EFFECTIVE_RATE'] = True
+    yield
+
+
+@pytest.fixture
+def json_journal_db(dev_mode, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'JSON_DATABASE_FORMAT', 'JOURNAL')
+    monkeypatch.setattr(config, 'JSON_DATABASE_NAME', str(tmp_path / 'database.json'))
+    monkeypatch.setattr(config, 'JSON_JOURNAL_NAME', str(tmp_path / 'database.jsonl'))
+    yield
+
+
 @pytest.fixture
 def temporary_json_file():
     today = datetime.date.today().strftime("%Y-%m-%d")
@@ -55,6 +94,7 @@ def temporary_json_file():
         json_data = {
             "EUR": [
                 {f"date": f"{today}", "rate": 4.15},
+                {"date": "2023-11-20", "rate": 4.3692},
             ],
             "CZK": [
             ]
@@ -67,13 +107,29 @@ def temporary_json_file():
     temp_file.close()
 
 
+@pytest.fixture
+def nbp_stand_in(monkeypatch):
+    with NbpStandIn(delay=0.05) as nbp:
+        monkeypatch.setattr(config, 'NBP_API_URL', nbp.url)
+        reset_http_client()
+        yield nbp
+    reset_http_client()
+
+
 @pytest.fixture
 def mock_nbp_api(monkeypatch):
     mock_response = MockResponse(status_code=200)
-    monkeypatch.setattr('task.exchange_rate.requests.get', mock_response.request_get)
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', mock_response.request_get)
     yield
 
 
+@pytest.fixture
+def mock_nbp_api_table(monkeypatch):
+    mock_response = MockResponse(status_code=200, payload=NBP_TABLE_PAYLOAD)
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', mock_response.request_get)
+    yield mock_response
+
+
 @pytest.fixture(scope='session')
 def db_engine(request):
     """yields a SQLAlchemy engine which is suppressed after the test session"""
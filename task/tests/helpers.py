@@ -1,4 +1,6 @@
+import datetime
 import os
+import sys
 
 import decorator
 import requests
@@ -6,25 +8,71 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
 from task import config
-from task.connectors.database.sqlite import SqliteDatabaseConnector, Base
+from task.connectors.database.sqlite import SqliteDatabaseConnector, Base, dispose_engines
 
 
 class MockResponse:
-    def __init__(self, status_code=200):
+    def __init__(self, status_code=200, payload=None):
         self.status_code = status_code
         self.headers = {'content-type': 'application/json'}
+        self.payload = payload if payload is not None else {
+            'rates': [{'effectiveDate': datetime.date.today().isoformat(), 'mid': 1.0}]
+        }
+        self.calls = 0
 
     def json(self):
-        return {'rates': [{'mid': 1.0}]}
+        return self.payload
 
     def raise_for_status(self):
         if self.status_code >= 400:
             raise requests.exceptions.HTTPError(f"HTTP Error {self.status_code}")
 
     def request_get(self, *args, **kwargs):
+        self.calls += 1
         return self
 
 
+NBP_TABLE_PAYLOAD = [{
+    'table': 'A',
+    'effectiveDate': '2023-11-20',
+    'rates': [
+        {'currency': 'euro', 'code': 'EUR', 'mid': 4.3692},
+        {'currency': 'dolar amerykański', 'code': 'USD', 'mid': 3.9966},
+        {'currency': 'korona czeska', 'code': 'CZK', 'mid': 0.1787},
+    ]
+}]
+
+
+TASK_SCRIPT = '''
+import json, sys
+from task import config
+config.LOCAL_DATA_SOURCES, config.JSON_DATABASE_NAME, config.RATE_CACHE_PATH, config.ISO_CODE_SNAPSHOT = sys.argv[1:5]
+sys.argv = ['task', *sys.argv[5:]]
+
+from task.__main__ import main
+
+exit_code = main()
+print(json.dumps(sorted(sys.modules)), file=sys.stderr)
+sys.exit(exit_code)
+'''
+
+
+def get_task_command(directory, local_source, *args) -> list:
+    """
+    Returns command, which runs python -m task with args in fresh interpreter, with database, rate cache
+    and ISO codes snapshot in directory. Modules imported by the run are written to the last line of stderr
+    as JSON list.
+    """
+    paths = [local_source, os.path.join(directory, 'database.json'), os.path.join(directory, 'cache.sqlite3'),
+             os.path.join(directory, 'iso.marshal')]
+    return [sys.executable, '-c', TASK_SCRIPT, *map(str, paths), *args]
+
+
+def get_subprocess_env() -> dict:
+    """Returns environment of current process, in which task package can be imported from any directory"""
+    return {**os.environ, 'PYTHONPATH': config.ROOT_DIR}
+
+
 class DbTestConfig:
     DB_URL = f'sqlite:///{config.ROOT_DIR}/task/tests/sqlite3.db'
 
@@ -46,10 +94,12 @@ def with_sqlite_db(func):
         finally:
 
             session.close()
-            try:
-                os.remove(SqliteDatabaseConnector.db_url.replace('sqlite:///', ''))
-            except FileNotFoundError:
-                pass
+            dispose_engines()
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(SqliteDatabaseConnector.db_url.replace('sqlite:///', '') + suffix)
+                except FileNotFoundError:
+                    pass
 
             SqliteDatabaseConnector.db_url = original_db_url
 
@@ -72,6 +122,8 @@ def with_json_db(func):
         finally:
 
             os.remove(json_file_path)
+            if os.path.exists(f'{json_file_path}.lock'):
+                os.remove(f'{json_file_path}.lock')
         config.JSON_DATABASE_NAME = original_json_db_path
     return decorator.decorator(wrapper, func)
 
@@ -0,0 +1,94 @@
+import datetime
+import json
+import time
+
+import pytest
+
+from task import config
+from task.backfill import backfill_rates, get_date_chunks
+from task.connectors.api.rate_limiter import TokenBucket
+from task.exchange_rate import get_rate_data, LocalSourceCurrencyRateFetcher
+from task.tests.helpers import MockResponse
+
+
+@pytest.mark.parametrize('start, end, expected_chunks', [
+    ('2023-01-01', '2023-01-01', [('2023-01-01', '2023-01-01')]),
+    ('2023-01-01', '2023-04-03', [('2023-01-01', '2023-04-03')]),
+    ('2023-01-01', '2023-07-20', [
+        ('2023-01-01', '2023-04-03'),
+        ('2023-04-04', '2023-07-05'),
+        ('2023-07-06', '2023-07-20')
+    ]),
+])
+def test_get_date_chunks(start, end, expected_chunks):
+    chunks = get_date_chunks(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end), 93)
+
+    assert [(s.isoformat(), e.isoformat()) for s, e in chunks] == expected_chunks
+
+
+def test_get_date_chunks_invalid_range():
+    with pytest.raises(ValueError):
+        list(get_date_chunks(datetime.date(2023, 2, 1), datetime.date(2023, 1, 1), 93))
+
+
+def test_token_bucket_throttles():
+    token_bucket = TokenBucket(rate=20, capacity=1)
+
+    started_at = time.monotonic()
+    for _ in range(3):
+        token_bucket.acquire()
+
+    assert time.monotonic() - started_at >= 0.09
+
+
+def test_backfill_rates(local_source, tmp_path, monkeypatch):
+    requested_urls = []
+
+    def fake_get(self, url, **kwargs):
+        requested_urls.append(url)
+        if '/2023-01-01/2023-04-03/' in url:
+            return MockResponse(payload={'rates': [
+                {'effectiveDate': '2023-01-02', 'mid': 4.6784},
+                {'effectiveDate': '2023-04-03', 'mid': 4.6826},
+            ]})
+        return MockResponse(status_code=404)
+
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', fake_get)
+    store_path = str(tmp_path / 'rates.json')
+
+    stored = backfill_rates(['eur'], datetime.date(2023, 1, 1), datetime.date(2023, 5, 1),
+                            store_path=store_path, requests_per_second=100)
+
+    assert stored == 2
+    assert len(requested_urls) == 2
+    with open(store_path) as file:
+        assert json.load(file) == {'EUR': [
+            {'date': '2023-04-03', 'rate': 4.6826},
+            {'date': '2023-01-02', 'rate': 4.6784},
+        ]}
+
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = store_path
+
+    rate_data = get_rate_data('eur', fetch_date='2023-01-02')
+
+    assert isinstance(rate_data, LocalSourceCurrencyRateFetcher)
+    assert rate_data.rate == 4.6784
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+def test_backfill_rates_default_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'BACKFILL_RATES_PATH', str(tmp_path / 'backfilled.json'))
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', lambda self, url, **kwargs: MockResponse(
+        payload={'rates': [{'effectiveDate': '2023-01-02', 'mid': 4.6784}]}
+    ))
+    with open(config.LOCAL_DATA_SOURCES) as file:
+        example_data = file.read()
+
+    backfill_rates(['eur'], datetime.date(2023, 1, 2), datetime.date(2023, 1, 2), requests_per_second=100)
+
+    with open(config.BACKFILL_RATES_PATH) as file:
+        assert json.load(file) == {'EUR': [{'date': '2023-01-02', 'rate': 4.6784}]}
+    with open(config.LOCAL_DATA_SOURCES) as file:
+        assert file.read() == example_data
@@ -0,0 +1,93 @@
+import io
+import json
+
+from task import config
+from task.batch import convert_rows, read_rows, InputFormat
+from task.currency_converter import ConvertedPricePLN
+from task.tests.helpers import with_json_db, with_sqlite_db
+
+
+def test_read_rows_csv():
+    rows = list(read_rows(io.StringIO('currency,price\neur,100\nxyz,1\nusd,abc\n\nczk,10.123456\n'), InputFormat.CSV))
+
+    assert [line_number for line_number, _ in rows] == [2, 3, 4, 6]
+    assert rows[0][1] == ('EUR', 100.0, None)
+    assert isinstance(rows[1][1], ValueError)
+    assert isinstance(rows[2][1], ValueError)
+    assert rows[3][1] == ('CZK', 10.1235, None)
+
+
+def test_read_rows_jsonl():
+    content = '{"currency": "eur", "price": 100}\n{"price": 1}\nnot json\n{"currency": "usd", "price": "2.5"}\n'
+
+    rows = list(read_rows(io.StringIO(content), InputFormat.JSONL))
+
+    assert rows[0] == (1, ('EUR', 100.0, None))
+    assert isinstance(rows[1][1], ValueError)
+    assert isinstance(rows[2][1], ValueError)
+    assert rows[3] == (4, ('USD', 2.5, None))
+
+
+def test_read_rows_with_date():
+    csv_rows = list(read_rows(io.StringIO('currency,price,date\neur,100,2023-11-20\neur,1,\neur,1,20.11.2023\n'),
+                              InputFormat.CSV))
+    jsonl_rows = list(read_rows(io.StringIO('{"currency": "eur", "price": 100, "date": "2023-11-20"}\n'),
+                                InputFormat.JSONL))
+
+    assert csv_rows[0] == (2, ('EUR', 100.0, '2023-11-20'))
+    assert csv_rows[1] == (3, ('EUR', 1.0, None))
+    assert str(csv_rows[2][1]) == 'Invalid date: 20.11.2023, use YYYY-MM-DD format.'
+    assert jsonl_rows == [(1, ('EUR', 100.0, '2023-11-20'))]
+
+
+@with_json_db
+def test_convert_rows_with_date(dev_mode, local_source, temporary_json_file, monkeypatch):
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES', temporary_json_file)
+    rows = read_rows(io.StringIO('eur,100\neur,100,2023-11-20\neur,1,2023-11-19\n'), InputFormat.CSV)
+    output = io.StringIO()
+
+    converted, failed = convert_rows(rows, output, fetch_date='2023-11-20')
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert (converted, failed) == (2, 1)
+    # date of row is used before default date of all rows
+    assert [(result.get('date'), result.get('price_in_pln')) for result in results] == [
+        ('2023-11-20', 436.92), ('2023-11-20', 436.92), (None, None)
+    ]
+
+
+@with_json_db
+def test_convert_rows_dev_mode_local(dev_mode, local_source, temporary_json_file, mocker):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+
+    save_many = mocker.spy(ConvertedPricePLN, 'save_many')
+    rows = read_rows(io.StringIO('eur,100\nczk,1\nxyz,1\neur,2\neur,3\n'), InputFormat.CSV)
+    output = io.StringIO()
+
+    converted, failed = convert_rows(rows, output, chunk_size=2)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert (converted, failed) == (3, 2)
+    assert [result['line'] for result in results] == [1, 2, 3, 4, 5]
+    assert [result.get('price_in_pln') for result in results] == [415.0, None, None, 8.3, 12.45]
+    assert results[1]['error'] == 'There is no exchange rate for the specified currency for today in example file'
+    assert results[2]['error'] == 'Invalid currency: xyz'
+    assert save_many.call_count == 3
+    assert len(ConvertedPricePLN.get_all()) == 3
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+@with_sqlite_db
+def test_convert_rows_prod_mode_api(prod_mode, mock_nbp_api_table):
+    rows = read_rows(io.StringIO('{"currency": "eur", "price": 100}\n{"currency": "usd", "price": 10}\n'),
+                     InputFormat.JSONL)
+    output = io.StringIO()
+
+    converted, failed = convert_rows(rows, output)
+
+    assert (converted, failed) == (2, 0)
+    assert mock_nbp_api_table.calls == 1
+    assert len(ConvertedPricePLN.get_all()) == 2
@@ -1,13 +1,15 @@
+import datetime
 import json
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from task import config
+from task import config, currency_converter
 from task.connectors.database.sqlite import SqliteDatabaseConnector, ConvertedPriceToPLNModel
 from task.currency_converter import PriceCurrencyConverterToPLN, ConvertedPricePLN
+from task.utils import convert
 
-from task.tests.helpers import with_sqlite_db, with_json_db
+from task.tests.helpers import MockResponse, with_sqlite_db, with_json_db
 
 
 @with_sqlite_db
@@ -92,3 +94,121 @@ def test_convert_to_pln_dev_mode_local(dev_mode, local_source, temporary_json_fi
     assert counter_before_call + 1 == counter_after_call
 
     config.LOCAL_DATA_SOURCES = original_filename
+
+
+@with_json_db
+def test_convert_to_pln_saves_effective_date(dev_mode, api_source, effective_rate, monkeypatch):
+    responses = [MockResponse(status_code=404), MockResponse(payload={'rates': [{'effectiveDate': '2023-11-24',
+                                                                                  'mid': 4.3644}]})]
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', lambda self, url, **kwargs: responses.pop(0))
+
+    res = PriceCurrencyConverterToPLN().convert_to_pln(currency='eur', price=100.00)
+
+    # rate published before today is used, so the date it was published on is saved, not today
+    assert (res.currency_rate, res.currency_rate_fetch_date) == (4.3644, '2023-11-24')
+    assert ConvertedPricePLN.get_all()[-1].currency_rate_fetch_date == '2023-11-24'
+
+
+@with_json_db
+def test_effective_rate_is_fetched_once_for_many_conversions(dev_mode, api_source, effective_rate, nbp_stand_in):
+    nbp_stand_in.effective_date = '2023-11-24'
+    converter = PriceCurrencyConverterToPLN()
+
+    for _ in range(3):
+        assert converter.convert_to_pln(currency='eur', price=100.00).currency_rate_fetch_date == '2023-11-24'
+    for chunk in ([('eur', 1.00), ('usd', 2.00)], [('usd', 3.00), ('czk', 4.00)]):
+        assert {obj.currency_rate_fetch_date for obj in converter.convert_many(chunk)} == {'2023-11-24'}
+
+    # NBP is asked for today's rate and for the most recent one only once, later conversions use rate cache
+    assert nbp_stand_in.requests == {
+        '/api/exchangerates/rates/a/eur/today/': 1,
+        '/api/exchangerates/rates/a/eur/last/1/': 1,
+        '/api/exchangerates/tables/a/today/': 1,
+        '/api/exchangerates/tables/a/last/1/': 1,
+    }
+
+
+@with_sqlite_db
+def test_convert_many_prod_mode_api(prod_mode, mock_nbp_api_table):
+    engine = create_engine(SqliteDatabaseConnector.db_url, echo=True)  # trying to use as basic function as possible
+    session = Session(engine)
+
+    counter_before_call = session.query(ConvertedPricePLN.bind_db_model).count()
+
+    converter = PriceCurrencyConverterToPLN()
+    res = converter.convert_many([('eur', 100.00), ('USD', 10.00), ('eur', 1.00), ('czk', 50.00)])
+
+    counter_after_call = session.query(ConvertedPricePLN.bind_db_model).count()
+
+    assert [(obj.currency, obj.price_in_source_currency, obj.price_in_pln) for obj in res] == [
+        ('eur', 100.00, 436.92),
+        ('usd', 10.00, 39.966),
+        ('eur', 1.00, 4.3692),
+        ('czk', 50.00, 8.935),
+    ]
+    assert {obj.currency_rate_fetch_date for obj in res} == {'2023-11-20'}  # effective date of table
+    assert mock_nbp_api_table.calls == 1
+    assert counter_before_call + 4 == counter_after_call
+    assert ConvertedPricePLN.get_all() == res
+
+
+@with_json_db
+def test_convert_many_dev_mode_local(dev_mode, local_source, temporary_json_file):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+
+    converter = PriceCurrencyConverterToPLN()
+    res = converter.convert_many([('eur', 100.00), ('eur', 2.00)])
+
+    with open(config.JSON_DATABASE_NAME, "r") as file:
+        saved = json.load(file)
+
+    assert [obj.price_in_pln for obj in res] == [415.00, 8.30]
+    assert [item['id'] for item in saved.values()] == [1, 2]
+    assert ConvertedPricePLN.get_all() == res
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+@with_json_db
+def test_convert_to_pln_with_date(dev_mode, local_source, temporary_json_file, monkeypatch):
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES', temporary_json_file)
+
+    res = PriceCurrencyConverterToPLN().convert_to_pln(currency='eur', price=100.00, fetch_date='2023-11-20')
+
+    assert (res.currency_rate, res.currency_rate_fetch_date, res.price_in_pln) == (4.3692, '2023-11-20', 436.92)
+
+
+@with_json_db
+def test_convert_many_with_dates(dev_mode, local_source, temporary_json_file, monkeypatch):
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES', temporary_json_file)
+    today = datetime.date.today().isoformat()
+
+    res = PriceCurrencyConverterToPLN().convert_many(
+        [('eur', 100.00), ('eur', 100.00, '2023-11-20'), ('eur', 1.00, None), ('eur', 1.00, '2023-11-19')],
+        fail_fast=False
+    )
+
+    assert [(obj.currency_rate_fetch_date, obj.price_in_pln) for obj in res[:3]] == [
+        (today, 415.0), ('2023-11-20', 436.92), (today, 4.15)
+    ]
+    assert isinstance(res[3], KeyError)
+    assert ConvertedPricePLN.get_all() == res[:3]
+
+
+@with_json_db
+def test_convert_many_uses_convert_array(dev_mode, local_source, temporary_json_file, mocker):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+    convert_array = mocker.spy(currency_converter, 'convert_array')
+    prices = [round(i * 1.37, 2) for i in range(config.CONVERT_ARRAY_MIN_SIZE)]
+
+    res = PriceCurrencyConverterToPLN().convert_many([('eur', price) for price in prices] + [('usd', 1.0)],
+                                                     fail_fast=False)
+
+    assert convert_array.call_count == 1
+    assert [obj.price_in_pln for obj in res[:-1]] == [convert(price=price, rate=4.15, operator='*') for price in prices]
+    assert isinstance(res[-1], Exception)
+    assert ConvertedPricePLN.get_all() == res[:-1]
+
+    config.LOCAL_DATA_SOURCES = original_filename
@@ -1,10 +1,21 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from dataclasses import astuple
+
 import pytest
+from sqlalchemy.exc import OperationalError
 
 from task import config
+from task.connectors.database.interface import ConversionSummary
 from task.connectors.database.json import JsonFileDatabaseConnector
-from task.connectors.database.sqlite import SqliteDatabaseConnector
+from task.connectors.database.json_journal import JsonJournalDatabaseConnector
+from task.connectors.database.utils import get_db_connector_class
+from task.connectors.database.sqlite import SqliteDatabaseConnector, dispose_engines, get_engine
 from task.currency_converter import ConvertedPricePLN, PriceCurrencyConverterToPLN
-from task.tests.helpers import with_sqlite_db, with_json_db
+from task.tests.helpers import DbTestConfig, with_sqlite_db, with_json_db
 
 
 @with_sqlite_db
@@ -207,3 +218,468 @@ def test_get_by_id_dev_mode_local(dev_mode, local_source, temporary_json_file):
     assert excinfo.value.args[0] == 'No object ConvertedPricePLN with id=-1.'
 
     config.LOCAL_DATA_SOURCES = original_filename
+
+
+@with_sqlite_db
+def test_sqlite_engine_is_reused_and_sessions_released(prod_mode, mock_nbp_api):
+    converter = PriceCurrencyConverterToPLN()
+    converter.convert_to_pln(currency='eur', price=105.00)
+
+    engine = get_engine(SqliteDatabaseConnector.db_url)
+
+    SqliteDatabaseConnector().get_all(ConvertedPricePLN)
+    SqliteDatabaseConnector().get_by_id(ConvertedPricePLN, 1)
+
+    assert get_engine(SqliteDatabaseConnector.db_url) is engine
+    assert engine.echo is False
+    assert engine.pool.checkedout() == 0
+
+
+@with_sqlite_db
+def test_save_many_prod_mode(prod_mode):
+    entities = [
+        ConvertedPricePLN(price_in_source_currency=float(i), currency='eur', currency_rate=4.0,
+                          currency_rate_fetch_date='2023-11-20', price_in_pln=4.0 * i)
+        for i in range(1, 101)
+    ]
+
+    ConvertedPricePLN.save_many(entities)
+
+    assert SqliteDatabaseConnector().get_all(ConvertedPricePLN) == entities
+    assert SqliteDatabaseConnector().get_by_id(ConvertedPricePLN, 100) == entities[-1]
+
+
+@with_json_db
+def test_save_many_dev_mode(dev_mode, mocker):
+    write_data_to_db = mocker.spy(JsonFileDatabaseConnector, '_write_data_to_db')
+    entities = [
+        ConvertedPricePLN(price_in_source_currency=float(i), currency='eur', currency_rate=4.0,
+                          currency_rate_fetch_date='2023-11-20', price_in_pln=4.0 * i)
+        for i in range(1, 101)
+    ]
+
+    ConvertedPricePLN.save_many(entities)
+
+    assert write_data_to_db.call_count == 1
+    assert JsonFileDatabaseConnector().get_all(ConvertedPricePLN) == entities
+    assert JsonFileDatabaseConnector().get_by_id(ConvertedPricePLN, 100) == entities[-1]
+
+
+@with_json_db
+def test_json_ids_are_int_keys_and_continue_after_reload(dev_mode, mocker):
+    entity = ConvertedPricePLN(price_in_source_currency=1.0, currency='eur', currency_rate=4.0,
+                               currency_rate_fetch_date='2023-11-20', price_in_pln=4.0)
+    ConvertedPricePLN.save_many([entity, entity])
+
+    connector = JsonFileDatabaseConnector()
+    assert list(connector._data) == [1, 2]
+
+    deserialize = mocker.spy(ConvertedPricePLN, 'deserialize')
+    assert connector.get_by_id(ConvertedPricePLN, 2) == entity
+    assert deserialize.call_count == 1
+
+    connector.save(entity)
+    JsonFileDatabaseConnector().save(entity)
+
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert [item['id'] for item in json.load(file).values()] == [1, 2, 3, 4]
+
+
+@with_sqlite_db
+def test_iter_all_prod_mode(prod_mode):
+    entities = [_make_entity(4.0 * i) for i in range(1, 26)]
+    ConvertedPricePLN.save_many(entities)
+
+    iterator = ConvertedPricePLN.iter_all(batch_size=10)
+
+    assert not isinstance(iterator, list)
+    assert list(iterator) == entities
+
+
+@with_json_db
+def test_iter_all_dev_mode_streams_file(dev_mode, mocker):
+    entities = [_make_entity(4.0 * i) for i in range(1, 26)]
+    ConvertedPricePLN.save_many(entities)
+    read_data = mocker.spy(JsonFileDatabaseConnector, '_read_data')
+
+    assert list(ConvertedPricePLN.iter_all()) == entities
+    assert read_data.call_count == 0
+
+
+LEGACY_RECORDS = [
+    (1, 'eur', 4.6285, 21.1, '2010-01-01'),
+    (2, 'czk', 0.18, 18.0, '2023-08-30'),
+]
+LEGACY_ENTITIES = [
+    ConvertedPricePLN(price_in_source_currency=4.5588, currency='eur', currency_rate=4.6285,
+                      currency_rate_fetch_date='2010-01-01', price_in_pln=21.1),
+    ConvertedPricePLN(price_in_source_currency=100.0, currency='czk', currency_rate=0.18,
+                      currency_rate_fetch_date='2023-08-30', price_in_pln=18.0),
+]
+
+
+def test_sqlite_legacy_table_migrated_to_scaled_amounts(prod_mode, tmp_path, monkeypatch):
+    db_path = tmp_path / 'legacy.db'
+    with sqlite3.connect(db_path) as connection:
+        connection.execute('CREATE TABLE converted_prices '
+                           '(id INTEGER PRIMARY KEY, currency VARCHAR, rate FLOAT, price_in_pln FLOAT, date VARCHAR)')
+        connection.execute('CREATE INDEX ix_converted_prices_currency_date ON converted_prices (currency, date)')
+        connection.executemany('INSERT INTO converted_prices VALUES (?, ?, ?, ?, ?)', LEGACY_RECORDS)
+    connection.close()
+    monkeypatch.setattr(SqliteDatabaseConnector, 'db_url', f'sqlite:///{db_path}')
+
+    try:
+        assert ConvertedPricePLN.get_all() == LEGACY_ENTITIES
+        _make_entity(8.0).save()
+
+        with sqlite3.connect(db_path) as connection:
+            rows = connection.execute('SELECT id, price, price_in_pln FROM converted_prices').fetchall()
+        connection.close()
+    finally:
+        dispose_engines()
+
+    assert rows == [(1, 45588, 211000), (2, 1000000, 180000), (3, 20000, 80000)]
+
+
+@with_json_db
+def test_json_legacy_records_upgraded_on_read(dev_mode):
+    with open(config.JSON_DATABASE_NAME, 'w') as file:
+        json.dump({str(id_): {'id': id_, 'currency': currency, 'rate': rate, 'price_in_pln': price_in_pln,
+                              'date': date} for id_, currency, rate, price_in_pln, date in LEGACY_RECORDS}, file)
+
+    assert ConvertedPricePLN.get_all() == LEGACY_ENTITIES
+    assert list(ConvertedPricePLN.iter_all()) == LEGACY_ENTITIES
+    assert ConvertedPricePLN.query(price_min=20.0) == LEGACY_ENTITIES[:1]
+
+    _make_entity(8.0).save()
+
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert [(v['price'], v['price_in_pln']) for v in json.load(file).values()] == [
+            (45588, 211000), (1000000, 180000), (20000, 80000)
+        ]
+
+
+QUERY_DATA = [
+    ('eur', 4.35, 435.0, '2023-11-20'),
+    ('usd', 4.0, 40.0, '2023-11-20'),
+    ('eur', 4.36, 43.6, '2023-11-21'),
+    ('eur', 4.37, 4.37, '2023-11-22'),
+    ('usd', 4.1, 410.0, '2023-11-22'),
+]
+
+QUERY_CASES = [
+    ({'currency': 'EUR'}, [1, 3, 4]),
+    ({'currency': 'eur', 'date_from': '2023-11-21'}, [3, 4]),
+    ({'currency': 'eur', 'date_from': '2023-11-20', 'date_to': '2023-11-21'}, [1, 3]),
+    ({'date_to': '2023-11-20'}, [1, 2]),
+    ({'price_min': 40.0, 'price_max': 410.0}, [2, 3, 5]),
+    ({'order_by': 'price_in_pln', 'descending': True}, [1, 5, 3, 2, 4]),
+    ({'order_by': 'date', 'limit': 2, 'offset': 1}, [2, 3]),
+    ({'currency': 'gbp'}, []),
+]
+
+
+def _save_query_data():
+    ConvertedPricePLN.save_many([
+        ConvertedPricePLN(price_in_source_currency=round(price_in_pln / rate, 4), currency=currency,
+                          currency_rate=rate, currency_rate_fetch_date=date, price_in_pln=price_in_pln)
+        for currency, rate, price_in_pln, date in QUERY_DATA
+    ])
+
+
+@pytest.mark.parametrize('filters, expected_ids', QUERY_CASES)
+@with_sqlite_db
+def test_query_prod_mode(prod_mode, filters, expected_ids):
+    _save_query_data()
+    expected = [SqliteDatabaseConnector().get_by_id(ConvertedPricePLN, id_) for id_ in expected_ids]
+
+    assert ConvertedPricePLN.query(**filters) == expected
+
+
+@pytest.mark.parametrize('filters, expected_ids', QUERY_CASES)
+@with_json_db
+def test_query_dev_mode(dev_mode, filters, expected_ids):
+    _save_query_data()
+    expected = [JsonFileDatabaseConnector().get_by_id(ConvertedPricePLN, id_) for id_ in expected_ids]
+
+    assert ConvertedPricePLN.query(**filters) == expected
+
+
+AGGREGATE_CASES = [
+    ({}, [
+        ('eur', '2023-11-20', 1, 435.0, 4.35),
+        ('eur', '2023-11-21', 1, 43.6, 4.36),
+        ('eur', '2023-11-22', 1, 4.37, 4.37),
+        ('usd', '2023-11-20', 2, 80.0, 4.0),
+        ('usd', '2023-11-22', 1, 410.0, 4.1),
+    ]),
+    ({'currency': 'USD', 'date_to': '2023-11-21'}, [('usd', '2023-11-20', 2, 80.0, 4.0)]),
+    ({'date_from': '2023-11-22'}, [('eur', '2023-11-22', 1, 4.37, 4.37), ('usd', '2023-11-22', 1, 410.0, 4.1)]),
+    ({'currency': 'gbp'}, []),
+]
+
+
+def _save_aggregate_data():
+    _save_query_data()
+    ConvertedPricePLN(price_in_source_currency=10.0, currency='usd', currency_rate=4.0,
+                      currency_rate_fetch_date='2023-11-20', price_in_pln=40.0).save()
+
+
+def _assert_summaries(summaries, expected):
+    """Totals are sums of scaled integers, so they are exact, only average rates are compared with tolerance"""
+    assert [astuple(summary)[:4] for summary in summaries] == [item[:4] for item in expected]
+    assert [summary.average_rate for summary in summaries] == pytest.approx([item[4] for item in expected])
+
+
+@pytest.mark.parametrize('filters, expected', AGGREGATE_CASES)
+@with_sqlite_db
+def test_aggregate_prod_mode(prod_mode, filters, expected):
+    _save_aggregate_data()
+
+    _assert_summaries(ConvertedPricePLN.aggregate(**filters), expected)
+
+
+@pytest.mark.parametrize('filters, expected', AGGREGATE_CASES)
+@with_json_db
+def test_aggregate_dev_mode(dev_mode, mocker, filters, expected):
+    _save_aggregate_data()
+    deserialize = mocker.spy(ConvertedPricePLN, 'deserialize')
+
+    summaries = ConvertedPricePLN.aggregate(**filters)
+
+    assert all(isinstance(summary, ConversionSummary) for summary in summaries)
+    _assert_summaries(summaries, expected)
+    assert deserialize.call_count == 0
+
+
+@with_json_db
+def test_query_invalid_order_by(dev_mode):
+    with pytest.raises(ValueError):
+        ConvertedPricePLN.query(order_by='price_in_source_currency')
+
+
+@with_sqlite_db
+def test_sqlite_currency_date_index_and_pragmas(prod_mode):
+    _save_query_data()
+
+    with get_engine(SqliteDatabaseConnector.db_url).connect() as connection:
+        indexes = [row[1] for row in connection.exec_driver_sql('PRAGMA index_list(converted_prices)')]
+        journal_mode = connection.exec_driver_sql('PRAGMA journal_mode').scalar()
+        plan = ' '.join(str(row[-1]) for row in connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM converted_prices WHERE currency = 'eur' AND date >= '2023-11-21'"
+        ))
+
+    assert 'ix_converted_prices_currency_date' in indexes
+    assert journal_mode == 'wal'
+    assert 'ix_converted_prices_currency_date' in plan
+
+
+def _make_entity(price_in_pln):
+    return ConvertedPricePLN(price_in_source_currency=round(price_in_pln / 4.0, 4), currency='eur',
+                             currency_rate=4.0, currency_rate_fetch_date='2023-11-20', price_in_pln=price_in_pln)
+
+
+def test_json_journal_save_appends_line(json_journal_db):
+    assert get_db_connector_class() is JsonJournalDatabaseConnector
+
+    _make_entity(4.0).save()
+    ConvertedPricePLN.save_many([_make_entity(8.0), _make_entity(12.0)])
+
+    with open(config.JSON_JOURNAL_NAME) as file:
+        lines = [json.loads(line) for line in file]
+
+    assert [line['id'] for line in lines] == [1, 2, 3]
+    assert not os.path.exists(config.JSON_DATABASE_NAME)
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+    assert ConvertedPricePLN.get_by_id(3) == _make_entity(12.0)
+
+
+def test_json_journal_compact(json_journal_db):
+    ConvertedPricePLN.save_many([_make_entity(4.0), _make_entity(8.0)])
+
+    JsonJournalDatabaseConnector().compact()
+
+    assert os.path.getsize(config.JSON_JOURNAL_NAME) == 0
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert [item['id'] for item in json.load(file).values()] == [1, 2]
+
+    _make_entity(12.0).save()
+
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+
+
+def test_json_journal_compaction_threshold(json_journal_db, monkeypatch):
+    monkeypatch.setattr(config, 'JSON_JOURNAL_COMPACTION_THRESHOLD', 3)
+
+    ConvertedPricePLN.save_many([_make_entity(4.0), _make_entity(8.0)])
+    assert not os.path.exists(config.JSON_DATABASE_NAME)
+
+    _make_entity(12.0).save()
+
+    assert os.path.getsize(config.JSON_JOURNAL_NAME) == 0
+    assert len(ConvertedPricePLN.get_all()) == 3
+
+
+def test_json_journal_skips_incomplete_line(json_journal_db):
+    ConvertedPricePLN.save_many([_make_entity(4.0), _make_entity(8.0)])
+    with open(config.JSON_JOURNAL_NAME, 'a') as file:
+        file.write('{"id": 3, "curr')
+
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0), _make_entity(8.0)]
+
+    _make_entity(12.0).save()
+
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+
+
+def test_json_journal_iter_all_skips_records_already_in_snapshot(json_journal_db):
+    ConvertedPricePLN.save_many([_make_entity(4.0), _make_entity(8.0)])
+    with open(config.JSON_JOURNAL_NAME) as file:
+        journal = file.read()
+    JsonJournalDatabaseConnector().compact()
+
+    # compaction interrupted before journal truncation
+    with open(config.JSON_JOURNAL_NAME, 'w') as file:
+        file.write(journal)
+    _make_entity(12.0).save()
+
+    assert list(ConvertedPricePLN.iter_all()) == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+
+
+def test_json_journal_save_does_not_read_database(json_journal_db, mocker):
+    ConvertedPricePLN.save_many([_make_entity(4.0), _make_entity(8.0)])
+    JsonJournalDatabaseConnector().compact()
+    _make_entity(12.0).save()
+    read_data = mocker.spy(JsonJournalDatabaseConnector, '_read_data')
+
+    _make_entity(16.0).save()
+    ConvertedPricePLN.save_many([_make_entity(20.0), _make_entity(24.0)])
+
+    # next id is taken from the last journal line and the last snapshot id stored by compaction
+    assert read_data.call_count == 0
+    with open(config.JSON_JOURNAL_NAME) as file:
+        assert [json.loads(line)['id'] for line in file] == [3, 4, 5, 6]
+    assert [entity.price_in_pln for entity in ConvertedPricePLN.get_all()] == [4.0, 8.0, 12.0, 16.0, 20.0, 24.0]
+
+
+def test_json_journal_save_after_snapshot_written_by_json_connector(json_journal_db, monkeypatch):
+    ConvertedPricePLN.save_many([_make_entity(4.0), _make_entity(8.0)])
+    JsonJournalDatabaseConnector().compact()
+
+    # snapshot rewritten by JSON connector makes the last snapshot id stored by compaction stale
+    monkeypatch.setattr(config, 'JSON_DATABASE_FORMAT', 'JSON')
+    _make_entity(12.0).save()
+    monkeypatch.setattr(config, 'JSON_DATABASE_FORMAT', 'JOURNAL')
+    _make_entity(16.0).save()
+
+    with open(config.JSON_JOURNAL_NAME) as file:
+        assert [json.loads(line)['id'] for line in file] == [4]
+    assert [entity.price_in_pln for entity in ConvertedPricePLN.get_all()] == [4.0, 8.0, 12.0, 16.0]
+
+
+def _save_entities_in_process(count):
+    for i in range(count):
+        get_db_connector_class()().save(_make_entity(4.0 * (i + 1)))
+
+
+def _save_entities_in_processes(processes, count):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_save_entities_in_process, args=(count,)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+
+@with_json_db
+def test_json_save_does_not_lose_writes_of_other_connector(dev_mode):
+    first, second = JsonFileDatabaseConnector(), JsonFileDatabaseConnector()
+    first.get_all(ConvertedPricePLN)
+    second.get_all(ConvertedPricePLN)
+
+    first.save(_make_entity(4.0))
+    second.save(_make_entity(8.0))
+    first.save(_make_entity(12.0))
+
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert [item['id'] for item in json.load(file).values()] == [1, 2, 3]
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+
+
+@with_json_db
+def test_json_failed_write_keeps_database_intact(dev_mode, mocker):
+    _make_entity(4.0).save()
+    mocker.patch('task.connectors.database.json.json.dump', side_effect=OSError('No space left on device'))
+
+    with pytest.raises(OSError):
+        _make_entity(8.0).save()
+
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0)]
+    assert not [name for name in os.listdir(os.path.dirname(config.JSON_DATABASE_NAME)) if name.endswith('.tmp')]
+
+
+@with_json_db
+def test_json_save_from_many_processes(dev_mode):
+    _save_entities_in_processes(processes=4, count=10)
+
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert sorted(item['id'] for item in json.load(file).values()) == list(range(1, 41))
+
+
+def test_json_journal_save_from_many_processes(json_journal_db, monkeypatch):
+    monkeypatch.setattr(config, 'JSON_JOURNAL_COMPACTION_THRESHOLD', 15)
+
+    _save_entities_in_processes(processes=4, count=10)
+
+    assert len(ConvertedPricePLN.get_all()) == 40
+    assert sorted(JsonJournalDatabaseConnector()._data) == list(range(1, 41))
+
+
+def test_json_journal_replays_records_of_other_connector(json_journal_db):
+    first, second = JsonJournalDatabaseConnector(), JsonJournalDatabaseConnector()
+    first.get_all(ConvertedPricePLN)
+    second.get_all(ConvertedPricePLN)
+
+    first.save(_make_entity(4.0))
+    second.save(_make_entity(8.0))
+    second.compact()
+    first.save(_make_entity(12.0))
+
+    assert first.get_all(ConvertedPricePLN) == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0), _make_entity(8.0), _make_entity(12.0)]
+
+
+@with_sqlite_db
+def test_sqlite_save_retried_when_database_is_locked(prod_mode, monkeypatch):
+    monkeypatch.setattr(config, 'SQLITE_BUSY_TIMEOUT', 0.05)
+    monkeypatch.setattr(config, 'SQLITE_LOCKED_RETRY_DELAY', 0.05)
+    SqliteDatabaseConnector().get_all(ConvertedPricePLN)  # creates schema
+
+    locking_connection = sqlite3.connect(DbTestConfig.DB_URL.replace('sqlite:///', ''), check_same_thread=False)
+    locking_connection.execute('BEGIN IMMEDIATE')
+    release = threading.Timer(0.1, locking_connection.commit)
+    release.start()
+    try:
+        _make_entity(4.0).save()
+    finally:
+        release.join()
+        locking_connection.close()
+
+    assert ConvertedPricePLN.get_all() == [_make_entity(4.0)]
+
+
+@with_sqlite_db
+def test_sqlite_save_fails_when_database_stays_locked(prod_mode, monkeypatch):
+    monkeypatch.setattr(config, 'SQLITE_BUSY_TIMEOUT', 0.01)
+    monkeypatch.setattr(config, 'SQLITE_LOCKED_RETRY_DELAY', 0.01)
+    SqliteDatabaseConnector().get_all(ConvertedPricePLN)
+
+    locking_connection = sqlite3.connect(DbTestConfig.DB_URL.replace('sqlite:///', ''))
+    locking_connection.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(OperationalError, match='database is locked'):
+            _make_entity(4.0).save()
+    finally:
+        locking_connection.rollback()
+        locking_connection.close()
@@ -1,15 +1,33 @@
+import asyncio
 import datetime
+import io
+import os
+import threading
 import json
 import tempfile
+import time
+from collections import OrderedDict
 
 import pytest
 import requests
 
 from task import config
-from task.exchange_rate import get_rate_data, ApiSourceCurrencyRateFetcher, LocalSourceCurrencyRateFetcher
+from task.connectors.api.http_client import HttpClient, HttpClientError, get_http_client, reset_http_client
+from task.connectors.local.file_reader import ExampleFileReader
+from task.connectors.local.json_stream import iter_object_members, read_value
+from task.connectors.local.rate_cache import RateCache, get_rate_cache
+from task.exchange_rate import (
+    get_rate_data,
+    get_rates,
+    get_rates_data,
+    ApiSourceCurrencyRateFetcher,
+    ApiTableSourceCurrencyRateFetcher,
+    AsyncApiSourceCurrencyRateFetcher,
+    LocalSourceCurrencyRateFetcher
+)
 from requests import Response, HTTPError
 
-from task.tests.helpers import MockResponse
+from task.tests.helpers import MockResponse, NBP_TABLE_PAYLOAD
 
 
 def test_get_rate_data_api_source(api_source, mock_nbp_api):
@@ -23,8 +41,9 @@ def test_get_rate_data_api_source(api_source, mock_nbp_api):
     assert rate_data.currency == currency_code
 
 
-def test_get_rate_data_api_source_invalid_data(api_source):
+def test_get_rate_data_api_source_invalid_data(api_source, mocker):
     currency_code = 'euro'
+    http_get = mocker.patch('task.connectors.api.http_client.HttpClient.get')
 
     rate_data = get_rate_data(currency_code)
 
@@ -32,10 +51,10 @@ def test_get_rate_data_api_source_invalid_data(api_source):
     assert rate_data.fetch_date == datetime.date.today().strftime("%Y-%m-%d")
     assert rate_data.currency == currency_code
 
-    with pytest.raises(requests.exceptions.HTTPError) as excinfo:
+    with pytest.raises(Exception) as excinfo:
         rate_data.rate # noqa
-    assert excinfo.value.args[0] == '404 Client Error: Not Found for url:' \
-                                 ' http://api.nbp.pl/api/exchangerates/rates/a/euro/today/?format%20=%20json'
+    assert excinfo.value.args[0] == 'There is no exchange rate for the specified currency in NBP table'
+    assert http_get.call_count == 0
 
 
 def test_get_rate_data_local_source(local_source, temporary_json_file):
@@ -92,3 +111,372 @@ def test_get_rate_data_local_source_invalid_date(local_source, temporary_json_fi
     config.LOCAL_DATA_SOURCES = original_filename
 
 
+def test_get_rate_data_api_source_uses_rate_cache(api_source, monkeypatch):
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    get_rate_cache().set('API', 'eur', today, 4.4)
+
+    def fail_get(*args, **kwargs):
+        raise AssertionError('Request should not be made for cached rate')
+
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', fail_get)
+
+    assert get_rate_data('eur').rate == 4.4
+
+
+def test_get_rate_data_api_source_fills_rate_cache(api_source, mock_nbp_api):
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    assert get_rate_cache().get('API', 'eur', today) is None
+
+    rate = get_rate_data('eur').rate
+
+    assert get_rate_cache().get('API', 'EUR', today) == rate
+
+
+def test_rate_cache_is_shared_between_instances(temporary_rate_cache):
+    RateCache(temporary_rate_cache, ttl=60, max_entries=10).set('API', 'eur', '2023-11-20', 4.35)
+
+    assert RateCache(temporary_rate_cache, ttl=60, max_entries=10).get('API', 'eur', '2023-11-20') == 4.35
+
+
+def test_rate_cache_ttl(temporary_rate_cache, monkeypatch):
+    cache = RateCache(temporary_rate_cache, ttl=60, max_entries=10)
+    cache.set('API', 'eur', '2023-11-20', 4.35)
+
+    now = time.time()
+    monkeypatch.setattr('task.connectors.local.rate_cache.time.time', lambda: now + 61)
+
+    assert cache.get('API', 'eur', '2023-11-20') is None
+
+
+def test_rate_cache_max_entries(temporary_rate_cache):
+    cache = RateCache(temporary_rate_cache, ttl=60, max_entries=2)
+    for day in range(1, 4):
+        cache.set('API', 'eur', f'2023-11-0{day}', 4.0 + day)
+
+    fresh_cache = RateCache(temporary_rate_cache, ttl=60, max_entries=2)
+    assert fresh_cache.get('API', 'eur', '2023-11-01') is None
+    assert fresh_cache.get('API', 'eur', '2023-11-03') == 7.0
+
+
+def test_get_rates_data_api_source_single_request(api_source, mock_nbp_api_table):
+    rates_data = get_rates_data(['eur', 'usd', 'czk'])
+
+    for fetcher in rates_data.values():
+        assert isinstance(fetcher, ApiTableSourceCurrencyRateFetcher)
+
+    assert {currency: fetcher.rate for currency, fetcher in rates_data.items()} == {
+        'eur': 4.3692, 'usd': 3.9966, 'czk': 0.1787
+    }
+    assert mock_nbp_api_table.calls == 1
+
+
+def test_get_rates_data_api_source_currency_missing_in_table(api_source, mock_nbp_api_table):
+    rate_data = get_rates_data(['thb'])['thb']
+
+    with pytest.raises(Exception) as excinfo:
+        rate_data.rate # noqa
+    assert excinfo.value.args[0] == 'There is no exchange rate for the specified currency in NBP table'
+
+
+def test_get_rates_data_local_source(local_source, temporary_json_file):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+
+    rates_data = get_rates_data(['eur'])
+
+    assert isinstance(rates_data['eur'], LocalSourceCurrencyRateFetcher)
+    assert rates_data['eur'].rate == 4.15
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+def test_get_http_client_is_shared():
+    reset_http_client()
+
+    assert get_http_client() is get_http_client()
+
+    reset_http_client()
+
+
+def test_http_client_uses_default_timeout(monkeypatch):
+    captured_kwargs = {}
+
+    def fake_session_get(self, url, **kwargs):
+        captured_kwargs.update(kwargs)
+        return MockResponse()
+
+    monkeypatch.setattr('requests.Session.get', fake_session_get)
+    client = HttpClient(connect_timeout=1, read_timeout=2, max_retries=3, backoff_factor=0.1, backoff_jitter=0.1,
+                        pool_connections=1, pool_maxsize=5)
+
+    client.get('http://api.nbp.pl/api/')
+
+    assert captured_kwargs['timeout'] == (1, 2)
+
+
+def test_http_client_raises_http_client_error(monkeypatch):
+    def fake_session_get(self, url, **kwargs):
+        raise requests.exceptions.ConnectionError('Connection refused')
+
+    monkeypatch.setattr('requests.Session.get', fake_session_get)
+    client = HttpClient(connect_timeout=1, read_timeout=2, max_retries=3, backoff_factor=0.1, backoff_jitter=0.1,
+                        pool_connections=1, pool_maxsize=5)
+
+    with pytest.raises(HttpClientError, match='Connection refused'):
+        client.get('http://api.nbp.pl/api/')
+
+    with pytest.raises(HttpClientError) as excinfo:
+        client.raise_for_status(MockResponse(status_code=500))
+    assert excinfo.value.status_code == 500
+
+
+def test_http_client_retry_and_pool_config():
+    client = HttpClient(connect_timeout=1, read_timeout=2, max_retries=3, backoff_factor=0.1, backoff_jitter=0.2,
+                        pool_connections=1, pool_maxsize=5)
+
+    adapter = client._session.get_adapter('http://api.nbp.pl/api/')
+
+    assert adapter.max_retries.total == 3
+    assert adapter.max_retries.backoff_jitter == 0.2
+    assert set(adapter.max_retries.status_forcelist) == {500, 502, 503, 504}
+    assert adapter._pool_maxsize == 5
+
+
+def test_get_rates_api_source_bounded_concurrency(api_source, monkeypatch):
+    lock = threading.Lock()
+    in_flight = {'current': 0, 'max': 0}
+
+    def fake_get(self, url, **kwargs):
+        with lock:
+            in_flight['current'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['current'])
+        time.sleep(0.05)
+        with lock:
+            in_flight['current'] -= 1
+        return MockResponse()
+
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', fake_get)
+
+    rates_data = asyncio.run(get_rates(['eur', 'usd', 'czk', 'gbp', 'chf', 'eur'], concurrency=2))
+
+    assert list(rates_data) == ['eur', 'usd', 'czk', 'gbp', 'chf']
+    for fetcher in rates_data.values():
+        assert isinstance(fetcher, AsyncApiSourceCurrencyRateFetcher)
+        assert fetcher.rate == 1.0
+    assert 1 < in_flight['max'] <= 2
+
+
+def test_get_rates_api_source_invalid_response(api_source, monkeypatch):
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get',
+                        MockResponse(payload={'rates': [{'mid': 'abc'}]}).request_get)
+
+    with pytest.raises(TypeError) as excinfo:
+        asyncio.run(get_rates(['eur']))
+    assert excinfo.value.args[0] == 'Error: Invalid or missing rate in the JSON response'
+
+
+def test_get_rates_local_source(local_source, temporary_json_file):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+
+    rates_data = asyncio.run(get_rates(['eur']))
+
+    assert isinstance(rates_data['eur'], LocalSourceCurrencyRateFetcher)
+    assert rates_data['eur'].rate == 4.15
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+def test_local_rates_index_is_reused_until_file_changes(local_source, temporary_json_file, monkeypatch):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+
+    reads = []
+    original_read_data = ExampleFileReader._read_data
+    monkeypatch.setattr(ExampleFileReader, '_read_data', staticmethod(lambda: reads.append(1) or original_read_data()))
+
+    assert get_rate_data('eur').rate == 4.15
+    assert get_rate_data('eur').rate == 4.15
+    assert len(reads) == 1
+
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    with open(temporary_json_file, 'w') as file:
+        json.dump({'EUR': [{'date': today, 'rate': 4.2512}]}, file)
+
+    assert get_rate_data('eur').rate == 4.2512
+    assert len(reads) == 2
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+def test_iter_object_members(chunk_size):
+    data = {
+        'EUR': [{'date': '2023-11-20', 'rate': 4.3692}],
+        'C"Z,K': [],
+        'X': {'y': [1, {'z': '}],:'}]},
+        'N': None,
+    }
+    content = json.dumps(data, indent=4).encode()
+
+    members = list(iter_object_members(io.BytesIO(content), chunk_size=chunk_size))
+
+    assert [key for key, _, _ in members] == list(data)
+    assert {key: read_value(io.BytesIO(content), start, end) for key, start, end in members} == data
+
+
+def test_get_rate_data_local_source_streaming(local_source, temporary_json_file, monkeypatch):
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = temporary_json_file
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES_STREAMING_THRESHOLD', 0)
+
+    def fail_read_data():
+        raise AssertionError('Whole file should not be loaded in streaming mode')
+
+    monkeypatch.setattr(ExampleFileReader, '_read_data', staticmethod(fail_read_data))
+
+    assert get_rate_data('eur').rate == 4.15
+    assert os.path.exists(f'{temporary_json_file}.idx')
+
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    with open(temporary_json_file, 'w') as file:
+        json.dump({'USD': [], 'EUR': [{'date': today, 'rate': 4.2512}]}, file)
+
+    assert get_rate_data('eur').rate == 4.2512
+
+    with pytest.raises(Exception) as excinfo:
+        get_rate_data('czk').rate # noqa
+    assert excinfo.value.args[0] == 'There is no exchange rate for the specified currency in example file'
+
+    os.remove(f'{temporary_json_file}.idx')
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+def test_get_rate_data_local_source_streaming_cache_is_bounded(local_source, tmp_path, monkeypatch):
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    currencies = ['EUR', 'USD', 'CZK', 'GBP']
+    rates_path = tmp_path / 'rates.json'
+    rates_path.write_text(json.dumps({
+        currency: [{'date': today, 'rate': i + 1.0}] for i, currency in enumerate(currencies)
+    }))
+
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES', str(rates_path))
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES_STREAMING_THRESHOLD', 0)
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES_CACHED_CURRENCIES', 2)
+    monkeypatch.setattr(ExampleFileReader, '_currency_rates', OrderedDict())
+
+    for currency in currencies + ['EUR', 'GBP']:
+        assert get_rate_data(currency).rate == currencies.index(currency) + 1.0
+
+    assert list(ExampleFileReader._currency_rates) == [(str(rates_path), 'EUR'), (str(rates_path), 'GBP')]
+
+
+def test_get_rate_data_local_source_effective_rate(local_source, effective_rate, tmp_path):
+    rates_path = tmp_path / 'rates.json'
+    rates_path.write_text(json.dumps({'EUR': [
+        {'date': '2023-11-24', 'rate': 4.3644},
+        {'date': '2023-11-20', 'rate': 4.3692},
+        {'date': '2023-11-22', 'rate': 4.3745},
+    ]}))
+
+    original_filename = config.LOCAL_DATA_SOURCES
+    config.LOCAL_DATA_SOURCES = str(rates_path)
+
+    assert get_rate_data('eur', fetch_date='2023-11-22').rate == 4.3745
+    assert get_rate_data('eur', fetch_date='2023-11-23').rate == 4.3745
+    assert get_rate_data('eur', fetch_date='2023-11-26').rate == 4.3644
+    assert get_rate_data('eur', fetch_date='2023-11-22').effective_date == '2023-11-22'
+    assert get_rate_data('eur', fetch_date='2023-11-26').effective_date == '2023-11-24'
+
+    with pytest.raises(KeyError):
+        get_rate_data('eur', fetch_date='2023-11-19').rate # noqa
+
+    config.LOCAL_DATA_SOURCES = original_filename
+
+
+@pytest.mark.parametrize('fetch_date, expected_fallback_url', [
+    (None, 'http://api.nbp.pl/api/exchangerates/rates/a/eur/last/1/?format=json'),
+    ('2023-11-26', 'http://api.nbp.pl/api/exchangerates/rates/a/eur/2023-11-12/2023-11-26/?format=json'),
+])
+def test_get_rate_data_api_source_effective_rate(api_source, effective_rate, monkeypatch,
+                                                 fetch_date, expected_fallback_url):
+    requested_urls = []
+
+    def fake_get(self, url, **kwargs):
+        requested_urls.append(url)
+        if len(requested_urls) == 1:
+            return MockResponse(status_code=404)
+        return MockResponse(payload={'rates': [{'effectiveDate': '2023-11-23', 'mid': 4.3676},
+                                               {'effectiveDate': '2023-11-24', 'mid': 4.3644}]})
+
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', fake_get)
+
+    rate_data = get_rate_data('eur', fetch_date=fetch_date)
+    assert rate_data.rate == 4.3644
+    assert rate_data.effective_date == '2023-11-24'
+    assert requested_urls[1] == expected_fallback_url
+
+    # rate is cached under its effective date only, rate published later for fetch date is not shadowed by it
+    assert get_rate_cache().get('API', 'eur', rate_data.fetch_date) is None
+    assert get_rate_cache().get('API', 'eur', '2023-11-24') == 4.3644
+
+
+def test_get_rate_data_api_source_effective_rate_is_refetched_until_published(api_source, effective_rate,
+                                                                              monkeypatch):
+    today = datetime.date.today().isoformat()
+    responses = [
+        MockResponse(status_code=404),
+        MockResponse(payload={'rates': [{'effectiveDate': '2023-11-24', 'mid': 4.3644}]}),
+        MockResponse(payload={'rates': [{'effectiveDate': today, 'mid': 4.3692}]}),
+    ]
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', lambda self, url, **kwargs: responses.pop(0))
+    monkeypatch.setattr(config, 'EFFECTIVE_DATE_CACHE_TTL', 0.05)
+
+    rate_data = get_rate_data('eur')
+    assert (rate_data.effective_date, rate_data.rate) == ('2023-11-24', 4.3644)
+
+    # effective date of today is cached for a while, NBP is not asked again
+    rate_data = get_rate_data('eur')
+    assert (rate_data.effective_date, rate_data.rate) == ('2023-11-24', 4.3644)
+    assert len(responses) == 1
+
+    # NBP has published rate for today since then
+    time.sleep(0.1)
+    rate_data = get_rate_data('eur')
+    assert (rate_data.effective_date, rate_data.rate) == (today, 4.3692)
+    assert not responses
+
+    # exact rate is served from cache
+    rate_data = get_rate_data('eur')
+    assert (rate_data.effective_date, rate_data.rate) == (today, 4.3692)
+
+
+def test_get_rate_data_api_source_exact_rate_missing(api_source, monkeypatch):
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', MockResponse(status_code=404).request_get)
+
+    with pytest.raises(HttpClientError) as excinfo:
+        get_rate_data('eur').rate # noqa
+    assert excinfo.value.status_code == 404
+
+
+def test_get_rates_data_api_source_effective_rate(api_source, effective_rate, monkeypatch):
+    requested_urls = []
+
+    def fake_get(self, url, **kwargs):
+        requested_urls.append(url)
+        if len(requested_urls) == 1:
+            return MockResponse(status_code=404)
+        return MockResponse(payload=NBP_TABLE_PAYLOAD)
+
+    monkeypatch.setattr('task.connectors.api.http_client.HttpClient.get', fake_get)
+
+    rates_data = get_rates_data(['eur', 'usd'])
+
+    assert rates_data['eur'].rate == 4.3692
+    assert rates_data['usd'].rate == 3.9966
+    assert rates_data['usd'].effective_date == '2023-11-20'
+    # fetchers of one call share table fetched for fetch date, it is not fetched for every currency
+    assert requested_urls == [
+        'http://api.nbp.pl/api/exchangerates/tables/a/today/?format=json',
+        'http://api.nbp.pl/api/exchangerates/tables/a/last/1/?format=json'
+    ]
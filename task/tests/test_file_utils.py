@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from task.file_utils import atomic_write
+
+
+def test_atomic_write_keeps_mode_and_syncs(tmp_path, mocker):
+    path = tmp_path / 'data.json'
+    path.write_text('old')
+    os.chmod(path, 0o644)
+    fsync = mocker.spy(os, 'fsync')
+
+    with atomic_write(str(path)) as file:
+        file.write('new')
+
+    assert path.read_text() == 'new'
+    assert os.stat(path).st_mode & 0o777 == 0o644
+    fsync.assert_called_once()
+    assert os.listdir(tmp_path) == ['data.json']
+
+
+def test_atomic_write_new_file_mode(tmp_path):
+    path = tmp_path / 'data.bin'
+    umask = os.umask(0)
+    os.umask(umask)
+
+    with atomic_write(str(path), 'wb') as file:
+        file.write(b'new')
+
+    assert path.read_bytes() == b'new'
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+
+
+def test_atomic_write_failure_keeps_previous_version(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('old')
+
+    with pytest.raises(ValueError):
+        with atomic_write(str(path)) as file:
+            file.write('partial')
+            raise ValueError('write failed')
+
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['data.json']
@@ -0,0 +1,51 @@
+import datetime
+import json
+import subprocess
+
+from task.benchmarks.import_time import (
+    LAZY_DEPENDENCIES, get_loaded_dependencies, get_module_imports, measure_import, parse_importtime
+)
+from task.tests.helpers import get_subprocess_env, get_task_command
+
+IMPORTTIME_OUTPUT = '''import time: self [us] | cumulative | imported package
+import time:       200 |        200 | site
+import time:       100 |        100 |       requests.compat
+import time:       300 |        400 |     requests
+import time:        50 |        450 |   task.exchange_rate
+import time:        10 |        460 | task.__main__
+'''
+
+
+def test_parse_importtime():
+    entries = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert entries[0] == ('site', 200, 200, 0)
+    assert entries[2] == ('requests', 300, 400, 2)
+    assert [name for name, *_ in get_module_imports(entries)] == [
+        'requests.compat', 'requests', 'task.exchange_rate', 'task.__main__'
+    ]
+    assert get_loaded_dependencies(entries) == ['requests']
+
+
+def test_main_module_does_not_import_lazy_dependencies():
+    assert get_loaded_dependencies(measure_import()) == []
+
+
+def test_dev_mode_local_source_conversion_does_not_import_lazy_dependencies(tmp_path):
+    local_source = tmp_path / 'rates.json'
+    local_source.write_text(json.dumps({'EUR': [{'date': datetime.date.today().isoformat(), 'rate': 4.5}]}))
+    database = tmp_path / 'database.json'
+    database.write_text('{}')
+
+    completed = subprocess.run(
+        get_task_command(tmp_path, local_source, 'eur', '100', '--dev', '-s', 'LOCAL'),
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=tmp_path,
+        env=get_subprocess_env()
+    )
+    modules = json.loads(completed.stderr.splitlines()[-1])
+
+    assert [record['price_in_pln'] for record in json.loads(database.read_text()).values()] == [450 * 10 ** 4]
+    assert {module.split('.')[0] for module in modules}.isdisjoint(LAZY_DEPENDENCIES)
@@ -0,0 +1,70 @@
+import json
+import shutil
+
+import pytest
+
+from task import config, iso_codes
+from task.backfill import backfill_rates
+from task.iso_codes import NBP_TABLE_A_CODES, get_iso_code_registry, is_published_by_nbp
+from task.utils import get_backfill_parser, get_parser
+
+
+@pytest.fixture
+def iso_code_base(tmp_path, monkeypatch):
+    path = tmp_path / 'currency_iso_codes.json'
+    shutil.copy(config.ISO_CODE_BASE, path)
+    monkeypatch.setattr(config, 'ISO_CODE_BASE', str(path))
+    monkeypatch.setattr(iso_codes, '_registries', {})
+    return path
+
+
+def test_iso_code_registry(iso_code_base):
+    with open(iso_code_base) as file:
+        expected = [d["Symbol waluty (kod ISO)"] for d in json.load(file)]
+
+    registry = get_iso_code_registry()
+
+    assert list(registry) == expected
+    assert registry.codes == frozenset(expected)
+    assert 'EUR' in registry and 'EURO' not in registry
+    assert get_iso_code_registry() is registry
+    assert NBP_TABLE_A_CODES <= registry.codes
+
+
+def test_iso_code_snapshot_regenerated_only_when_json_changes(iso_code_base, monkeypatch, mocker):
+    get_iso_code_registry()
+    json_load = mocker.spy(iso_codes.json, 'load')
+
+    monkeypatch.setattr(iso_codes, '_registries', {})
+    assert 'EUR' in get_iso_code_registry()
+    assert json_load.call_count == 0
+
+    with open(iso_code_base, 'w') as file:
+        json.dump([{"Symbol waluty (kod ISO)": "EUR", "Nazwa polska": "Euro"}], file)
+    monkeypatch.setattr(iso_codes, '_registries', {})
+
+    assert list(get_iso_code_registry()) == ['EUR']
+    assert json_load.call_count == 1
+
+
+def test_parser_validates_currency_with_registry(capsys):
+    assert get_parser().parse_args(['eur', '100']).currency == 'EUR'
+
+    with pytest.raises(SystemExit):
+        get_parser().parse_args(['euro', '100'])
+    assert "invalid choice: 'EURO'" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('currency, expected', [('eur', True), ('USD', True), ('AED', False), ('PLN', False)])
+def test_is_published_by_nbp(currency, expected):
+    assert is_published_by_nbp(currency) is expected
+
+
+def test_backfill_rejects_currency_not_published_by_nbp(mocker):
+    http_get = mocker.patch('task.connectors.api.http_client.HttpClient.get')
+    args = get_backfill_parser().parse_args(['eur', 'aed', '--start', '2023-01-01', '--end', '2023-01-31'])
+
+    with pytest.raises(Exception) as excinfo:
+        backfill_rates(args.currencies, args.start, args.end)
+    assert excinfo.value.args[0] == 'There is no exchange rate for the specified currency in NBP table'
+    assert http_get.call_count == 0
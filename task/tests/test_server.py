@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+
+from task import config
+from task.benchmarks.server import NBP_RATES, request, run_clients
+from task.connectors.database.utils import keep_db_connector
+from task.server import ConversionServer
+
+
+@pytest.fixture
+def server_json_db(dev_mode, api_source, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'JSON_DATABASE_NAME', str(tmp_path / 'database.json'))
+    (tmp_path / 'database.json').write_text('{}')
+    with keep_db_connector():
+        yield
+
+
+def _run_with_server(scenario):
+    async def run():
+        server = ConversionServer(port=0)
+        await server.start()
+        try:
+            return await scenario(server.port)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_server_concurrent_requests(nbp_stand_in, server_json_db):
+    connections, requests_per_connection = 10, 30
+
+    async def scenario(port: int) -> list:
+        return await run_clients(port, connections, requests_per_connection, ['eur', 'usd'])
+
+    responses = _run_with_server(scenario)
+
+    assert len(responses) == connections * requests_per_connection
+    assert all(status == 200 for status, _, _ in responses)
+    assert all(body['rate'] == NBP_RATES[body['currency'].upper()] for _, body, _ in responses)
+
+    # concurrent requests of the same currency share one fetch, later ones are served from warm rate cache
+    assert sorted(nbp_stand_in.requests.values()) == [1, 1]
+
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert len(json.load(file)) == connections * requests_per_connection
+
+
+def test_server_batch_fetches_rates_out_of_db_thread(nbp_stand_in, server_json_db):
+    nbp_stand_in.delay = 0.5
+
+    async def scenario(port: int) -> list:
+        finished = []
+
+        async def send(target: str, payload=None) -> None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                await request(reader, writer, 'POST' if payload else 'GET', target, payload)
+                finished.append(target)
+            finally:
+                writer.close()
+
+        batch = asyncio.ensure_future(send('/convert/batch', {'items': [{'currency': 'eur', 'price': 1}]}))
+        await asyncio.sleep(0.1)  # batch waits for NBP API now
+        await send('/history')
+        await batch
+        return finished
+
+    # history is not queued in DB thread behind batch waiting for NBP API response
+    assert _run_with_server(scenario) == ['/history', '/convert/batch']
+
+
+def test_server_effective_rate_is_not_fetched_in_db_thread(nbp_stand_in, server_json_db, effective_rate):
+    nbp_stand_in.effective_date = '2023-11-24'
+
+    async def scenario(port: int) -> list:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            return [
+                await request(reader, writer, 'POST', '/convert', {'currency': 'eur', 'price': 100}),
+                await request(reader, writer, 'POST', '/convert/batch', {'items': [{'currency': 'usd', 'price': 1}]}),
+            ]
+        finally:
+            writer.close()
+
+    (_, converted), (_, batch) = _run_with_server(scenario)
+
+    assert (converted['rate'], converted['date']) == (4.3692, '2023-11-24')
+    assert (batch['results'][0]['rate'], batch['results'][0]['date']) == (3.9966, '2023-11-24')
+    # rate of earlier date is not cached for today, so DB thread gets rate fetched before instead of fetching it again
+    assert nbp_stand_in.requests == {
+        f'/api/exchangerates/rates/a/{currency}/{date}/': 1
+        for currency in ('eur', 'usd') for date in ('today', 'last/1')
+    }
+
+
+def test_server_convert_batch_and_history(nbp_stand_in, server_json_db):
+    async def scenario(port: int) -> tuple:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            batch = await request(reader, writer, 'POST', '/convert/batch', {'items': [
+                {'currency': 'eur', 'price': 100},
+                {'currency': 'xyz', 'price': 1},
+                {'currency': 'czk', 'price': '10.5'},
+                {'currency': 'gbp', 'price': 1},
+                {'price': 1},
+            ]})
+            history = await request(reader, writer, 'GET', '/history?order_by=price_in_pln&descending=true')
+            filtered = await request(reader, writer, 'GET', '/history?currency=czk&limit=1')
+            return batch, history, filtered
+        finally:
+            writer.close()
+
+    (batch_status, batch), (history_status, history), (_, filtered) = _run_with_server(scenario)
+
+    assert batch_status == 200
+    assert (batch['converted'], batch['failed']) == (2, 3)
+    assert batch['results'][0] == {
+        'currency': 'eur', 'price': 100.0, 'rate': 4.3692, 'date': batch['results'][0]['date'], 'price_in_pln': 436.92
+    }
+    assert batch['results'][1] == {'error': 'Invalid currency: xyz'}
+    assert batch['results'][2]['price_in_pln'] == 1.8764
+    assert 'error' in batch['results'][3] and 'error' in batch['results'][4]
+    # rates are fetched concurrently before conversion, DB thread reads them from rate cache
+    assert sorted(nbp_stand_in.requests) == [
+        f'/api/exchangerates/rates/a/{currency}/today/' for currency in ('czk', 'eur', 'gbp')
+    ]
+
+    assert history_status == 200
+    assert [result['price_in_pln'] for result in history['results']] == [436.92, 1.8764]
+    assert [result['currency'] for result in filtered['results']] == ['czk']
+
+
+def test_server_convert_with_date(nbp_stand_in, server_json_db):
+    async def scenario(port: int) -> list:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            return [
+                await request(reader, writer, 'POST', '/convert',
+                              {'currency': 'eur', 'price': 1, 'date': '2023-11-20'}),
+                await request(reader, writer, 'POST', '/convert/batch', {'items': [
+                    {'currency': 'eur', 'price': 1, 'date': '2023-11-20'},
+                    {'currency': 'eur', 'price': 1},
+                    {'currency': 'eur', 'price': 1, 'date': '20.11.2023'},
+                ]}),
+            ]
+        finally:
+            writer.close()
+
+    (status, converted), (_, batch) = _run_with_server(scenario)
+
+    assert (status, converted['date']) == (200, '2023-11-20')
+    assert [result.get('date') for result in batch['results']] == [
+        '2023-11-20', datetime.date.today().isoformat(), None
+    ]
+    assert batch['results'][2] == {'error': 'Invalid date: 20.11.2023, use YYYY-MM-DD format.'}
+    # rate of every date is fetched once, the second one for 2023-11-20 is read from rate cache
+    assert nbp_stand_in.requests == {
+        '/api/exchangerates/rates/a/eur/2023-11-20/': 1, '/api/exchangerates/rates/a/eur/today/': 1
+    }
+
+
+def test_server_errors(nbp_stand_in, server_json_db):
+    async def scenario(port: int) -> list:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            return [
+                await request(reader, writer, 'POST', '/convert', {'currency': 'gbp', 'price': 1}),
+                await request(reader, writer, 'POST', '/convert', {'currency': 'xyz', 'price': 1}),
+                await request(reader, writer, 'POST', '/convert', {'currency': 'eur'}),
+                await request(reader, writer, 'GET', '/history?limit=abc'),
+                await request(reader, writer, 'GET', '/history?order_by=unknown'),
+                await request(reader, writer, 'GET', '/history?unknown=1'),
+                await request(reader, writer, 'GET', '/convert'),
+                await request(reader, writer, 'GET', '/unknown'),
+            ]
+        finally:
+            writer.close()
+
+    responses = _run_with_server(scenario)
+
+    assert [status for status, _ in responses] == [422, 400, 400, 400, 400, 400, 405, 404]
+    assert all('error' in payload for _, payload in responses)
@@ -1,13 +1,19 @@
+import datetime
 import json
+import logging
+import math
+import random
 from argparse import Namespace
 
+import numpy as np
 import pytest
 
 from task import config
 from task.config import ISO_CODE_BASE
-from task.utils import set_run_config, get_iso_codes_list, convert
+from task.setup_loger import disable_file_logging
+from task.utils import set_run_config, get_iso_codes_list, get_parser, convert, convert_array
 
-from decimal import InvalidOperation
+from decimal import Decimal, InvalidOperation, ROUND_CEILING
 
 
 @pytest.mark.parametrize('args, expected_mode, expected_source', [
@@ -24,6 +30,30 @@ def test_set_run_config(clean_config, args, expected_mode, expected_source):
 
     assert config.RUN_CONFIG['MODE'] == expected_mode
     assert config.RUN_CONFIG['SOURCE'] == expected_source
+    assert config.RUN_CONFIG['EFFECTIVE_RATE'] is False
+
+
+def test_set_run_config_effective_rate(clean_config):
+    set_run_config(Namespace(currency='EUR', price=100.00, prod=True, dev=False, source='API', effective_rate=True))
+
+    assert config.RUN_CONFIG['EFFECTIVE_RATE'] is True
+
+
+def test_set_run_config_local_file(clean_config, monkeypatch):
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES', config.LOCAL_DATA_SOURCES)
+    args = get_parser().parse_args(['EUR', '100', '-s', 'LOCAL', '--local-file', 'backfilled.json'])
+
+    set_run_config(args)
+
+    assert config.LOCAL_DATA_SOURCES == 'backfilled.json'
+
+
+def test_get_parser_date():
+    assert get_parser().parse_args(['eur', '100']).date is None
+    assert get_parser().parse_args(['eur', '100', '--date', '2023-11-20']).date == datetime.date(2023, 11, 20)
+
+    with pytest.raises(SystemExit):
+        get_parser().parse_args(['eur', '100', '--date', '20.11.2023'])
 
 
 def test_get_iso_codes_list():
@@ -39,6 +69,25 @@ def test_convert_valid(arg1, arg2, operator, expected_res):
     assert convert(price=arg1, rate=arg2, operator=operator) == expected_res
 
 
+@pytest.mark.parametrize('price, rate, operator', [
+    (105.05, 4.3692, '*'),
+    (459.0, 4.3692, '/'),
+    (-0.0001, 0.5, '*'),
+    (5.0, -0.0, '*'),
+    (5.0, 0.0, '*'),
+    (100, '4.15', '*'),
+])
+def test_convert_same_as_decimal_arithmetic(price, rate, operator):
+    price_decimal, rate_decimal = Decimal(str(price)), Decimal(str(rate))
+    expected = price_decimal * rate_decimal if operator == '*' else price_decimal / rate_decimal
+    expected = float(expected.quantize(Decimal('.0001'), rounding=ROUND_CEILING))
+
+    result = convert(price=price, rate=rate, operator=operator)
+    assert math.copysign(1, result) == math.copysign(1, expected)
+    assert result == expected
+    assert convert(price=price, rate=rate_decimal, operator=operator) == expected
+
+
 @pytest.mark.parametrize('arg1, arg2, operator, exception, message', [
     (100.00, 0, '/', ZeroDivisionError, "[<class 'decimal.DivisionByZero'>]"),
     ('abc', 'cde', '*', InvalidOperation, "[<class 'decimal.ConversionSyntax'>]"),
@@ -48,3 +97,60 @@ def test_convert_invalid(arg1, arg2, operator, exception, message):
     with pytest.raises(exception) as excinfo:
         convert(price=arg1, rate=arg2, operator=operator)
     assert str(excinfo.value) == message
+
+
+def _assert_bit_identical(prices, rate, operator):
+    expected = np.array([convert(price=price, rate=rate, operator=operator) for price in prices])
+    result = convert_array(prices, rate, operator)
+
+    assert result.dtype == np.float64
+    assert result.view(np.int64).tolist() == expected.view(np.int64).tolist()
+
+
+@pytest.mark.parametrize('operator', ['*', '/'])
+@pytest.mark.parametrize('rate', [4.3692, 0.1787, 10.0, 0.000266, -1.5, 12345678.123456, 1000000000000.5])
+def test_convert_array_bit_identical(rate, operator):
+    prices = [100.0, 105.05, 0.0, -0.0, 0.0001, -0.0001, -7.35, 1.23456789, 2.5e10, 123456789.12345,
+              99999999999.9999]
+
+    _assert_bit_identical(prices, rate, operator)
+
+
+@pytest.mark.parametrize('operator', ['*', '/'])
+def test_convert_array_bit_identical_random(operator):
+    generator = random.Random(2023)
+    for _ in range(20):
+        rate = round(generator.uniform(0.0001, 50), generator.randint(0, 6)) or 1.0
+        prices = [round(generator.uniform(-1e9, 1e9), generator.randint(0, 5)) for _ in range(500)]
+
+        _assert_bit_identical(prices, rate, operator)
+
+
+def test_convert_array_keeps_shape():
+    prices = np.array([[1.0, 2.0], [3.0, 4.0]])
+
+    assert convert_array(prices, 4.0, '*').tolist() == [[4.0, 8.0], [12.0, 16.0]]
+
+
+@pytest.mark.parametrize('prices, rate, operator, exception, message', [
+    ([100.0], 0, '/', ZeroDivisionError, "[<class 'decimal.DivisionByZero'>]"),
+    ([100.0, 1e300], 4.0, '*', InvalidOperation, "[<class 'decimal.InvalidOperation'>]"),
+    ([100.0, float('inf')], 4.0, '*', InvalidOperation, "[<class 'decimal.InvalidOperation'>]"),
+    ([100.0], 4.0, '#', Exception, "Invalid operators. Use '*' or '/'."),
+])
+def test_convert_array_invalid(prices, rate, operator, exception, message):
+    with pytest.raises(exception) as excinfo:
+        convert_array(prices, rate, operator)
+    assert str(excinfo.value) == message
+
+
+def test_disable_file_logging(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logger = logging.getLogger('task.test_disable_file_logging')
+    logger.addHandler(logging.FileHandler('logfile.log', delay=True))
+
+    disable_file_logging()
+    logger.error('not written to file')
+
+    assert [type(handler) for handler in logger.handlers] == [logging.NullHandler]
+    assert not (tmp_path / 'logfile.log').exists()
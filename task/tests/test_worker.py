@@ -0,0 +1,74 @@
+import datetime
+import io
+import json
+import select
+import subprocess
+
+from task import config
+from task.connectors.database.json import JsonFileDatabaseConnector
+from task.connectors.database.utils import keep_db_connector
+from task.tests.helpers import get_subprocess_env, get_task_command
+from task.worker import run_worker
+
+
+def test_run_worker(dev_mode, local_source, temporary_json_file, tmp_path, monkeypatch, mocker):
+    monkeypatch.setattr(config, 'LOCAL_DATA_SOURCES', temporary_json_file)
+    monkeypatch.setattr(config, 'JSON_DATABASE_NAME', str(tmp_path / 'database.json'))
+    (tmp_path / 'database.json').write_text('{}')
+    read_data = mocker.spy(JsonFileDatabaseConnector, '_read_data')
+
+    requests = '{"currency": "eur", "price": 100, "id": "a"}\n\nnot json\n{"currency": "czk", "price": 1}\n' \
+               '{"currency": "xyz", "price": 1, "id": 3}\n{"price": 1}\n{"currency": "EUR", "price": "2.5"}\n' \
+               '{"currency": "eur", "price": 1, "date": "2023-11-20"}\n'
+    output = io.StringIO()
+
+    with keep_db_connector():
+        converted, failed = run_worker(io.StringIO(requests), output)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert (converted, failed) == (3, 4)
+    assert results[0] == {
+        'id': 'a', 'currency': 'eur', 'price': 100.0, 'rate': 4.15,
+        'date': datetime.date.today().isoformat(), 'price_in_pln': 415.0
+    }
+    assert results[1] == {'error': 'Invalid JSON: not json'}
+    assert 'id' not in results[2] and 'error' in results[2]
+    assert results[3] == {'id': 3, 'error': 'Invalid currency: xyz'}
+    assert 'error' in results[4]
+    assert results[5]['price_in_pln'] == 10.375
+    assert (results[6]['date'], results[6]['price_in_pln']) == ('2023-11-20', 4.3692)
+
+    # one connector reads database once and keeps it up to date with its own writes
+    assert read_data.call_count == 1
+    with open(config.JSON_DATABASE_NAME) as file:
+        assert len(json.load(file)) == 3
+
+
+def test_worker_co_process_responds_line_by_line(temporary_json_file, tmp_path):
+    (tmp_path / 'database.json').write_text('{}')
+
+    process = subprocess.Popen(
+        get_task_command(tmp_path, temporary_json_file, 'worker', '--dev', '-s', 'LOCAL'),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        cwd=tmp_path,
+        env=get_subprocess_env()
+    )
+    try:
+        for price in (1, 2, 3):
+            process.stdin.write(json.dumps({'currency': 'eur', 'price': price, 'id': price}) + '\n')
+            process.stdin.flush()
+
+            # result is flushed before next request is sent, the worker would block forever otherwise
+            assert select.select([process.stdout], [], [], 10)[0]
+            assert json.loads(process.stdout.readline()) == {
+                'id': price, 'currency': 'eur', 'price': float(price), 'rate': 4.15,
+                'date': datetime.date.today().isoformat(), 'price_in_pln': round(price * 4.15, 4)
+            }
+
+        process.stdin.close()
+        assert process.wait(timeout=10) == 0
+    finally:
+        process.kill()
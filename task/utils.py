@@ -1,17 +1,21 @@
 import argparse
-import json
+import datetime
+import functools
+import operator as operator_module
 from enum import Enum
 from typing import Union
 
 from task import config
-from task.config import ISO_CODE_BASE
 
-from decimal import Decimal, ROUND_CEILING, InvalidOperation
+from decimal import Context, Decimal, DivisionByZero, Overflow, ROUND_CEILING, ROUND_HALF_EVEN, InvalidOperation
 
+from task.iso_codes import get_iso_code_registry
 from task.setup_loger import setup_loger
 
 logger = setup_loger(__name__)
 
+AMOUNT_SCALE = 10 ** 4  # amounts are stored in databases as integer numbers of 1/10000 units
+
 
 class ExtendedEnum(Enum):
     """Helps with misspelling letters during making condition statements"""
@@ -31,12 +35,39 @@ class Source(ExtendedEnum):
     LOCAL = 'LOCAL'
 
 
+class JsonDatabaseFormat(ExtendedEnum):
+    JSON = 'JSON'
+    JOURNAL = 'JOURNAL'
+
+
 def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Quick currency converter")
 
-    parser.add_argument('currency', type=make_upper, choices=get_iso_codes_list())
-    parser.add_argument('price', type=truncate_float, help='Price in the specified currency')
+    parser.add_argument('currency', type=make_upper, choices=get_iso_code_registry(), nargs='?')
+    parser.add_argument('price', type=truncate_float, help='Price in the specified currency', nargs='?')
+
+    parser.add_argument(
+        '-i',
+        '--input',
+        help='CSV (currency,price[,date]) or JSONL ({"currency": ..., "price": ..., "date": ...}, date is optional) '
+             'file with prices to convert, "-" reads from stdin'
+    )
+    parser.add_argument('-o', '--output', default='-', help='JSONL file with results, stdout by default')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format, guessed from extension by default')
+    parser.add_argument('--chunk-size', type=int, help='Number of rows converted and saved at once')
+    parser.add_argument(
+        '--date',
+        type=parse_date,
+        help='Date of rate (YYYY-MM-DD), today by default. With --input it is used for rows without date'
+    )
+
+    add_run_config_arguments(parser)
 
+    return parser
+
+
+def add_run_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds arguments of mode, source and effective rate, which are set in RUN_CONFIG by set_run_config"""
     parser.add_argument('--prod', action='store_true', help='Set mode to production')
     parser.add_argument('--dev', action='store_true', help='Set mode to development')
 
@@ -48,24 +79,89 @@ def get_parser() -> argparse.ArgumentParser:
         default=Source.API.value
     )
 
+    parser.add_argument(
+        '--effective-rate',
+        action='store_true',
+        help='Use the most recent published rate if there is none for today (e.g. on weekends and holidays)'
+    )
+
+    parser.add_argument(
+        '--local-file',
+        help='Rates file of LOCAL source (e.g. output of backfill command), example_currency_rates.json by default'
+    )
+
+
+def get_backfill_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m task backfill',
+        description="Fetches historical rates from NBP API and stores them in local rates file"
+    )
+
+    parser.add_argument('currencies', type=make_upper, choices=get_iso_code_registry(), nargs='+')
+    parser.add_argument('--start', type=parse_date, required=True, help='First day of range (YYYY-MM-DD)')
+    parser.add_argument('--end', type=parse_date, required=True, help='Last day of range (YYYY-MM-DD)')
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='Local rates file, backfilled_currency_rates.json by default. '
+             'LOCAL source example file is updated only if it is given here'
+    )
+    parser.add_argument('--requests-per-second', type=float, help='Limit of requests made to NBP API')
+
+    return parser
+
+
+def get_serve_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m task serve',
+        description="Runs HTTP/JSON conversion server"
+    )
+
+    parser.add_argument('--host', default=config.SERVER_HOST, help='Address server listens on')
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT, help='Port server listens on')
+
+    add_run_config_arguments(parser)
+
+    return parser
+
+
+def get_worker_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m task worker',
+        description="Converts JSON lines requests from stdin and writes one JSON line result per request to stdout"
+    )
+
+    add_run_config_arguments(parser)
+
     return parser
 
 
 def set_run_config(args) -> None:
     """Sets config dict keys values"""
     mode = Mode.PROD.value
-    print(args)
     if args.dev:
         mode = Mode.DEV.value
 
     config.RUN_CONFIG['MODE'] = mode
     config.RUN_CONFIG['SOURCE'] = args.source
+    config.RUN_CONFIG['EFFECTIVE_RATE'] = getattr(args, 'effective_rate', False)
+
+    if getattr(args, 'local_file', None):
+        config.LOCAL_DATA_SOURCES = args.local_file
 
 
 def make_upper(value) -> str:
     return value.upper()
 
 
+def parse_date(value) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid date: {value}, use YYYY-MM-DD format.')
+
+
 def truncate_float(value):
     try:
         truncated_value = float(value)
@@ -78,35 +174,50 @@ def truncate_float(value):
         raise
 
 
+def to_scaled_amount(value: float) -> int:
+    """Maps amount into integer number of 1/AMOUNT_SCALE units, amounts are quantized to 4 decimal places"""
+    return round(value * AMOUNT_SCALE)
+
+
 def get_iso_codes_list() -> list:
     """Checks if currency code we pass to CLI is valid (source of iso codes: NBP)"""
-    try:
-        with open(ISO_CODE_BASE, "r") as file:
-            return [d["Symbol waluty (kod ISO)"] for d in json.load(file)]
-    except Exception:
-        logger.exception('An unexpected error occurred:')
-        raise
+    return list(get_iso_code_registry())
+
+
+_QUANTIZER = Decimal('.0001')
+# the same as default decimal context, passed explicitly to quantize, which is faster than lookup of thread context
+_QUANTIZE_CONTEXT = Context(prec=28, rounding=ROUND_HALF_EVEN, traps=[InvalidOperation, DivisionByZero, Overflow])
+_OPERATIONS = {'*': operator_module.mul, '/': operator_module.truediv}
 
 
-def convert(*, price: float, rate: float, operator: str) -> float:
-    """Use it to avoid floating-point errors in calculations."""
+@functools.lru_cache(maxsize=1024)
+def _float_to_decimal(value: float) -> Decimal:
+    """Parses float rate, the same rates are converted many times"""
+    return Decimal(str(value))
+
+
+def convert(*, price: float, rate: Union[float, Decimal], operator: str) -> float:
+    """
+    Use it to avoid floating-point errors in calculations. Result is rounded up (ceiling) to 4 decimal places.
+    Rate can be passed as already parsed Decimal, to reuse it for many prices.
+    """
 
     try:
-        rate_decimal = Decimal(str(rate))
+        if type(rate) is Decimal:
+            rate_decimal = rate
+        elif type(rate) is float and rate:  # 0.0 and -0.0 are equal keys of cache
+            rate_decimal = _float_to_decimal(rate)
+        else:
+            rate_decimal = Decimal(str(rate))
         price_decimal = Decimal(str(price))
 
-        if operator == '*':
-            result_decimal = price_decimal * rate_decimal
-        elif operator == '/':
-            result_decimal = price_decimal / rate_decimal
-        else:
+        operation = _OPERATIONS.get(operator)
+        if operation is None:
             msg = "Invalid operators. Use '*' or '/'."
             logger.error('ValueError occurred. ' + msg)
             raise ValueError(msg)
 
-        result_float = float(result_decimal.quantize(Decimal('.0001'), rounding=ROUND_CEILING))
-
-        return result_float
+        return float(operation(price_decimal, rate_decimal).quantize(_QUANTIZER, ROUND_CEILING, _QUANTIZE_CONTEXT))
 
     except InvalidOperation:
         logger.exception('InvalidOperation occurred:')
@@ -119,3 +230,69 @@ def convert(*, price: float, rate: float, operator: str) -> float:
     except Exception:
         logger.exception('An unexpected occurred:')
         raise
+
+
+_MAX_SCALED_RATE = 10 ** 12  # bigger rates could be rounded by Decimal context (28 digits) during division
+_MAX_PRICE = 10 ** 11  # every 4 decimal places price below has distinct float, so str(price) has 4 decimal places
+_MAX_EXACT_RESULT = 2 ** 53  # scaled results below are converted to float without rounding
+_INT64_MAX = 2 ** 63 - 1
+
+
+def convert_array(prices, rate: float, operator: str):
+    """
+    Vectorized convert: results are bit-identical to [convert(price=float(p), rate=rate, operator=operator)
+    for p in prices], including ceiling rounding to 4 decimal places, signs of zeros and raised exceptions.
+    Prices with at most 4 decimal places and rate with at most 12 digits are computed exactly with scaled int64
+    arithmetic, the others (too big, too precise, not finite) are computed one by one with convert.
+
+    :param prices: sequence or numpy array of prices
+    :param rate: currency rate
+    :param operator: '*' or '/'
+    :return: numpy float64 array of results with shape of prices
+    """
+    import numpy as np
+
+    if operator not in ('*', '/'):
+        msg = "Invalid operators. Use '*' or '/'."
+        logger.error('ValueError occurred. ' + msg)
+        raise ValueError(msg)
+
+    prices_array = np.asarray(prices, dtype=np.float64)
+    flat_prices = prices_array.ravel()
+
+    scaled_rate = None
+    try:
+        rate_decimal = Decimal(str(rate))
+    except InvalidOperation:
+        rate_decimal = None
+    if rate_decimal is not None and rate_decimal.is_finite() and rate_decimal != 0:
+        rate_scale = 10 ** max(-rate_decimal.as_tuple().exponent, 0)
+        if rate_scale <= _MAX_SCALED_RATE and abs(rate_decimal * rate_scale) <= _MAX_SCALED_RATE:
+            scaled_rate = int(rate_decimal * rate_scale)
+
+    if scaled_rate is None:
+        results = [convert(price=float(price), rate=rate, operator=operator) for price in flat_prices]
+        return np.array(results, dtype=np.float64).reshape(prices_array.shape)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled_prices = np.rint(flat_prices * 10_000)
+        exact = (np.abs(flat_prices) < _MAX_PRICE) & (scaled_prices / 10_000 == flat_prices)
+    scaled_prices = np.where(exact, scaled_prices, 0).astype(np.int64)
+
+    # ceil(a / b) == -(-a // b), a is exact scaled result multiplied by divisor
+    if operator == '*':
+        exact &= np.abs(scaled_prices) <= _INT64_MAX // abs(scaled_rate)
+        scaled_results = -(-(np.where(exact, scaled_prices, 0) * scaled_rate) // rate_scale)
+    else:
+        exact &= np.abs(scaled_prices) <= _INT64_MAX // rate_scale
+        scaled_results = -(-(np.where(exact, scaled_prices, 0) * rate_scale) // scaled_rate)
+    exact &= np.abs(scaled_results) < _MAX_EXACT_RESULT
+
+    # Decimal keeps sign of zero result, e.g. -0.0001 * 0.5 gives -0.0
+    negative = np.signbit(flat_prices) != rate_decimal.is_signed()
+    results = np.where(scaled_results == 0, np.where(negative, -0.0, 0.0), scaled_results / 10_000)
+
+    for index in np.flatnonzero(~exact):
+        results[index] = convert(price=float(flat_prices[index]), rate=rate, operator=operator)
+
+    return results.reshape(prices_array.shape)
@@ -0,0 +1,79 @@
+import json
+import sys
+from typing import IO, Optional
+
+from task import config
+from task.batch import format_result, parse_item_object
+from task.connectors.database.utils import keep_db_connector
+from task.currency_converter import PriceCurrencyConverterToPLN
+from task.setup_loger import setup_loger
+from task.utils import get_worker_parser, set_run_config
+
+logger = setup_loger(__name__)
+
+
+def _handle_line(converter: PriceCurrencyConverterToPLN, line: str) -> dict:
+    """Converts request of one line, exception is reported in result, so it does not stop the worker"""
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return {'error': f'Invalid JSON: {line.strip()}'}
+
+    response = {'id': request['id']} if isinstance(request, dict) and 'id' in request else {}
+    try:
+        currency, price, fetch_date = parse_item_object(request)
+        result = converter.convert_to_pln(currency=currency, price=price, fetch_date=fetch_date)
+    except Exception as e:
+        result = e
+
+    response.update(format_result(result))
+    return response
+
+
+def run_worker(input_file: IO, output_file: IO) -> tuple:
+    """
+    Reads conversion requests ({"currency": "eur", "price": 100}, optional "date" of rate is YYYY-MM-DD and
+    optional "id" is returned in result) line by line and writes one JSON line with result (or error) per request.
+    Output is flushed after every line, so caller can wait for result before sending next request. Worker runs
+    until end of input.
+
+    :param input_file: input opened in text mode, stdin for co-process
+    :param output_file: output opened in text mode, stdout for co-process
+    :return: (converted, failed) requests numbers
+    """
+    converter = PriceCurrencyConverterToPLN()
+    converted = failed = 0
+
+    for line in iter(input_file.readline, ''):  # readline does not wait for more input to fill a buffer
+        if not line.strip():
+            continue
+
+        response = _handle_line(converter, line)
+        if 'error' in response:
+            failed += 1
+        else:
+            converted += 1
+
+        output_file.write(json.dumps(response) + '\n')
+        output_file.flush()
+
+    return converted, failed
+
+
+def worker_main(argv: Optional[list] = None) -> int:
+    """
+    Runs worker command with CLI arguments. Worker process reuses one DB connector, and process-wide
+    rate cache, HTTP client and local rates index for all requests.
+    """
+    args = get_worker_parser().parse_args(argv)
+    set_run_config(args)
+
+    logger.info(f"STARTING WORKER: "
+                f"source: {config.RUN_CONFIG['SOURCE']},"
+                f"mode: {config.RUN_CONFIG['MODE']}")
+
+    with keep_db_connector():
+        converted, failed = run_worker(sys.stdin, sys.stdout)
+
+    logger.info(f"JOB DONE! {converted} requests converted, {failed} requests failed\n")
+    return 0